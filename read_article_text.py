@@ -1,23 +1,100 @@
+import argparse
 import json
 import sys
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-if len(sys.argv) < 2:
+from preprocessing.article_index import CLEANED, RAW, SHARD, ArticleIndex, build_index, read_articles
+from settings import ARTICLE_INDEX_PATH, CLEANED_DATA_FOLDER, CLEANED_SHARDS_FOLDER
+
+
+def scan_issue(article_id):
+    # Without an index: work out the issue file from the id and scan it
+    # article_id = "NICNF0328-C00000-N0000013-00020-001"
+    ai_split = article_id.split('-')
+    thisfile = ai_split[0][-3:] + "_" + ai_split[2] + ".json"
+    # thisfile = "328_N0000013.json"
+    floc = 'data/json_res/' + thisfile
+
+    with open(floc, 'r') as jsonfile:
+        jsondata = json.load(jsonfile)
+
+    for item in jsondata:
+        if item['articleID'] == article_id:
+            return item
+    return None
+
+def scan_cleaned(article_id):
+    # Cleaned files are named <issueID>_<articleID>.json
+    for file_path in CLEANED_DATA_FOLDER.glob(f"*_{article_id}.json"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+def print_article(article_id, article):
+    # Batches come out grouped per file, the id header ties every text back to its request
+    if args.json:
+        print(json.dumps({"article_id": article_id, **article}, ensure_ascii=False))
+    else:
+        print(f"==> {article_id} <==")
+        print(article_text(article))
+
+def print_scanned(article_ids):
+    for article_id in article_ids:
+        try:
+            item = scan_cleaned(article_id) if args.cleaned else scan_issue(article_id)
+        except (OSError, IndexError, ValueError) as e:
+            print(f"{article_id}: {e}", file=sys.stderr)
+            continue
+        if item is None:
+            print(f"{article_id}: not found", file=sys.stderr)
+            continue
+        print_article(article_id, item)
+
+def article_text(article):
+    if "text" in article:
+        return article["text"]
+    return "\n\n".join(article.get("texts", []))
+
+
+parser = argparse.ArgumentParser(description="Print the text of articles by articleID.")
+parser.add_argument("article_ids", nargs="*", help="articleIDs to print")
+parser.add_argument("--ids-file", default=None, help="file with one articleID per line, - for stdin")
+parser.add_argument("--cleaned", action="store_true", help="print the cleaned paragraphs instead of the raw text")
+parser.add_argument("--json", action="store_true", help="print one JSON record per line instead of the text")
+parser.add_argument("--build-index", action="store_true",
+                    help=f"index new or changed raw and cleaned files into {ARTICLE_INDEX_PATH} first")
+args = parser.parse_args()
+
+article_ids = list(args.article_ids)
+if args.ids_file is not None:
+    if args.ids_file == "-":
+        article_ids.extend(line.strip() for line in sys.stdin if line.strip())
+    else:
+        with open(args.ids_file, "r", encoding="utf-8") as ids_file:
+            article_ids.extend(line.strip() for line in ids_file if line.strip())
+
+if not article_ids and not args.build_index:
     print("Provide articleID as argument.")
     exit()
 
-article_id = sys.argv[1]
-
-# article_id = "NICNF0328-C00000-N0000013-00020-001"
-ai_split = article_id.split('-')
-thisfile = ai_split[0][-3:] + "_" + ai_split[2] + ".json"
-# thisfile = "328_N0000013.json"
-floc = 'data/json_res/' + thisfile
+if not args.build_index and not ARTICLE_INDEX_PATH.exists():
+    print_scanned(article_ids)
+    exit()
 
-with open(floc, 'r') as jsonfile:
-    jsondata = json.load(jsonfile)
+index = ArticleIndex(ARTICLE_INDEX_PATH)
+if args.build_index:
+    build_index(index, CLEANED_DATA_FOLDER, CLEANED_SHARDS_FOLDER)
 
-for item in jsondata:
-    if item['articleID'] == article_id:
-        print(item['text'])
+locations = index.locate(article_ids, (CLEANED, SHARD) if args.cleaned else (RAW,))
+# Printed as they are read, grouped per file, so long id lists stream
+for article_id, article in read_articles(locations.values()):
+    print_article(article_id, article)
+index.close()
 
+missing = [article_id for article_id in dict.fromkeys(article_ids) if article_id not in locations]
+if missing:
+    print(f"{len(missing)} articleIDs are not in the index, e.g. {missing[0]}, scanning for them",
+          file=sys.stderr)
+    print_scanned(missing)
@@ -22,8 +22,11 @@ download_file() {
             ;;
         "json_res.tar")
             curl https://a3s.fi/dhh-newspaper/json_res.tar > json_res.tar
-            mkdir -p json_res
-            tar -xvf json_res.tar -C json_res
+            # The preprocessing can read the issues straight from the tar
+            if [ "$SKIP_EXTRACT" != "1" ]; then
+                mkdir -p json_res
+                tar -xvf json_res.tar -C json_res
+            fi
             ;;
         "nichols_XML")
             curl https://a3s.fi/dhh-newspaper/nichols_XML > nichols_XML
@@ -1,5 +1,8 @@
-from settings import FOLDER_ARTICLES, DATA_FOLDER
+from preprocessing.sources import list_raw_sources, read_source_bytes, source_name
+from preprocessing.token_corpus import TokenCorpus
+from settings import DATA_FOLDER, TOKEN_CORPUS_FOLDER
 
+import argparse
 import json
 import string
 import pandas as pd
@@ -26,25 +29,24 @@ def process_file(json_file):
     results = {}
     stemmed_list_of_words = [ps.stem(word) for word in LIST_OF_WORDS]
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data: list[dict] = json.load(f)
-            for article in data:
-                if 'text' not in article:
-                    continue
-
-                words = clean_text(article['text']).split()
-                stemmed_words = [ps.stem(word) for word in words]
-                word_counts = { word: 0 for word in LIST_OF_WORDS }
-                key = article.get("title") or f"{article.get('title', 'untitled')}_{hash(article['text'])}"
-
-                for word, stemmed_word in zip(LIST_OF_WORDS, stemmed_list_of_words):
-                    word_mentions = stemmed_words.count(stemmed_word)
-                    word_counts[word] = word_mentions
-                word_counts["total_words"] = len(stemmed_words)
-                word_counts["issue_id"] = article.get("issueID", "unknown")
-                word_counts["article_id"] = article.get("articleID", "unknown")
-                word_counts["file_name"] = json_file.name
-                results[key] = word_counts
+        data: list[dict] = json.loads(read_source_bytes(json_file))
+        for article in data:
+            if 'text' not in article:
+                continue
+
+            words = clean_text(article['text']).split()
+            stemmed_words = [ps.stem(word) for word in words]
+            word_counts = { word: 0 for word in LIST_OF_WORDS }
+            key = article.get("title") or f"{article.get('title', 'untitled')}_{hash(article['text'])}"
+
+            for word, stemmed_word in zip(LIST_OF_WORDS, stemmed_list_of_words):
+                word_mentions = stemmed_words.count(stemmed_word)
+                word_counts[word] = word_mentions
+            word_counts["total_words"] = len(stemmed_words)
+            word_counts["issue_id"] = article.get("issueID", "unknown")
+            word_counts["article_id"] = article.get("articleID", "unknown")
+            word_counts["file_name"] = source_name(json_file)
+            results[key] = word_counts
 
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON in file {json_file}: {e}")
@@ -52,15 +54,39 @@ def process_file(json_file):
         print(f"Unexpected error in file {json_file}: {e}")
     return results
 
-def create_frequency_json():
-    json_files = list(FOLDER_ARTICLES.glob("*.json"))
-    print(f"Number of JSON files: {len(json_files)}")
+def process_token_corpus(corpus: TokenCorpus):
+    # Counts the cleaned, spell corrected paragraphs, not the raw text process_file counts,
+    # and keys the articles by file_name: the two modes give different numbers
+    # Every distinct word is cleaned and stemmed once, then the counts of all articles are one bincount
+    stemmed_list_of_words = [ps.stem(word) for word in LIST_OF_WORDS]
+    counts = corpus.count_matrix(corpus.lookup(lambda word: ps.stem(clean_text(word)), stemmed_list_of_words),
+                                 len(stemmed_list_of_words))
+    # Tokens made only of punctuation disappear in clean_text and are not counted as words
+    total_words = corpus.count_matrix(corpus.lookup(lambda word: bool(clean_text(word)), [True]), 1)[:, 0]
+    results = {}
+    for i, file_name in enumerate(corpus.names):
+        issue_id, _, article_id = file_name.removesuffix(".json").partition("_")
+        word_counts = dict(zip(LIST_OF_WORDS, counts[i].tolist()))
+        word_counts["total_words"] = int(total_words[i])
+        word_counts["issue_id"] = issue_id
+        word_counts["article_id"] = article_id
+        word_counts["file_name"] = file_name
+        results[file_name] = word_counts
+    return results
 
+def create_frequency_json(use_token_corpus: bool = False):
     all_rows = {}
 
-    with ProcessPoolExecutor() as executor:
-        for file_result in executor.map(process_file, json_files):
-            all_rows.update(file_result)
+    if use_token_corpus:
+        print(f"Counting words in the token corpus {TOKEN_CORPUS_FOLDER}")
+        all_rows = process_token_corpus(TokenCorpus(TOKEN_CORPUS_FOLDER))
+    else:
+        json_files = list_raw_sources()
+        print(f"Number of JSON files: {len(json_files)}")
+
+        with ProcessPoolExecutor() as executor:
+            for file_result in executor.map(process_file, json_files):
+                all_rows.update(file_result)
 
     DATA_FOLDER.mkdir(parents=True, exist_ok=True)
     output_path = DATA_FOLDER / "word_count.json"
@@ -101,8 +127,15 @@ def create_tf_idf_csv():
     df_tf_idf.to_csv(DATA_FOLDER / "tf_idf_top_100.csv", index=True, encoding='utf-8', sep=",")
 
 def main():
+    parser = argparse.ArgumentParser(description="Count the commodity words per article and compute their TF-IDF")
+    parser.add_argument("--token-corpus", action="store_true",
+                        help="count in the encoded cleaned corpus (python -m preprocessing.token_corpus) "
+                             "instead of the raw issue files. This is a different measure: the cleaned, "
+                             "spell corrected paragraphs of each article, keyed by file_name instead of "
+                             "title, so its word_count.json is not comparable with a raw run")
+    args = parser.parse_args()
     print("Creating frequency JSON...")
-    create_frequency_json()
+    create_frequency_json(args.token_corpus)
     print("Creating TF-IDF CSV...")
     create_tf_idf_csv()    
 
@@ -2,6 +2,7 @@
 Script for finding n-grams for keywords in advertisements 
 '''
 
+import argparse
 import json
 from glob import glob
 from nltk.util import ngrams
@@ -10,7 +11,8 @@ from nltk.corpus import stopwords
 from tqdm import tqdm
 import pandas as pd
 import os
-from settings import FOLDER_ARTICLES, DATA_FOLDER
+from preprocessing.token_corpus import SCHEMA_FILE, TokenCorpus
+from settings import FOLDER_ARTICLES, DATA_FOLDER, TOKEN_CORPUS_FOLDER
 import nltk
 
 
@@ -59,6 +61,13 @@ def get_term_ngram_context(articles, search_term, n_gram_window):
         context_words.extend(list(res_set))
     return Counter(context_words)
 
+def get_term_ngram_context_encoded(corpus, search_term, n_gram_window, token_mask=None):
+    # Same counts as get_term_ngram_context, on the token ids: a word is counted once per paragraph
+    # when it falls within n_gram_window - 1 tokens of the search term
+    stop_words = set(stopwords.words('english'))
+    exclude = corpus.lookup(lambda word: word.lower() in stop_words, [True]) >= 0
+    return corpus.context_counts(search_term, n_gram_window - 1, token_mask, exclude)
+
 def get_filelist_by_decade(files, filter_decade):
     files_of_interest = list()
     for file in tqdm(files):
@@ -69,7 +78,27 @@ def get_filelist_by_decade(files, filter_decade):
             files_of_interest.append(file)
     return files_of_interest
 
+def get_context_from_files(jsonfiles, decade, search_term, article_types, n_gram_window):
+    files_of_interest = get_filelist_by_decade(jsonfiles, filter_decade=str(decade))
+    if not files_of_interest:
+        print(f"no file found for {decade}.")
+        return None
+
+    articles = get_articles(files_of_interest)
+    articles_f = filter_articles(articles, search_term, article_types)
+    if not articles_f:
+        print(f"no articles found for keyword '{search_term}' for the decade {decade}.")
+        return None
+
+    return get_term_ngram_context(articles_f, search_term, n_gram_window)
+
 if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Count the context words of a keyword per decade")
+    parser.add_argument("--token-corpus", action="store_true",
+                        help="count in the encoded cleaned corpus (python -m preprocessing.token_corpus) "
+                             "instead of the ads_1 files. This is a different input: cleaned, spell corrected "
+                             "paragraphs, with decades taken from the midpoint year of the issue")
+    args = parser.parse_args()
     nltk.download('stopwords')
     json_pattern = os.path.join(DATA_FOLDER, "ads_1", "*", "*", "*.json")
     jsonfiles = glob(json_pattern)
@@ -81,20 +110,22 @@ if __name__=="__main__":
     output_dir = DATA_FOLDER/output_folder
     os.makedirs(output_dir, exist_ok=True)
 
+    corpus = None
+    if args.token_corpus:
+        if not (TOKEN_CORPUS_FOLDER / SCHEMA_FILE).exists():
+            raise SystemExit(f"No token corpus in {TOKEN_CORPUS_FOLDER}, build it with "
+                             f"python -m src.preprocessing.token_corpus")
+        corpus = TokenCorpus(TOKEN_CORPUS_FOLDER)
+
     for decade in range(1700, 1800, 10):
         print(f"Verarbeite Jahrzehnt: {decade}")
-        files_of_interest = get_filelist_by_decade(jsonfiles, filter_decade=str(decade))
-        if not files_of_interest:
-            print(f"no file found for {decade}.")
+        if corpus is not None:
+            token_mask = corpus.token_mask(corpus.article_mask(decade, decade + 9, article_types))
+            context_counter = get_term_ngram_context_encoded(corpus, search_term, n_gram_window, token_mask)
+        else:
+            context_counter = get_context_from_files(jsonfiles, decade, search_term, article_types, n_gram_window)
+        if context_counter is None:
             continue
-
-        articles = get_articles(files_of_interest)
-        articles_f = filter_articles(articles, search_term, article_types)
-        if not articles_f:
-            print(f"no articles found for keyword '{search_term}' for the decade {decade}.")
-            continue
-
-        context_counter = get_term_ngram_context(articles_f, search_term, n_gram_window)
         df = pd.DataFrame.from_dict(context_counter, orient='index').reset_index()
         df.rename(columns={'index': 'term', 0: 'count'}, inplace=True)
         #df.sort_values(by='count', inplace=True, ascending=False)
@@ -2,26 +2,26 @@ import json
 import matplotlib.pyplot as plt
 from collections import Counter
 import multiprocessing
-from settings import FINDINGS_FOLDER, FOLDER_ARTICLES
+from preprocessing.sources import list_raw_sources, read_source_bytes, source_key
+from settings import FINDINGS_FOLDER
 from matplotlib.ticker import FuncFormatter
 
 OUTPUT_IMAGE = FINDINGS_FOLDER / "article_type_frequencies.png"
 
 def extract_article_types(file_path):
     article_types = []
-    with open(file_path, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-            article_types.extend(record.get("articleType") for record in data if "articleType" in record)
-        except json.JSONDecodeError as e:
-            print(f"Failed to read {file_path}: {e}")
+    try:
+        data = json.loads(read_source_bytes(file_path))
+        article_types.extend(record.get("articleType") for record in data if "articleType" in record)
+    except json.JSONDecodeError as e:
+        print(f"Failed to read {source_key(file_path)}: {e}")
     return article_types
 
 def format_thousands(x, _):
     return f"{int(x):,}".replace(",", ".")
 
 def main():
-    json_files = list(FOLDER_ARTICLES.glob("*.json"))
+    json_files = list_raw_sources()
     print(f"Number of JSON files: {len(json_files)}")
 
     with multiprocessing.Pool() as pool:
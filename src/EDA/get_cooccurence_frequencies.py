@@ -1,22 +1,17 @@
 import json
 from collections import defaultdict
 from itertools import combinations
-from datetime import datetime
 from collections import Counter
 import ast
+from preprocessing.metadata import article_start_year
 from settings import FOLDER_ARTICLES, DATA_FOLDER
 import csv
 import settings
 from collections import defaultdict
 
 def extract_year(entry):
-    date_str = entry.get("meta_issue_date_start")
-    if date_str:
-        try:
-            return int(datetime.strptime(date_str, "%Y-%m-%d").year)
-        except ValueError:
-            pass
-    return None
+    # Also counts issues with an unknown day or month (1750-03-00), which strptime rejected
+    return article_start_year(entry)
 
 
 def get_entries_in_interval(entries, start_year, end_year):
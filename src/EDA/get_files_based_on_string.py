@@ -1,3 +1,4 @@
+import argparse
 import os
 import json
 import re
@@ -6,7 +7,10 @@ import shutil
 import logging
 from multiprocessing import Pool, cpu_count
 
-from settings import DATA_FOLDER, CLEANED_DATA_FOLDER
+from preprocessing.inverted_index import InvertedIndex, is_index_fresh, iter_cleaned_articles
+from preprocessing.shards import iter_shard_index, read_shard_article
+from settings import (DATA_FOLDER, CLEANED_DATA_FOLDER, CLEANED_OUTPUT_FORMAT, CLEANED_SHARDS_FOLDER,
+                      INVERTED_INDEX_FOLDER)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,6 +33,15 @@ def file_contains_string(file_path):
     except Exception:
         return None
 
+def find_matching_names_indexed(index_folder):
+    # The index only covers the paragraphs, not the metadata fields the full scan also searches
+    index = InvertedIndex(index_folder)
+    return index.article_names(index.postings("india"))
+
+def find_matching_names_in_shards():
+    return [article["file_name"] for article in iter_cleaned_articles()
+            if TARGET_PATTERN.search(json.dumps(article))]
+
 def find_matching_jsons(directory):
     json_files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.json')]
     with Pool(processes=cpu_count()) as pool:
@@ -36,8 +49,26 @@ def find_matching_jsons(directory):
     return [f for f in results if f]
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sample cleaned articles mentioning 'india'")
+    parser.add_argument("--use-index", action="store_true",
+                        help="Search the inverted index, which covers the paragraphs only, not the metadata "
+                             "fields the scan also matches")
+    args = parser.parse_args()
     logger.info("Starting search for files containing 'india'")
-    matches = find_matching_jsons(CLEANED_DATA_FOLDER)
+    if args.use_index and not is_index_fresh(INVERTED_INDEX_FOLDER):
+        raise SystemExit(f"No inverted index in {INVERTED_INDEX_FOLDER} built since the last cleaning run, "
+                         "run python -m preprocessing.inverted_index first")
+    if args.use_index:
+        matches = find_matching_names_indexed(INVERTED_INDEX_FOLDER)
+    else:
+        matches = (find_matching_names_in_shards() if CLEANED_OUTPUT_FORMAT == "shards"
+                   else find_matching_jsons(CLEANED_DATA_FOLDER))
+    # Shard output has no file per article: matches stay file names and are written out from the shards
+    shard_entries = None
+    if CLEANED_OUTPUT_FORMAT == "shards":
+        shard_entries = {entry["file_name"]: entry for entry in iter_shard_index(CLEANED_SHARDS_FOLDER)}
+    else:
+        matches = [os.path.join(CLEANED_DATA_FOLDER, os.path.basename(match)) for match in matches]
     logger.info(f"Found {len(matches)} matching files.")
     
     # Create the destination folder if it doesn't exist
@@ -53,7 +84,12 @@ if __name__ == "__main__":
     for i, file_path in enumerate(selected_files, 1):
         file_name = os.path.basename(file_path)
         destination = os.path.join(FOLDER_TO_SAVE, file_name)
-        shutil.copy2(file_path, destination)
+        if shard_entries is None:
+            shutil.copy2(file_path, destination)
+        else:
+            with open(destination, 'w', encoding='utf-8') as f:
+                json.dump(read_shard_article(CLEANED_SHARDS_FOLDER, shard_entries[file_path]), f,
+                          ensure_ascii=False)
         if i % 10 == 0 or i == len(selected_files):
             logger.info(f"Progress: {i}/{len(selected_files)} files saved ({(i/len(selected_files)*100):.1f}%)")
     
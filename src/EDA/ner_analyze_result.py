@@ -2,24 +2,16 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import re
 
-def fix_date_format(date_str):
-    if not date_str:
-        return date_str
-    
-    if re.search(r'-00$', date_str):
-        return re.sub(r'-00$', '-01', date_str)
-    
-    return date_str
+from preprocessing.metadata import article_date_end, article_date_start
 
 with open('/home/cedric/repos/early-modern-global/data/articles_India/articles_India_with_persons.jsonl', 'r') as f:
     data = [json.loads(line) for line in f if line.strip()]
 
 extracted_data = []
 for article in data:
-    date_start = fix_date_format(article.get('meta_issue_date_start'))
-    date_end = fix_date_format(article.get('meta_issue_date_end'))
+    date_start = article_date_start(article)
+    date_end = article_date_end(article)
     
     extracted_data.append({
         'persons': article.get('persons', []),
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import geopandas as gpd
+
+import preprocessing.utils as utils
+from benchmarks.synthetic_corpus import generate_corpus
+from settings import DATA_FOLDER
+
+RESULTS_PATH: Path = DATA_FOLDER / "benchmarks" / "preprocessing_results.jsonl"
+
+
+def git_commit() -> str:
+    try:
+        commit: str = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                     check=True, cwd=Path(__file__).parent).stdout.strip()
+        dirty: bool = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                          capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+def time_function(function: Callable[[Any], Any], inputs: List[Any], repeat: int) -> float:
+    """
+    Best wall time of `repeat` runs of `function` over all inputs; the best
+    run is the one least disturbed by the rest of the machine.
+    """
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        for item in inputs:
+            function(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def throughput(name: str, function: Callable[[Any], Any], inputs: List[str], repeat: int,
+               unit: str = "paragraphs") -> Dict[str, Any]:
+    seconds: float = time_function(function, inputs, repeat)
+    megabytes: float = sum(len(text.encode("utf-8")) for text in inputs) / 1e6
+    result: Dict[str, Any] = {
+        "function": name,
+        "items": len(inputs),
+        "unit": unit,
+        "seconds": seconds,
+        f"{unit}_per_second": len(inputs) / seconds if seconds else None,
+        "mb_per_second": megabytes / seconds if seconds else None,
+    }
+    print(f"{name:24s} {result[f'{unit}_per_second']:12.1f} {unit}/s {result['mb_per_second']:8.2f} MB/s")
+    return result
+
+def write_synthetic_gazetteer(path: Path, n_places: int) -> None:
+    gdf = gpd.GeoDataFrame(
+        {"name": [f"place {i}" for i in range(n_places)], "country": ["India"] * n_places},
+        geometry=gpd.points_from_xy([i % 360 - 180 for i in range(n_places)], [i % 180 - 90 for i in range(n_places)]),
+        crs="EPSG:4326",
+    )
+    gdf.to_file(path, driver="GPKG")
+
+
+def run_suite(n_issues: int, seed: int, repeat: int, clean_paragraphs: int, n_places: int) -> Dict[str, Any]:
+    issues = generate_corpus(n_issues, seed)
+    articles: List[str] = [record["text"] for records in issues for record in records]
+    paragraphs: List[str] = [paragraph for text in articles for paragraph in utils.regroup_texts(text)]
+    normalised: List[str] = [utils.normalise_text(paragraph) for paragraph in paragraphs]
+    print(f"{len(issues)} issues, {len(articles)} articles, {len(paragraphs)} paragraphs")
+
+    results: List[Dict[str, Any]] = [
+        throughput("regroup_texts", utils.regroup_texts, articles, repeat, unit="articles"),
+        throughput("remove_punctuation", utils.remove_punctuation, paragraphs, repeat),
+        throughput("normalise_text", utils.normalise_text, paragraphs, repeat),
+    ]
+
+    # The persistent spell cache would turn repeated runs into cache lookups
+    spell_cache_enabled = utils.spell_cache_enabled
+    utils.spell_cache_enabled = False
+    try:
+        start: float = time.perf_counter()
+        utils.get_sym_spell()
+        print(f"{'get_sym_spell':24s} {time.perf_counter() - start:12.2f} s")
+        results.append(throughput("clean_text", utils.clean_text, paragraphs[:clean_paragraphs], 1))
+        results.append(throughput("correct_spelling", utils.correct_spelling, normalised[:clean_paragraphs], 1))
+    finally:
+        utils.spell_cache_enabled = spell_cache_enabled
+
+    with tempfile.TemporaryDirectory() as folder:
+        gpkg_path: Path = Path(folder) / "places.gpkg"
+        write_synthetic_gazetteer(gpkg_path, n_places)
+        seconds: float = time_function(utils.read_gpkg_to_dict, [gpkg_path], repeat)
+        results.append({"function": "read_gpkg_to_dict", "items": n_places, "unit": "places", "seconds": seconds,
+                         "places_per_second": n_places / seconds if seconds else None,
+                         "mb_per_second": os.path.getsize(gpkg_path) / 1e6 / seconds if seconds else None})
+        print(f"{'read_gpkg_to_dict':24s} {n_places / seconds:12.1f} places/s")
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": {"issues": n_issues, "seed": seed, "articles": len(articles), "paragraphs": len(paragraphs)},
+        "results": results,
+    }
+
+def load_results(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Prints the MB/s of every function relative to the baseline run.
+    """
+    previous: Dict[str, Dict[str, Any]] = {result["function"]: result for result in baseline["results"]}
+    print(f"Compared with {baseline['commit']} ({baseline['timestamp']}):")
+    for result in current["results"]:
+        old: Optional[Dict[str, Any]] = previous.get(result["function"])
+        if old is None or not old.get("mb_per_second") or not result.get("mb_per_second"):
+            continue
+        print(f"{result['function']:24s} {result['mb_per_second'] / old['mb_per_second']:8.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing.utils on a synthetic OCR corpus")
+    parser.add_argument("--issues", type=int, default=20, help="synthetic issues to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per function, the best one is kept")
+    parser.add_argument("--clean-paragraphs", type=int, default=500,
+                        help="paragraphs for the spell correcting functions, which are much slower")
+    parser.add_argument("--places", type=int, default=10_000, help="places in the synthetic gazetteer")
+    parser.add_argument("--baseline", default=None,
+                        help="commit to compare with, by default the previous stored run")
+    parser.add_argument("--no-save", action="store_true", help="do not append the results to the history")
+    args = parser.parse_args()
+
+    history: List[Dict[str, Any]] = load_results(RESULTS_PATH)
+    current: Dict[str, Any] = run_suite(args.issues, args.seed, args.repeat, args.clean_paragraphs, args.places)
+
+    comparable: List[Dict[str, Any]] = [run for run in history if run["corpus"]["issues"] == args.issues
+                                        and run["corpus"]["seed"] == args.seed]
+    if args.baseline is not None:
+        comparable = [run for run in comparable if run["commit"].startswith(args.baseline)]
+    if comparable:
+        compare(current, comparable[-1])
+
+    if not args.no_save:
+        os.makedirs(RESULTS_PATH.parent, exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(current) + "\n")
+        print(f"Results appended to {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
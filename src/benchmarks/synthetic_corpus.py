@@ -0,0 +1,179 @@
+import argparse
+import io
+import json
+import os
+import random
+import tarfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from settings import DATA_FOLDER
+
+OUTPUT_FOLDER: Path = DATA_FOLDER / "synthetic_json_res"
+
+# Period vocabulary, weighted towards function words like the real text
+WORDS: List[str] = (
+    ["the"] * 12 + ["of"] * 8 + ["and"] * 8 + ["to"] * 6 + ["in"] * 5 + ["a"] * 4 + ["that"] * 3 + ["is"] * 3
+    + ["was"] * 3 + ["his"] * 2 + ["which"] * 2 + ["by"] * 2 + ["for"] * 2 + ["with"] * 2 + ["from"] * 2
+    + "King Majesty Parliament Lord Lords Commons Duke Earl Governor Admiral General Captain Merchants Ship "
+      "Ships Fleet Army Regiment Soldiers Sugar Tobacco Rice Indigo Molasses Cotton Silk Trade Company East "
+      "India West Indies Jamaica Barbadoes Bengal Madras Bombay London Edinburgh Dublin Amsterdam Lisbon "
+      "Convention Castle Town Country Peace War Letters Intelligence Orders Militia Forces same case say "
+      "said some such most first last just must those these house present himself service business "
+      "arrived sailed taken received advised ordered passed reported believed expected appointed "
+      "yesterday several great good publick Persons Goods Island Colonies Harbour Port Custom Duty "
+      "Hogsheads Pounds Sterling Bank Stock Annuities Lottery Tickets Prices Current Wednesday Thursday".split()
+)
+LATIN_WORDS: List[str] = "et in est non ad cum quod qui quae sunt ut anno domini regis rex gratia".split()
+FRENCH_WORDS: List[str] = "le la les des et du que qui dans pour est sont nous roi avec par sur".split()
+HEADINGS: List[str] = ["LONDON", "EDINBURGH", "Foreign Affairs", "ADVERTISEMENTS", "Ship News",
+                       "PRICES of STOCKS", "From the London Gazette", "Dublin, March 2."]
+ARTICLE_TYPES: List[str] = ["ARTICLE", "ADVERTISEMENT", "PRICES", "SHIPPING"]
+# (clean, misread) pairs applied inside words
+OCR_CONFUSIONS: List[Tuple[str, str]] = [("s", "f"), ("m", "rn"), ("e", "c"), ("l", "1"), ("i", "j"),
+                                         ("h", "li"), ("u", "n"), ("w", "vv")]
+NON_ASCII_NOISE: List[str] = ["’", "‘", "•", "£", "■", "œ", "Ã©", "â€™"]
+
+
+def noisy_word(word: str, rng: random.Random, noise: float) -> str:
+    """
+    One OCR-style corruption at most per word: the long s read as f (most of
+    them), another character confusion, a dropped letter or stray punctuation.
+    """
+    if rng.random() >= noise or len(word) < 2:
+        return word
+    roll: float = rng.random()
+    if roll < 0.5 and "s" in word[:-1]:
+        i: int = word.index("s", 0, len(word) - 1)
+        return word[:i] + "f" + word[i + 1:]
+    if roll < 0.75:
+        clean, misread = rng.choice(OCR_CONFUSIONS)
+        return word.replace(clean, misread, 1)
+    if roll < 0.85:
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:]
+    if roll < 0.95:
+        return word + rng.choice(",.;:'^")
+    return word + rng.choice(NON_ASCII_NOISE)
+
+def wrap_with_hyphenation(words: List[str], rng: random.Random, line_width: int) -> str:
+    """
+    Breaks the words into narrow newspaper column lines, hyphenating long
+    words across the break as the compositors did.
+    """
+    lines: List[str] = []
+    line: str = ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > line_width:
+            if len(word) > 5 and rng.random() < 0.4:
+                cut: int = rng.randint(2, len(word) - 2)
+                lines.append(f"{line} {word[:cut]}-")
+                line = word[cut:]
+                continue
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return "\n".join(lines)
+
+def sentence(rng: random.Random, vocabulary: List[str], noise: float) -> List[str]:
+    words: List[str] = [noisy_word(rng.choice(vocabulary), rng, noise) for _ in range(rng.randint(6, 25))]
+    words[0] = words[0][:1].upper() + words[0][1:]
+    words[-1] += rng.choice([".", ".", ";", ":", ","])
+    return words
+
+def paragraph(rng: random.Random, noise: float, line_width: int) -> str:
+    roll: float = rng.random()
+    if roll < 0.03:
+        vocabulary = LATIN_WORDS
+    elif roll < 0.06:
+        vocabulary = FRENCH_WORDS
+    else:
+        vocabulary = WORDS
+    words: List[str] = []
+    for _ in range(rng.randint(1, 6)):
+        words.extend(sentence(rng, vocabulary, noise))
+    return wrap_with_hyphenation(words, rng, line_width)
+
+def article_text(rng: random.Random, n_paragraphs: int, noise: float, line_width: int) -> str:
+    """
+    The raw text of one article: paragraphs separated by blank lines, with
+    single-line headings and broken column fragments in between, which is
+    what regroup_texts has to deal with.
+    """
+    blocks: List[str] = []
+    if rng.random() < 0.5:
+        blocks.append(rng.choice(HEADINGS))
+    for _ in range(n_paragraphs):
+        blocks.append(paragraph(rng, noise, line_width))
+        roll: float = rng.random()
+        if roll < 0.15:
+            # Letters of a neighbouring column cut off by the layout analysis
+            blocks.append("\n\n".join(rng.choice("abcdefghst") for _ in range(rng.randint(2, 12))))
+        elif roll < 0.25:
+            blocks.append(rng.choice(HEADINGS))
+    return "\n\n".join(blocks) + "\n\n"
+
+def generate_issue(issue_number: int, seed: int = 0, articles: int = 20, paragraphs: int = 4,
+                   noise: float = 0.08, line_width: int = 40) -> List[Dict[str, Any]]:
+    """
+    One json_res-shaped issue: a list of article records with issueID,
+    articleID, articleType, title and the raw OCR text.
+    """
+    rng = random.Random(seed * 1_000_003 + issue_number)
+    issue_id: str = f"SYN{issue_number:07d}-17{rng.randint(0, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+    records: List[Dict[str, Any]] = []
+    for article_number in range(rng.randint(max(1, articles // 2), articles * 3 // 2)):
+        records.append({
+            "issueID": issue_id,
+            "articleID": f"{issue_id}-{article_number + 1:04d}",
+            "articleType": rng.choice(ARTICLE_TYPES),
+            "title": rng.choice(HEADINGS),
+            "text": article_text(rng, rng.randint(1, paragraphs * 2), noise, line_width),
+        })
+    return records
+
+def generate_corpus(n_issues: int, seed: int = 0, **kwargs: Any) -> List[List[Dict[str, Any]]]:
+    return [generate_issue(i, seed, **kwargs) for i in range(n_issues)]
+
+
+def write_corpus(issues: List[List[Dict[str, Any]]], folder: Path, as_tar: bool = False) -> None:
+    """
+    Writes one JSON file per issue into `folder`, or all of them into
+    `folder`/json_res.tar so the tar reading path can be exercised too.
+    """
+    os.makedirs(folder, exist_ok=True)
+    if not as_tar:
+        for records in issues:
+            with open(folder / f"{records[0]['issueID']}.json", "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+        return
+    with tarfile.open(folder / "json_res.tar", "w") as tar:
+        for records in issues:
+            data: bytes = json.dumps(records, ensure_ascii=False).encode("utf-8")
+            info = tarfile.TarInfo(f"json_res/{records[0]['issueID']}.json")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic json_res-shaped OCR corpus")
+    parser.add_argument("--issues", type=int, default=100, help="number of issue files")
+    parser.add_argument("--articles", type=int, default=20, help="mean articles per issue")
+    parser.add_argument("--paragraphs", type=int, default=4, help="mean paragraphs per article")
+    parser.add_argument("--noise", type=float, default=0.08, help="share of words with an OCR error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tar", action="store_true", help="write a json_res.tar instead of loose files")
+    parser.add_argument("--output", type=Path, default=OUTPUT_FOLDER)
+    args = parser.parse_args()
+
+    issues = generate_corpus(args.issues, args.seed, articles=args.articles, paragraphs=args.paragraphs,
+                             noise=args.noise)
+    write_corpus(issues, args.output, args.tar)
+    print(f"Wrote {len(issues)} issues with {sum(len(records) for records in issues)} articles to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,20 @@
-import pandas as pd
+import polars as pl
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from preprocessing.metadata import ensure_metadata_parquet
+from settings import DATA_FOLDER, META_PARQUET
 
-all_meta_df = pd.read_csv('data/bl_newspapers_meta.csv')
-all_meta_df['decade'] = all_meta_df['issue_date_start'].str[:3] + "0"
-all_meta_df['decade'] = all_meta_df['decade'].astype(int)
-decade_article_counts = all_meta_df['decade'].value_counts().reset_index()
-decade_article_counts.rename({'count': 'articles'}, axis=1, inplace=True)
-issues_df = all_meta_df.drop_duplicates('issue_id')
-decade_issue_counts = issues_df['decade'].value_counts().reset_index()
-decade_issue_counts.rename({'count': 'issues'}, axis=1, inplace=True)
-all_counts = decade_article_counts.merge(decade_issue_counts, on='decade')
-all_counts.sort_values('decade', inplace=True)
+
+ensure_metadata_parquet(DATA_FOLDER / "bl_newspapers_meta.csv", META_PARQUET)
+# Decade of the first day of the issue, as in the original overview
+all_meta_df = (pl.read_parquet(META_PARQUET, columns=['issue_id', 'year_start'])
+               .drop_nulls('year_start')
+               .with_columns((pl.col('year_start') // 10 * 10).alias('decade')))
+decade_article_counts = all_meta_df.group_by('decade').agg(pl.len().alias('articles'))
+decade_issue_counts = all_meta_df.group_by('decade').agg(pl.col('issue_id').n_unique().alias('issues'))
+all_counts = (decade_article_counts.join(decade_issue_counts, on='decade')
+              .sort('decade').to_dict(as_series=False))
 
 
 sns.lineplot(data=all_counts,
@@ -3,12 +3,12 @@ import os
 from typing import List
 import pandas as pd
 import geopandas as gpd
-from datetime import datetime
 import random
 from shapely.geometry import Point
 
 
 from modelling.utils import create_yearly_heatmap_images
+from preprocessing.metadata import article_year, decade_of
 from preprocessing.utils import read_gpkg_to_dict
 from settings import DATA_FOLDER, DECADE_HEATMAP, FINDINGS_FOLDER
 
@@ -45,25 +45,11 @@ def process_json_files(list_data: List[dict]):
     FILES_LOG.touch()
     for article_data in list_data:
         try:
-            start_date = article_data.get('meta_issue_date_start')
-            end_date = article_data.get('meta_issue_date_end')
+            year = article_year(article_data)
             
-            if start_date and end_date:
-                if '-00' in start_date:
-                    start_year = int(start_date.split('-')[0])
-                else:
-                    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                    start_year = start_dt.year
-                    
-                if '-00' in end_date:
-                    end_year = int(end_date.split('-')[0])
-                else:
-                    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-                    end_year = end_dt.year
-                year = start_year + (end_year - start_year) // 2
-                
+            if year is not None:
                 article_data['year'] = year
-                article_data['decade'] = (year // 10) * 10
+                article_data['decade'] = decade_of(year)
 
                 paragraph_words = article_data.get("found_words")
                 
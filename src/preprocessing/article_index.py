@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.shards import iter_shard_index, read_shard_article
+from preprocessing.sources import RawSource, TarMember, list_raw_sources, read_source_bytes, source_key, source_stat
+
+RAW: str = "raw"
+CLEANED: str = "cleaned"
+SHARD: str = "shard"
+
+# Rows of the IN (...) lookups, kept under SQLite's variable limit
+LOOKUP_CHUNK: int = 500
+
+
+class ArticleLocation(NamedTuple):
+    """
+    Where the JSON of one article lives: a byte range of a file (a raw issue,
+    the tar it is a member of, or a cleaned article file), or the rows of the
+    article in a cleaned shard.
+    """
+    article_id: str
+    kind: str
+    path: str
+    offset: int
+    length: int
+
+
+def iter_array_records(raw: bytes) -> Iterator[Tuple[Dict[str, Any], int, int]]:
+    """
+    The records of a JSON array with the byte offset and length of each one in
+    `raw`, found with raw_decode instead of a second parse.
+    """
+    text: str = raw.decode("utf-8")
+    decoder = json.JSONDecoder()
+    position: int = 0
+    byte_position: int = 0
+
+    def skip(position: int, byte_position: int) -> Tuple[int, int]:
+        # Whitespace is ASCII, so characters and bytes advance together
+        while position < len(text) and text[position] in " \t\n\r":
+            position += 1
+            byte_position += 1
+        return position, byte_position
+
+    position, byte_position = skip(position, byte_position)
+    if text[position:position + 1] != "[":
+        raise ValueError("not a JSON array")
+    position, byte_position = skip(position + 1, byte_position + 1)
+    while position < len(text) and text[position] != "]":
+        record, end = decoder.raw_decode(text, position)
+        length: int = len(text[position:end].encode("utf-8"))
+        yield record, byte_position, length
+        position, byte_position = skip(end, byte_position + length)
+        if text[position:position + 1] == ",":
+            position, byte_position = skip(position + 1, byte_position + 1)
+
+
+def cleaned_article_id(file_path: Path) -> Optional[str]:
+    """
+    The articleID of a cleaned file, from its <issueID>_<articleID>.json name
+    or, for a file named otherwise, from its content.
+    """
+    _, separator, article_id = file_path.stem.rpartition("_")
+    if separator and article_id:
+        return article_id
+    with open(file_path, "rb") as f:
+        return json.load(f).get("articleID")
+
+
+class ArticleIndex:
+    """
+    Persistent SQLite index from article id to the byte range of its raw JSON
+    record (extracted issue file or json_res.tar member) and of its cleaned
+    output (per-article JSON file or shard rows), so any article is read with
+    one seek instead of loading and scanning its whole issue.
+
+    Indexed files are recorded with their size and mtime, so `update_*` only
+    reads the files that are new or changed since the last build.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        os.makedirs(path.parent, exist_ok=True)
+        self.connection: sqlite3.Connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS articles (article_id TEXT NOT NULL, kind TEXT NOT NULL, "
+            "path TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, source TEXT NOT NULL, "
+            "PRIMARY KEY (article_id, kind)) WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS articles_source ON articles(source)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+            "mtime INTEGER NOT NULL)"
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _is_current(self, source: str, size: int, mtime: int) -> bool:
+        row = self.connection.execute("SELECT size, mtime FROM files WHERE source = ?", (source,)).fetchone()
+        return row is not None and tuple(row) == (size, mtime)
+
+    def _replace_source(self, source: str, size: int, mtime: int,
+                        rows: Iterable[Tuple[str, str, str, int, int]]) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM articles WHERE source = ?", (source,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+                ((article_id, kind, path, offset, length, source) for article_id, kind, path, offset, length in rows),
+            )
+            self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (source, size, mtime))
+
+    def update_raw(self, sources: List[RawSource]) -> int:
+        """
+        Indexes every record of the raw issues. For tar members the offset is
+        into the tar itself, so no member lookup is needed when reading.
+        """
+        updated: int = 0
+        for source in tqdm(sources, desc="Indexing raw issues"):
+            key: str = source_key(source)
+            size, mtime = source_stat(source)
+            if self._is_current(key, size, mtime):
+                continue
+            if isinstance(source, TarMember):
+                path, base = source.tar_path, source.offset
+            else:
+                path, base = str(source), 0
+            try:
+                records = list(iter_array_records(read_source_bytes(source)))
+            except ValueError as e:
+                print(f"cannot index the json: {key}, full error: {e}")
+                continue
+            self._replace_source(key, size, mtime, (
+                (record["articleID"], RAW, path, base + offset, length)
+                for record, offset, length in records if "articleID" in record
+            ))
+            updated += 1
+        return updated
+
+    def update_cleaned(self, folder: Path) -> int:
+        """
+        Indexes the per-article JSON files written by clean_dataset.
+        """
+        updated: int = 0
+        for file_path in tqdm(list(folder.glob("*.json")), desc="Indexing cleaned articles"):
+            stat = os.stat(file_path)
+            if self._is_current(str(file_path), stat.st_size, stat.st_mtime_ns):
+                continue
+            article_id: Optional[str] = cleaned_article_id(file_path)
+            if article_id is None:
+                continue
+            self._replace_source(str(file_path), stat.st_size, stat.st_mtime_ns,
+                                 [(article_id, CLEANED, str(file_path), 0, stat.st_size)])
+            updated += 1
+        return updated
+
+    def update_shards(self, folder: Path) -> int:
+        """
+        Indexes the cleaned shards from their sidecar indexes, the shards
+        themselves are never read.
+        """
+        entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in iter_shard_index(folder):
+            entries[entry["shard"]].append(entry)
+        updated: int = 0
+        for shard, shard_entries in entries.items():
+            stat = os.stat(folder / shard)
+            if self._is_current(str(folder / shard), stat.st_size, stat.st_mtime_ns):
+                continue
+            self._replace_source(str(folder / shard), stat.st_size, stat.st_mtime_ns, (
+                (entry["articleID"], SHARD, str(folder / shard), entry["offset"], entry["length"])
+                for entry in shard_entries if "articleID" in entry
+            ))
+            updated += 1
+        return updated
+
+    def locate(self, article_ids: List[str], kinds: Tuple[str, ...]) -> Dict[str, ArticleLocation]:
+        """
+        The location of every id that is indexed, the first of `kinds` wins.
+        """
+        found: Dict[str, ArticleLocation] = {}
+        rank: Dict[str, int] = {kind: i for i, kind in enumerate(kinds)}
+        placeholders_kinds: str = ", ".join("?" * len(kinds))
+        unique_ids: List[str] = list(dict.fromkeys(article_ids))
+        for start in range(0, len(unique_ids), LOOKUP_CHUNK):
+            chunk: List[str] = unique_ids[start:start + LOOKUP_CHUNK]
+            rows = self.connection.execute(
+                f"SELECT article_id, kind, path, offset, length FROM articles "
+                f"WHERE article_id IN ({', '.join('?' * len(chunk))}) AND kind IN ({placeholders_kinds})",
+                (*chunk, *kinds),
+            )
+            for row in rows:
+                location = ArticleLocation(*row)
+                current: Optional[ArticleLocation] = found.get(location.article_id)
+                if current is None or rank[location.kind] < rank[current.kind]:
+                    found[location.article_id] = location
+        return found
+
+
+def read_articles(locations: Iterable[ArticleLocation]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Reads the located articles, grouped per file and in offset order so each
+    file is opened once and read front to back.
+    """
+    by_path: Dict[Tuple[str, str], List[ArticleLocation]] = defaultdict(list)
+    for location in locations:
+        by_path[(location.kind, location.path)].append(location)
+    for (kind, path), path_locations in by_path.items():
+        path_locations.sort(key=lambda location: location.offset)
+        if kind == SHARD:
+            for location in path_locations:
+                entry: Dict[str, Any] = {"shard": Path(path).name, "offset": location.offset,
+                                         "length": location.length}
+                yield location.article_id, read_shard_article(Path(path).parent, entry)
+            continue
+        with open(path, "rb") as f:
+            for location in path_locations:
+                f.seek(location.offset)
+                yield location.article_id, json.loads(f.read(location.length))
+
+
+def build_index(index: ArticleIndex, cleaned_folder: Optional[Path], shards_folder: Optional[Path]) -> None:
+    print(f"{index.update_raw(list_raw_sources())} raw sources indexed")
+    if cleaned_folder is not None and cleaned_folder.exists():
+        print(f"{index.update_cleaned(cleaned_folder)} cleaned articles indexed")
+    if shards_folder is not None and shards_folder.exists():
+        print(f"{index.update_shards(shards_folder)} shards indexed")
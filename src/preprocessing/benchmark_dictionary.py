@@ -0,0 +1,110 @@
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from symspellpy.symspellpy import SymSpell
+
+from preprocessing.sources import RawSource, list_raw_sources, read_source_bytes
+from preprocessing.utils import (MAX_EDIT_DISTANCE, PREFIX_LENGTH, MODERN_DICTIONARY_PATH,
+                                 MODERN_BIGRAM_DICTIONARY_PATH, normalise_texts, regroup_texts)
+from settings import DATA_FOLDER, HISTORICAL_DICTIONARY, HISTORICAL_BIGRAM_DICTIONARY
+
+OUTPUT_PATH = DATA_FOLDER / "dictionary_benchmark.json"
+
+
+def sample_paragraphs(sources: List[RawSource], n_paragraphs: int, seed: int = 0) -> List[str]:
+    """
+    Normalised paragraphs (everything clean_text does before spell correction)
+    from randomly chosen issues.
+    """
+    rng = random.Random(seed)
+    sources = list(sources)
+    rng.shuffle(sources)
+    paragraphs: List[str] = []
+    for source in sources:
+        try:
+            articles = json.loads(read_source_bytes(source))
+        except json.JSONDecodeError:
+            continue
+        for article in articles:
+            paragraphs.extend(normalise_texts(regroup_texts(article.get("text", ""))))
+        if len(paragraphs) >= n_paragraphs:
+            break
+    return paragraphs[:n_paragraphs]
+
+def benchmark_dictionary(paragraphs: List[str], dictionary: str, bigram_dictionary: Optional[str]) -> Dict[str, Any]:
+    """
+    Builds a fresh deletes index for the dictionary and runs lookup_compound
+    over every paragraph. There is no ground truth for the corpus, so the
+    correction rate is the share of input tokens lookup_compound changed and
+    the unknown rate the share of output tokens it could not match.
+    """
+    sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+    start: float = time.perf_counter()
+    sym_spell.load_dictionary(dictionary, term_index=0, count_index=1)
+    if bigram_dictionary is not None:
+        sym_spell.load_bigram_dictionary(bigram_dictionary, term_index=0, count_index=2)
+    build_seconds: float = time.perf_counter() - start
+
+    n_tokens: int = 0
+    n_changed: int = 0
+    n_output: int = 0
+    n_unknown: int = 0
+    start = time.perf_counter()
+    for paragraph in paragraphs:
+        suggestion = sym_spell.lookup_compound(paragraph, max_edit_distance=MAX_EDIT_DISTANCE)
+        corrected: str = suggestion[0].term if suggestion else paragraph.lower()
+        tokens: List[str] = paragraph.lower().split()
+        corrected_tokens: List[str] = corrected.split()
+        n_tokens += len(tokens)
+        n_changed += sum((Counter(tokens) - Counter(corrected_tokens)).values())
+        n_output += len(corrected_tokens)
+        n_unknown += sum(1 for token in corrected_tokens if token not in sym_spell.words)
+    lookup_seconds: float = time.perf_counter() - start
+
+    return {
+        "dictionary": dictionary,
+        "bigram_dictionary": bigram_dictionary,
+        "words": len(sym_spell.words),
+        "deletes": len(sym_spell.deletes),
+        "build_seconds": build_seconds,
+        "paragraphs_per_second": len(paragraphs) / lookup_seconds if lookup_seconds else None,
+        "tokens_per_second": n_tokens / lookup_seconds if lookup_seconds else None,
+        "correction_rate": n_changed / n_tokens if n_tokens else None,
+        "unknown_rate": n_unknown / n_output if n_output else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the modern and the corpus-derived SymSpell dictionaries")
+    parser.add_argument("--paragraphs", type=int, default=2_000, help="number of sampled paragraphs")
+    parser.add_argument("--bigrams", action="store_true", help="also load the bigram dictionaries")
+    args = parser.parse_args()
+
+    paragraphs: List[str] = sample_paragraphs(list_raw_sources(), args.paragraphs)
+    dictionaries: Dict[str, Tuple[str, Optional[str]]] = {
+        "modern": (MODERN_DICTIONARY_PATH, MODERN_BIGRAM_DICTIONARY_PATH),
+        "historical": (str(HISTORICAL_DICTIONARY),
+                       str(HISTORICAL_BIGRAM_DICTIONARY) if HISTORICAL_BIGRAM_DICTIONARY.exists() else None),
+    }
+    if not HISTORICAL_DICTIONARY.exists():
+        print(f"{HISTORICAL_DICTIONARY} not found, run build_dictionary first")
+        dictionaries.pop("historical")
+
+    results: Dict[str, Any] = {"paragraphs": len(paragraphs)}
+    for name, (dictionary, bigram_dictionary) in dictionaries.items():
+        results[name] = benchmark_dictionary(paragraphs, dictionary, bigram_dictionary if args.bigrams else None)
+        print(f"{name}: {results[name]['words']} words, {results[name]['build_seconds']:.1f}s to build, "
+              f"{results[name]['paragraphs_per_second']:.1f} paragraphs/s, "
+              f"{results[name]['correction_rate']:.1%} tokens corrected, "
+              f"{results[name]['unknown_rate']:.1%} unknown after correction")
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.sources import RawSource, list_raw_sources, read_source_bytes, source_key
+from preprocessing.utils import MODERN_DICTIONARY_PATH, normalise_text, regroup_texts
+from settings import HISTORICAL_DICTIONARY, HISTORICAL_BIGRAM_DICTIONARY
+
+# Set per worker by init_worker, the words a paragraph is scored against
+REFERENCE_WORDS: Set[str] = set()
+
+
+def load_frequency_dictionary(path: str) -> Counter:
+    """
+    Reads a SymSpell dictionary ("term count" per line; "term1 term2 count"
+    for bigrams) into a Counter.
+    """
+    counts: Counter = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts: List[str] = line.split()
+            if len(parts) >= 2:
+                counts[" ".join(parts[:-1])] += int(parts[-1])
+    return counts
+
+def write_frequency_dictionary(counts: Counter, path: Path) -> None:
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path: Path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for term, count in counts.most_common():
+            f.write(f"{term} {count}\n")
+    os.replace(tmp_path, path)
+
+
+def init_worker(reference_words: Set[str]) -> None:
+    global REFERENCE_WORDS
+    REFERENCE_WORDS = reference_words
+
+def paragraph_tokens(text: str) -> List[str]:
+    return [token for token in normalise_text(text).lower().split() if token.isalpha()]
+
+def count_source(args: Tuple[RawSource, float, int, bool]) -> Tuple[Counter, Counter, int, int]:
+    """
+    Counts the unigrams (and bigrams) of the high-confidence paragraphs of one
+    source issue: paragraphs with at least `min_tokens` tokens, of which at
+    least `min_known_ratio` are reference words. The remaining tokens of those
+    paragraphs are where historical spellings (publick, shew, compleat) end up.
+
+    Returns:
+        (unigrams, bigrams, paragraphs kept, paragraphs seen)
+    """
+    source, min_known_ratio, min_tokens, with_bigrams = args
+    unigrams: Counter = Counter()
+    bigrams: Counter = Counter()
+    kept: int = 0
+    seen: int = 0
+    try:
+        articles = json.loads(read_source_bytes(source))
+    except json.JSONDecodeError:
+        print(f"cannot process the json: {source_key(source)}")
+        return unigrams, bigrams, kept, seen
+
+    for article in articles:
+        for paragraph in regroup_texts(article.get("text", "")):
+            seen += 1
+            tokens: List[str] = paragraph_tokens(paragraph)
+            if len(tokens) < min_tokens:
+                continue
+            n_known: int = sum(1 for token in tokens if token in REFERENCE_WORDS)
+            if n_known / len(tokens) < min_known_ratio:
+                continue
+            kept += 1
+            unigrams.update(tokens)
+            if with_bigrams:
+                bigrams.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    return unigrams, bigrams, kept, seen
+
+def merge_with_modern(corpus: Counter, modern: Counter) -> Counter:
+    """
+    Adds the modern words the corpus never produced. Their counts are rescaled
+    to the corpus total, so relative frequencies stay comparable and corpus
+    counts win for every word both lists share.
+    """
+    scale: float = sum(corpus.values()) / max(1, sum(modern.values()))
+    merged: Counter = Counter(corpus)
+    for term, count in modern.items():
+        if term not in merged:
+            merged[term] = max(1, round(count * scale))
+    return merged
+
+
+def build_dictionary(sources: List[RawSource], min_count: int = 5, min_known_ratio: float = 0.9,
+                     min_tokens: int = 20, with_bigrams: bool = False,
+                     merge_modern: bool = False) -> Tuple[Counter, Counter, Dict[str, int]]:
+    reference_words: Set[str] = set(load_frequency_dictionary(MODERN_DICTIONARY_PATH))
+    unigrams: Counter = Counter()
+    bigrams: Counter = Counter()
+    stats: Dict[str, int] = {"paragraphs_seen": 0, "paragraphs_kept": 0}
+
+    tasks = [(source, min_known_ratio, min_tokens, with_bigrams) for source in sources]
+    with multiprocessing.Pool(initializer=init_worker, initargs=(reference_words,)) as pool:
+        for source_unigrams, source_bigrams, kept, seen in tqdm(pool.imap_unordered(count_source, tasks, chunksize=8),
+                                                                 total=len(tasks), desc="Counting words"):
+            unigrams.update(source_unigrams)
+            bigrams.update(source_bigrams)
+            stats["paragraphs_kept"] += kept
+            stats["paragraphs_seen"] += seen
+
+    # Rare tokens of high-confidence paragraphs are still mostly OCR errors
+    unigrams = Counter({term: count for term, count in unigrams.items() if count >= min_count})
+    bigrams = Counter({term: count for term, count in bigrams.items() if count >= min_count})
+    if merge_modern:
+        unigrams = merge_with_modern(unigrams, load_frequency_dictionary(MODERN_DICTIONARY_PATH))
+    stats["unigrams"] = len(unigrams)
+    stats["bigrams"] = len(bigrams)
+    return unigrams, bigrams, stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a SymSpell frequency dictionary from the corpus")
+    parser.add_argument("--min-count", type=int, default=5, help="drop terms seen fewer times")
+    parser.add_argument("--min-known-ratio", type=float, default=0.9,
+                        help="share of modern dictionary words a paragraph needs to be counted")
+    parser.add_argument("--min-tokens", type=int, default=20, help="shorter paragraphs are not counted")
+    parser.add_argument("--bigrams", action="store_true", help="also write a bigram dictionary")
+    parser.add_argument("--merge-modern", action="store_true",
+                        help="add the modern words the corpus never produced")
+    parser.add_argument("--sample", type=int, default=None, help="only count this many random issues")
+    args = parser.parse_args()
+
+    sources: List[RawSource] = list_raw_sources()
+    if args.sample is not None and args.sample < len(sources):
+        sources = random.Random(0).sample(sources, args.sample)
+
+    unigrams, bigrams, stats = build_dictionary(sources, args.min_count, args.min_known_ratio, args.min_tokens,
+                                                args.bigrams, args.merge_modern)
+    write_frequency_dictionary(unigrams, HISTORICAL_DICTIONARY)
+    print(f"Wrote {stats['unigrams']} terms to {HISTORICAL_DICTIONARY}")
+    if args.bigrams:
+        write_frequency_dictionary(bigrams, HISTORICAL_BIGRAM_DICTIONARY)
+        print(f"Wrote {stats['bigrams']} bigrams to {HISTORICAL_BIGRAM_DICTIONARY}")
+    print(f"Counted {stats['paragraphs_kept']} of {stats['paragraphs_seen']} paragraphs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import multiprocessing
+import random
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.build_dictionary import load_frequency_dictionary
+from preprocessing.ocr_rules import CONFUSIONS, SEED_OCR_RULES, OcrRule, OcrRules, confusion_variants, save_ocr_rules
+from preprocessing.sources import RawSource, list_raw_sources, read_source_bytes
+from preprocessing.utils import MODERN_BIGRAM_DICTIONARY_PATH, MODERN_DICTIONARY_PATH, normalise_text, regroup_texts
+from settings import OCR_RULES_PATH
+
+# Tokens without any misread form of CONFUSIONS cannot be confusions and are never counted
+CONFUSION_MARKERS: Tuple[str, ...] = tuple(misread for misread, _ in CONFUSIONS)
+
+
+def count_source(source: RawSource) -> Tuple[Counter, Counter, Counter]:
+    """
+    Counts the tokens of one issue that contain a confusable character
+    sequence, with their left and right neighbours.
+
+    Returns:
+        (token counts, (previous, token) counts, (token, next) counts)
+    """
+    tokens_count: Counter = Counter()
+    left: Counter = Counter()
+    right: Counter = Counter()
+    try:
+        articles = json.loads(read_source_bytes(source))
+    except json.JSONDecodeError:
+        return tokens_count, left, right
+
+    for article in articles:
+        for paragraph in regroup_texts(article.get("text", "")):
+            tokens: List[str] = normalise_text(paragraph).lower().split()
+            for i, token in enumerate(tokens):
+                if not token.isalpha() or not any(marker in token for marker in CONFUSION_MARKERS):
+                    continue
+                tokens_count[token] += 1
+                if i > 0:
+                    left[(tokens[i - 1], token)] += 1
+                if i + 1 < len(tokens):
+                    right[(token, tokens[i + 1])] += 1
+    return tokens_count, left, right
+
+def best_variant(token: str, words: Counter) -> Optional[str]:
+    variants: List[str] = [variant for variant in confusion_variants(token) if variant in words]
+    if not variants:
+        return None
+    return max(variants, key=lambda variant: words[variant])
+
+def derive_ocr_rules(tokens_count: Counter, left: Counter, right: Counter, words: Counter, bigrams: Counter,
+                     min_count: int = 20, min_context_count: int = 5, min_ratio: float = 10.0) -> OcrRules:
+    """
+    Turns the corpus counts into rules, using the modern dictionaries as the
+    reference for what was meant:
+
+    - a frequent token that is not a word but has a word as confusion variant
+      is always replaced ("moft" -> "most");
+    - a frequent token that is a word itself is only replaced after (before) a
+      neighbour with which the modern bigram counts prefer the variant at least
+      `min_ratio` times ("the fame" -> "the same", but "his fame" is kept).
+    """
+    contexts_after: Dict[str, Set[str]] = defaultdict(set)
+    contexts_before: Dict[str, Set[str]] = defaultdict(set)
+    variants: Dict[str, str] = {}
+    for token, count in tokens_count.items():
+        if count < min_count:
+            continue
+        variant: Optional[str] = best_variant(token, words)
+        if variant is not None:
+            variants[token] = variant
+
+    for (previous, token), count in left.items():
+        variant = variants.get(token)
+        if variant is None or token not in words or count < min_context_count:
+            continue
+        if bigrams[f"{previous} {variant}"] >= min_ratio * max(1, bigrams[f"{previous} {token}"]):
+            contexts_after[token].add(previous)
+    for (token, following), count in right.items():
+        variant = variants.get(token)
+        if variant is None or token not in words or count < min_context_count:
+            continue
+        if bigrams[f"{variant} {following}"] >= min_ratio * max(1, bigrams[f"{token} {following}"]):
+            contexts_before[token].add(following)
+
+    rules: OcrRules = {}
+    for token, variant in variants.items():
+        if token not in words:
+            rules[token] = OcrRule(variant, True)
+        elif contexts_after[token] or contexts_before[token]:
+            rules[token] = OcrRule(variant, False, frozenset(contexts_after[token]), frozenset(contexts_before[token]))
+    return rules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Derive the OCR confusion rules from the corpus")
+    parser.add_argument("--sample", type=int, default=None, help="only count this many random issues")
+    parser.add_argument("--min-count", type=int, default=20, help="ignore rarer tokens")
+    parser.add_argument("--min-context-count", type=int, default=5, help="ignore rarer neighbours")
+    parser.add_argument("--min-ratio", type=float, default=10.0,
+                        help="how much more often the modern bigrams must prefer the variant in a context")
+    parser.add_argument("--no-seed", action="store_true", help="do not merge the hand-written seed rules")
+    args = parser.parse_args()
+
+    sources: List[RawSource] = list_raw_sources()
+    if args.sample is not None and args.sample < len(sources):
+        sources = random.Random(0).sample(sources, args.sample)
+
+    tokens_count: Counter = Counter()
+    left: Counter = Counter()
+    right: Counter = Counter()
+    with multiprocessing.Pool() as pool:
+        for source_tokens, source_left, source_right in tqdm(pool.imap_unordered(count_source, sources, chunksize=8),
+                                                             total=len(sources), desc="Counting confusions"):
+            tokens_count.update(source_tokens)
+            left.update(source_left)
+            right.update(source_right)
+
+    rules: OcrRules = derive_ocr_rules(tokens_count, left, right, load_frequency_dictionary(MODERN_DICTIONARY_PATH),
+                                       load_frequency_dictionary(MODERN_BIGRAM_DICTIONARY_PATH), args.min_count,
+                                       args.min_context_count, args.min_ratio)
+    if not args.no_seed:
+        # Derived rules win, the seed only fills in what the sample did not show
+        rules = {**SEED_OCR_RULES, **rules}
+    save_ocr_rules(rules, OCR_RULES_PATH)
+    n_always: int = sum(1 for rule in rules.values() if rule.always)
+    print(f"Wrote {len(rules)} rules ({n_always} unconditional) to {OCR_RULES_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,31 @@
+import argparse
 import json
 import multiprocessing
 import os
+from collections import Counter, defaultdict
+from multiprocessing.util import Finalize
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
 import polars as pl
+from tqdm import tqdm
 
-from preprocessing.utils import clean_text, regroup_texts
-from settings import DATA_FOLDER, FOLDER_ARTICLES, CLEANED_DATA_FOLDER
+from preprocessing.dedup import ParagraphDeduplicator, paragraph_hash
+from preprocessing.instrumentation import count, finish_run, start_run, timed
+from preprocessing.manifest import IngestManifest, file_fingerprint
+from preprocessing.meta_index import MetaIndex, ensure_meta_index
+from preprocessing.metadata import ensure_metadata_parquet, load_prefixed_metadata
+from preprocessing.pipeline import run_bounded_pipeline
+from preprocessing.scheduling import IngestTask, plan_tasks
+from preprocessing.shards import PARAGRAPH_COLUMNS, ShardWriter
+from preprocessing.sources import RawSource, list_raw_sources, read_source_bytes, read_source_range, source_key
+from preprocessing.utils import (CLEAN_STATS, clean_paragraph, get_known_words, get_language_scorer,
+                                 get_ocr_rules, get_spell_cache, get_sym_spell, paragraph_size, regroup_texts,
+                                 with_alignment, without_alignment)
+from settings import (DATA_FOLDER, CLEANED_DATA_FOLDER, CLEANED_SHARDS_FOLDER,
+                      CLEANED_OUTPUT_FORMAT, INGEST_MANIFEST, META_INDEX_FOLDER, META_PARQUET, USE_SPELL_GATE,
+                      USE_PARAGRAPH_DEDUP, USE_LANGUAGE_ID, USE_CASED_CHANNEL)
+
+CLEAN_STATS_PATH: Path = DATA_FOLDER / "clean_dataset_stats.json"
 
 BL_NEWSPAPERS_META: Path = DATA_FOLDER / "bl_newspapers_meta.csv"
 os.makedirs(CLEANED_DATA_FOLDER, exist_ok=True)
@@ -16,23 +35,69 @@ os.makedirs(CLEANED_DATA_FOLDER, exist_ok=True)
 
 print(f"{multiprocessing.cpu_count()} are available for processing")
 
-WORKER_META_DICT: Optional[Dict[str, Dict[str, Any]]] = None
+WORKER_META_INDEX: Optional[MetaIndex] = None
+WORKER_META_FRAME: Optional[pl.DataFrame] = None
+WORKER_SHARD_WRITER: Optional[ShardWriter] = None
+# Keeps the text channels of each distinct paragraph, the token alignment is recomputed on a hit
+PARAGRAPH_DEDUP: Optional[ParagraphDeduplicator] = (
+    ParagraphDeduplicator(clean_paragraph, size=paragraph_size, compact=without_alignment, expand=with_alignment)
+    if USE_PARAGRAPH_DEDUP else None
+)
 
-def init_worker(meta_dict_lookup: Dict[str, Dict[str, Any]]) -> None:
-    global WORKER_META_DICT
-    WORKER_META_DICT = meta_dict_lookup
+def init_worker(meta_index_folder: Path, output_format: str = "json", meta_join: str = "index") -> None:
+    global WORKER_META_INDEX, WORKER_META_FRAME
+    if meta_join == "polars":
+        WORKER_META_FRAME = load_prefixed_metadata(META_PARQUET)
+    else:
+        # Only the folder path is pickled, every worker maps the same read-only columns
+        WORKER_META_INDEX = MetaIndex(meta_index_folder)
+    if output_format == "shards":
+        # Each worker owns its shards, they are closed when the pool is joined
+        open_shard_writer()
 
-def process_file(file_path: Path) -> List[Dict[str, Any]]:
-    with open(file_path, "r", encoding="utf-8") as f:
-        try:
-            data: List[Dict[str, Any]] = json.load(f)
-        except json.JSONDecodeError as e:
-            raise json.JSONDecodeError(f"cannot process the json: {file_path}, full error: {e}")
-        
-        return [record for record in data]
+def open_shard_writer() -> None:
+    global WORKER_SHARD_WRITER
+    WORKER_SHARD_WRITER = ShardWriter(CLEANED_SHARDS_FOLDER)
+    Finalize(WORKER_SHARD_WRITER, WORKER_SHARD_WRITER.close, exitpriority=10)
+
+def read_issue(source: RawSource) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Reads one source JSON (an extracted file or a json_res.tar member) and
+    returns its records together with the fingerprint (size, mtime, sha1) used
+    by the ingest manifest.
+    """
+    raw: bytes = read_source_bytes(source)
+    fingerprint: Dict[str, Any] = file_fingerprint(source, raw)
+    try:
+        data: List[Dict[str, Any]] = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"cannot process the json: {source_key(source)}, full error: {e}") from e
+
+    count("bytes_read", len(raw))
+    count("items_in", len(data))
+    return [record for record in data], fingerprint
+
+def read_issue_part(task: IngestTask) -> List[Dict[str, Any]]:
+    """
+    Reads only the articles in the byte range of a split source's task.
+    """
+    offset, length = task.byte_range
+    raw: bytes = read_source_range(task.source, offset, length)
+    try:
+        data: List[Dict[str, Any]] = json.loads(b"[" + raw + b"]")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"cannot process the json: {source_key(task.source)} part {task.part}, "
+                         f"full error: {e}") from e
+
+    count("bytes_read", len(raw))
+    count("items_in", len(data))
+    return data
 
-def enrich_article(article: Dict[str, Any]):
-    global WORKER_META_DICT
+def process_file(source: RawSource) -> List[Dict[str, Any]]:
+    return read_issue(source)[0]
+
+def clean_article(article: Dict[str, Any], with_metadata: bool = True) -> Optional[Dict[str, Any]]:
+    global WORKER_META_INDEX
     
     issue_id: str = article.get("issueID", "unknown")
     article_id: str = article.get("articleID", "unknown")
@@ -40,69 +105,322 @@ def enrich_article(article: Dict[str, Any]):
 
     exploded_texts = regroup_texts(article["text"])
 
-    if newspaper_id is not None and WORKER_META_DICT is not None and newspaper_id in WORKER_META_DICT:
-        meta_dict: Dict[str, Any] = WORKER_META_DICT[newspaper_id]
+    meta_dict: Optional[Dict[str, Any]] = None
+    if with_metadata and newspaper_id is not None and WORKER_META_INDEX is not None:
+        meta_dict = WORKER_META_INDEX.get(newspaper_id)
+    if meta_dict is not None:
         for key, value in meta_dict.items():
             article[f"meta_{key}"] = value
 
-    cleaned_texts = [clean_text(text) for text in exploded_texts]
-    if len(cleaned_texts) == 0:
-        return
+    # Identical raw paragraphs (reprints) share a hash and are cleaned only once
+    text_hashes: List[str] = [paragraph_hash(text) for text in exploded_texts]
+    if PARAGRAPH_DEDUP is not None:
+        cleaned = []
+        for text, text_hash in zip(exploded_texts, text_hashes):
+            paragraph, reused = PARAGRAPH_DEDUP.clean_paragraph(text, text_hash)
+            CLEAN_STATS["paragraphs_dedup_hit"] += reused
+            cleaned.append(paragraph)
+    else:
+        cleaned = [clean_paragraph(text) for text in exploded_texts]
+    CLEAN_STATS["paragraphs_total"] += len(exploded_texts)
+    if len(cleaned) == 0:
+        return None
     article.pop("text")  
-    filename: str = f"{issue_id}_{article_id}.json"
-    filepath: Path = CLEANED_DATA_FOLDER / filename
-    article["file_name"] = filename
-    article["texts"] = cleaned_texts
+    article["file_name"] = f"{issue_id}_{article_id}.json"
+    article["texts"] = [paragraph.text for paragraph in cleaned]
+    article["text_hashes"] = text_hashes
+    if USE_LANGUAGE_ID:
+        article["languages"] = [paragraph.language for paragraph in cleaned]
+    if USE_CASED_CHANNEL:
+        article["texts_cased"] = [paragraph.cased for paragraph in cleaned]
+        article["token_alignments"] = [paragraph.alignment for paragraph in cleaned]
+    return article
+
+def join_metadata(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Adds the `meta_*` columns to all cleaned articles of one source file with a
+    single Polars join on article id, instead of merging them key by key. Only
+    the ids go through Polars, so the articles keep their own keys and types.
+    Articles without a metadata row get no `meta_*` keys, as in `clean_article`.
+    """
+    if not articles or WORKER_META_FRAME is None:
+        return articles
+    ids: pl.DataFrame = pl.DataFrame({"meta_article_id": list({article["articleID"] for article in articles
+                                                               if article.get("articleID") is not None})},
+                                     schema={"meta_article_id": WORKER_META_FRAME.schema["meta_article_id"]})
+    rows: Dict[str, Dict[str, Any]] = {row["meta_article_id"]: row
+                                       for row in ids.join(WORKER_META_FRAME, on="meta_article_id").to_dicts()}
+
+    # Same key order as clean_article: metadata before the file name and the paragraph columns
+    tail_keys: Set[str] = {"file_name", *PARAGRAPH_COLUMNS}
+    enriched: List[Dict[str, Any]] = []
+    for article in articles:
+        row: Optional[Dict[str, Any]] = rows.get(article.get("articleID"))
+        if row is None:
+            enriched.append(article)
+            continue
+        merged: Dict[str, Any] = {key: value for key, value in article.items() if key not in tail_keys}
+        merged.update(row)
+        merged.update((key, value) for key, value in article.items() if key in tail_keys)
+        enriched.append(merged)
+    return enriched
+
+def write_article(article: Dict[str, Any]) -> str:
+    count("items_out")
+    if WORKER_SHARD_WRITER is not None:
+        return WORKER_SHARD_WRITER.write_article(article)
 
+    filepath: Path = CLEANED_DATA_FOLDER / article["file_name"]
     with open(filepath, "w", encoding="utf-8") as f_out:
         json.dump(article, f_out, ensure_ascii=False, indent=2)
+        count("bytes_written", f_out.tell())
+    return article["file_name"]
 
+def enrich_article(article: Dict[str, Any]) -> Optional[str]:
+    cleaned = clean_article(article)
+    if cleaned is None:
+        return None
+    return write_article(cleaned)
 
+def take_clean_stats() -> Dict[str, int]:
+    stats: Dict[str, int] = dict(CLEAN_STATS)
+    CLEAN_STATS.clear()
+    return stats
 
-def main() -> None:
-    json_files: List[Path] = list(FOLDER_ARTICLES.glob("*.json"))
-    print(f"number of jsons: {len(json_files)}")
-    
+def process_issue_file(task: IngestTask) -> Tuple[str, Optional[Dict[str, Any]], List[str], Dict[str, int], int]:
+    """
+    Streaming ingest task: reads, regroups, cleans, enriches and writes the
+    articles of one source JSON (or of one part of a huge source) inside the
+    worker, so no article text ever travels back to the parent process.
+
+    Returns:
+        Tuple[str, Optional[Dict[str, Any]], List[str], Dict[str, int], int]:
+        the source file, its fingerprint (None if it could not be read), the
+        files written, the cleaning path counts of its paragraphs and the number
+        of parts the source was split into
+    """
+    source: RawSource = task.source
+    try:
+        if task.byte_range is not None:
+            articles, fingerprint = read_issue_part(task), task.fingerprint
+        else:
+            articles, fingerprint = read_issue(source)
+    except ValueError as e:
+        print(e)
+        return source_key(source), None, [], {}, task.parts
+
+    outputs: List[str] = []
+    if WORKER_META_FRAME is not None:
+        cleaned: List[Dict[str, Any]] = [c for c in (clean_article(a, with_metadata=False) for a in articles)
+                                         if c is not None]
+        for article in join_metadata(cleaned):
+            outputs.append(write_article(article))
+    else:
+        for article in articles:
+            output = enrich_article(article)
+            if output is not None:
+                outputs.append(output)
+
+    if WORKER_SHARD_WRITER is not None:
+        # Rows must be on disk before the parent records the source as done
+        WORKER_SHARD_WRITER.flush()
+        outputs = list(dict.fromkeys(outputs))
+    return source_key(source), fingerprint, outputs, take_clean_stats(), task.parts
+
+def read_source_articles(source: RawSource) -> Tuple[str, Optional[Dict[str, Any]], List[Tuple[Dict[str, Any], int]]]:
+    """
+    Reader stage of the bounded pipeline: the articles of one source, each with
+    the UTF-8 size of its raw text for the byte budget.
+    """
+    try:
+        articles, fingerprint = read_issue(source)
+    except ValueError as e:
+        print(e)
+        return source_key(source), None, []
+    return source_key(source), fingerprint, [(article, len(article.get("text", "").encode("utf-8")))
+                                                for article in articles]
+
+def clean_for_pipeline(article: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    return clean_article(article), take_clean_stats()
+
+def enrich_for_batch(article: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, int]]:
+    return enrich_article(article), take_clean_stats()
+
+def write_clean_stats(run_stats: Counter) -> Dict[str, Any]:
+    report: Dict[str, Any] = dict(run_stats)
+    if run_stats["paragraphs_total"]:
+        # Hits of each worker's own LRU: reprints cleaned by another worker, or evicted, are not counted
+        report["dedup_cache_hit_rate"] = run_stats["paragraphs_dedup_hit"] / run_stats["paragraphs_total"]
+    for path, count in sorted(report.items()):
+        print(f"  {path}: {count}")
+    with open(CLEAN_STATS_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def run_bounded(json_files: List[RawSource], meta_index_folder: Path, manifest: IngestManifest,
+                output_format: str, max_articles: int, max_bytes: int) -> Dict[str, Any]:
+    # This process is the writer stage, the cleaners only clean
+    if output_format == "shards":
+        open_shard_writer()
+
+    def on_source_done(source: str, fingerprint: Dict[str, Any], outputs: List[str]) -> None:
+        if WORKER_SHARD_WRITER is not None:
+            WORKER_SHARD_WRITER.flush()
+        manifest.record(source, fingerprint, outputs)
+
+    run_stats: Counter = run_bounded_pipeline(
+        json_files, read_source_articles, clean_for_pipeline, write_article, on_source_done,
+        initializer=init_worker, initargs=(meta_index_folder, "json"),
+        max_items=max_articles, max_bytes=max_bytes,
+    )
+    if WORKER_SHARD_WRITER is not None:
+        WORKER_SHARD_WRITER.close()
+
+    print(f"Processed {len(json_files)} source files")
+    return write_clean_stats(run_stats)
+
+def run_batched(json_files: List[RawSource], meta_index_folder: Path,
+                manifest: IngestManifest, output_format: str) -> Dict[str, Any]:
     number_batches: int = 100
-    chunk_size: int = len(json_files) // number_batches
-    batches: List[List[Path]] = [json_files[i:i + chunk_size] for i in range(0, len(json_files), chunk_size)]
+    chunk_size: int = max(1, len(json_files) // number_batches)
+    batches: List[List[RawSource]] = [json_files[i:i + chunk_size] for i in range(0, len(json_files), chunk_size)]
     
     if len(batches) > number_batches:
         batches[number_batches-1].extend(batches[number_batches])
         batches = batches[:number_batches]
     
-    print("Reading metadata CSV...")
-    meta_df: pl.DataFrame = pl.read_csv(BL_NEWSPAPERS_META,
-                          schema_overrides={"issue_no": pl.Utf8})
-
-    print("Converting metadata to dictionary lookup...")
-    meta_dict_lookup: Dict[str, Dict[str, Any]] = {}
-    for row_dict in meta_df.to_dicts():
-        article_id: str = row_dict['article_id']
-        meta_dict_lookup[article_id] = row_dict
-    
-    meta_df = None
-    
-    print(f"Metadata dictionary created with {len(meta_dict_lookup)} entries")
-    
+    run_stats: Counter = Counter()
     for i, batch in enumerate(batches, 1):
-
-        if i < 80:
-            continue
         print(f"Processing chunk {i}/{number_batches} with {len(batch)} files...")
         
         with multiprocessing.Pool() as pool:
-            chunk_results: List[List[Dict[str, Any]]] = pool.map(process_file, batch)
+            chunk_results: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]] = pool.map(read_issue, batch)
+            pool.close()
+            pool.join()
         
         print("Finished getting the news items")
 
-        chunk_results_flat: List[Dict[str, Any]] = [record for sublist in chunk_results for record in sublist]
+        chunk_results_flat: List[Dict[str, Any]] = [record for sublist, _ in chunk_results for record in sublist]
         
         print(f"Chunk {i} produced {len(chunk_results_flat)} articles")
         
         with multiprocessing.Pool(initializer=init_worker, 
-                                  initargs=(meta_dict_lookup,)) as pool:
-            pool.map(enrich_article, chunk_results_flat)
+                                  initargs=(meta_index_folder, output_format)) as pool:
+            results: List[Tuple[Optional[str], Dict[str, int]]] = pool.map(enrich_for_batch, chunk_results_flat)
+            pool.close()
+            pool.join()
+        outputs: List[Optional[str]] = [output for output, _ in results]
+        for _, stats in results:
+            run_stats.update(stats)
+
+        # pool.map keeps the order, so the outputs can be sliced back per source
+        start: int = 0
+        for file_path, (records, fingerprint) in zip(batch, chunk_results):
+            source_outputs = outputs[start:start + len(records)]
+            start += len(records)
+            manifest.record(source_key(file_path), fingerprint, list(dict.fromkeys(o for o in source_outputs if o is not None)))
+    return write_clean_stats(run_stats)
+
+def run_streaming(json_files: List[RawSource], meta_index_folder: Path,
+                  manifest: IngestManifest, output_format: str, meta_join: str, schedule: str) -> Dict[str, Any]:
+    # One long-lived pool for the whole run, every task is self-contained.
+    if schedule == "size":
+        # Largest first, huge issues split into parts, handed out one at a time
+        tasks: List[IngestTask] = plan_tasks(json_files)
+        chunksize: int = 1
+    else:
+        # Tar members are listed in archive order, so each chunk handed to a
+        # worker is a contiguous byte range of the tar that it reads front to back.
+        tasks = [IngestTask(source, 0, 1, 0) for source in json_files]
+        chunksize = max(1, len(tasks) // (multiprocessing.cpu_count() * 4))
+
+    run_stats: Counter = Counter()
+    parts_done: Counter = Counter()
+    parts_outputs: Dict[str, List[str]] = defaultdict(list)
+    failed: Set[str] = set()
+    with multiprocessing.Pool(initializer=init_worker,
+                              initargs=(meta_index_folder, output_format, meta_join)) as pool:
+        for source, fingerprint, outputs, stats, parts in tqdm(pool.imap_unordered(process_issue_file, tasks, chunksize),
+                                                               total=len(tasks),
+                                                               desc="Cleaning issues"):
+            run_stats.update(stats)
+            if fingerprint is None:
+                failed.add(source)
+                continue
+            parts_outputs[source].extend(outputs)
+            parts_done[source] += 1
+            # A split source only counts as done once all of its parts are
+            if parts_done[source] == parts and source not in failed:
+                manifest.record(source, fingerprint, list(dict.fromkeys(parts_outputs.pop(source))))
+        # close + join instead of terminate so the shard writers get closed
+        pool.close()
+        pool.join()
+
+    print(f"Processed {len(json_files)} source files")
+    return write_clean_stats(run_stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Clean the raw json_res issues into per-article JSON files.")
+    parser.add_argument("--batched", action="store_true",
+                        help="use the legacy two-pool batch ingest instead of the streaming pool")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the ingest manifest and clean every source file again")
+    parser.add_argument("--output-format", choices=["json", "shards"], default=CLEANED_OUTPUT_FORMAT,
+                        help="one indented JSON per article, or size-bounded JSONL shards with a sidecar index")
+    parser.add_argument("--meta-join", choices=["index", "polars"], default="index",
+                        help="look metadata up per article in the memory-mapped index, or join it per "
+                             "source file in one Polars join (streaming mode only)")
+    parser.add_argument("--schedule", choices=["size", "archive"], default="size",
+                        help="hand out the largest issues first and split huge ones into per-article parts, or "
+                             "keep the archive order so workers read contiguous byte ranges of json_res.tar")
+    parser.add_argument("--bounded", action="store_true",
+                        help="run readers, cleaners and the writer as separate stages with bounded queues, "
+                             "so memory stays flat regardless of corpus size")
+    parser.add_argument("--max-articles", type=int, default=2_000,
+                        help="bounded mode: articles in flight between the stages")
+    parser.add_argument("--max-megabytes", type=int, default=256,
+                        help="bounded mode: raw text in flight between the stages")
+    args = parser.parse_args()
+    if (args.batched or args.bounded) and args.meta_join == "polars":
+        parser.error("--meta-join polars is only available in streaming mode")
+    output_folder: Path = CLEANED_SHARDS_FOLDER if args.output_format == "shards" else CLEANED_DATA_FOLDER
+
+    start_run("clean_dataset")
+    json_files: List[RawSource] = list_raw_sources()
+    print(f"number of jsons: {len(json_files)}")
+
+    manifest = IngestManifest(INGEST_MANIFEST)
+    if not args.force:
+        json_files = manifest.pending(json_files, output_folder)
+        print(f"{len(json_files)} jsons are new, changed or incomplete according to {INGEST_MANIFEST}")
+
+    if args.meta_join == "polars":
+        ensure_metadata_parquet(BL_NEWSPAPERS_META, META_PARQUET)
+    else:
+        ensure_meta_index(BL_NEWSPAPERS_META, META_INDEX_FOLDER)
+
+    # Loaded once in the parent, the forked workers share them copy-on-write
+    with timed("load_models"):
+        get_sym_spell()
+        get_ocr_rules()
+        get_language_scorer()
+        if USE_SPELL_GATE:
+            get_known_words()
+
+    if args.bounded:
+        clean_stats: Dict[str, Any] = run_bounded(json_files, META_INDEX_FOLDER, manifest, args.output_format,
+                                                  args.max_articles, args.max_megabytes * 1024 * 1024)
+    elif args.batched:
+        clean_stats = run_batched(json_files, META_INDEX_FOLDER, manifest, args.output_format)
+    else:
+        clean_stats = run_streaming(json_files, META_INDEX_FOLDER, manifest, args.output_format, args.meta_join,
+                                    args.schedule)
+
+    spell_cache = get_spell_cache()
+    if spell_cache is not None:
+        print(f"Evicted {spell_cache.evict()} least recently used spell corrections")
+    finish_run(extra={"clean_stats": clean_stats})
     
     
 if __name__ == "__main__":
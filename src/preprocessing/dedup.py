@@ -0,0 +1,54 @@
+import hashlib
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+
+def paragraph_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+def identity(value: Any) -> Any:
+    return value
+
+
+class ParagraphDeduplicator:
+    """
+    Cleans each distinct raw paragraph only once per process. Reprinted ads and
+    news items hash to the same key, and every later occurrence reuses the
+    cleaning result (both text channels and the language) of the first
+    (canonical) one.
+
+    Bounded as an LRU over `max_bytes`, as measured by `size`, so memory stays
+    flat on long runs. `compact` turns a result into what is kept (e.g. without
+    the parts that are cheap to recompute) and `expand` turns it back on a hit.
+    """
+
+    def __init__(self, clean: Callable[[str], Any], max_bytes: int = 64 * 1024 * 1024,
+                 size: Callable[[Any], int] = sys.getsizeof, compact: Callable[[Any], Any] = identity,
+                 expand: Callable[[Any], Any] = identity) -> None:
+        self.clean: Callable[[str], Any] = clean
+        self.max_bytes: int = max_bytes
+        self.size: Callable[[Any], int] = size
+        self.compact: Callable[[Any], Any] = compact
+        self.expand: Callable[[Any], Any] = expand
+        self.used: int = 0
+        self.cleaned: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+
+    def clean_paragraph(self, text: str, key: str) -> Tuple[Any, bool]:
+        """
+        Returns:
+            (the cleaning result, whether it was reused from an earlier paragraph)
+        """
+        stored = self.cleaned.get(key)
+        if stored is not None:
+            self.cleaned.move_to_end(key)
+            return self.expand(stored[0]), True
+        cleaned: Any = self.clean(text)
+        compacted: Any = self.compact(cleaned)
+        nbytes: int = self.size(compacted)
+        self.cleaned[key] = (compacted, nbytes)
+        self.used += nbytes
+        while self.used > self.max_bytes and self.cleaned:
+            _, (_, evicted) = self.cleaned.popitem(last=False)
+            self.used -= evicted
+        return cleaned, False
@@ -1,10 +1,12 @@
 import glob
 import os
+from preprocessing.instrumentation import count, finish_run, hotspot, start_run
+from preprocessing.shards import article_metadata, group_entries_by_shard, iter_shard_index, read_shard_article
 from preprocessing.utils import read_gpkg_to_dict
-from settings import DATA_FOLDER
+from settings import DATA_FOLDER, CLEANED_OUTPUT_FORMAT, CLEANED_SHARDS_FOLDER
 
 import json
-from typing import Dict, List, Set, Optional, Any
+from typing import Dict, List, Set, Optional, Any, Tuple
 from pathlib import Path
 from concurrent.futures import ProcessPoolExecutor
 from nltk.stem import PorterStemmer
@@ -13,6 +15,8 @@ from flashtext.keyword import KeywordProcessor
 from nltk.stem import PorterStemmer
 
 STEMMER: PorterStemmer = PorterStemmer()
+# Timed as the "stemming" hot spot of the run report when instrumentation is on
+stem_word = hotspot("stemming")(STEMMER.stem)
 
 LIST_WORDS: List[str] = [
     "tobacco",
@@ -56,6 +60,9 @@ for word, stemmed in zip(places_with_space, places_without_space_stemmed):
 
 OUTPUT_PATH: Path = DATA_FOLDER / "detect_words.jsonl"
 
+# Only paragraphs clean_dataset tagged with one of these languages are searched, None searches all
+KEEP_LANGUAGES: Optional[Set[str]] = None
+
 
 #OUTPUT_PATH = DATA_FOLDER / "detect_words_test.jsonl"
 
@@ -71,36 +78,74 @@ def get_json_files(root_folder:Path)->List[Path]:
     
     return json_files
 
-def detect_words_json_files(json_file: Path) -> Optional[Dict[str, Any]]:
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data: dict = json.load(f)
-
-        # Change to dictionary where keys are text indices
-        data["found_words"] = {}
+def detect_words_article(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    count("items_in")
+    # Change to dictionary where keys are text indices
+    data["found_words"] = {}
+    
+    languages: List[Optional[str]] = data.get("languages", [None] * len(data['texts']))
+    for idx, (text, language) in enumerate(zip(data['texts'], languages)):
+        if KEEP_LANGUAGES is not None and language is not None and language not in KEEP_LANGUAGES:
+            continue
+        text = keyword_processor.replace_keywords(text)
+        words_data: Set[str] = set(text.lower().split())
+
+        words_data = {stem_word(word) for word in words_data}
         
-        for idx, text in enumerate(data['texts']):
-            text = keyword_processor.replace_keywords(text)
-            words_data: Set[str] = set(text.lower().split())
+        found_words: List[str] = []
+        for word in LIST_WORDS_STEMMED:
+            if word in words_data:
+                found_words.append(listwords_dict[word])
+        for word in places_without_space_stemmed:
+            if word in words_data:
+                found_words.append(listspacewords_dict[word])
+        
+        if found_words:  # Only add entries with found words
+            data["found_words"][str(idx)] = found_words  # Use string keys for JSON compatibility
 
-            words_data = {STEMMER.stem(word) for word in words_data}
-            
-            found_words: List[str] = []
-            for word in LIST_WORDS_STEMMED:
-                if word in words_data:
-                    found_words.append(listwords_dict[word])
-            for word in places_without_space_stemmed:
-                if word in words_data:
-                    found_words.append(listspacewords_dict[word])
-            
-            if found_words:  # Only add entries with found words
-                data["found_words"][str(idx)] = found_words  # Use string keys for JSON compatibility
+    if not data["found_words"]:
+        return None  
+    
+    # Downstream steps reread the paragraphs from the cleaned corpus, only the metadata is kept
+    data = article_metadata(data)
 
-        if not data["found_words"]:
-            return None  
-        
-        del data['texts']
+    count("items_out")
+    return data
+
+def detect_words_json_files(json_file: Path) -> Optional[Dict[str, Any]]:
+    with open(json_file, 'rb') as f:
+        raw: bytes = f.read()
+    count("bytes_read", len(raw))
+    data: dict = json.loads(raw)
+    return detect_words_article(data)
+
+def detect_words_shard(shard_task: Tuple[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    _, entries = shard_task
+    results: List[Dict[str, Any]] = []
+    for entry in entries:
+        data = detect_words_article(read_shard_article(CLEANED_SHARDS_FOLDER, entry))
+        if data is not None:
+            # Lets later stages seek the article in its shard
+            data["shard"] = entry["shard"]
+            data["offset"] = entry["offset"]
+            data["length"] = entry["length"]
+            results.append(data)
+    return results
+
+def create_frequency_jsonl_from_shards(shards_folder: Path) -> None:
+    shard_tasks = group_entries_by_shard(list(iter_shard_index(shards_folder)))
+    print(f"Number of shards: {len(shard_tasks)}")
+
+    if OUTPUT_PATH.exists():
+        OUTPUT_PATH.unlink()
 
-        return data
+    with ProcessPoolExecutor() as executor, open(OUTPUT_PATH, "a", encoding="utf-8") as f:
+        for shard_results in executor.map(detect_words_shard, shard_tasks):
+            for result in shard_results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    count("bytes_written", OUTPUT_PATH.stat().st_size)
+    print(f"All shards completed. Results saved to {OUTPUT_PATH}")
         
 def create_frequency_json(folder_articles: Path) -> None:
 
@@ -157,14 +202,20 @@ def create_frequency_json(folder_articles: Path) -> None:
         # Clear memory
         del batch_results
     
+    count("bytes_written", OUTPUT_PATH.stat().st_size)
     print(f"All batches completed. Results saved to {OUTPUT_PATH}")
 
 
 def main() -> None:
     print("Creating frequency JSON...")
-    articles_files: Path = DATA_FOLDER / "cleaned_articles"
-    #articles_files = Path(Path("/home/cedric/repos/early-modern-global/data/cleaned_articles_test"))
-    create_frequency_json(articles_files)
+    start_run("detect_words")
+    if CLEANED_OUTPUT_FORMAT == "shards":
+        create_frequency_jsonl_from_shards(CLEANED_SHARDS_FOLDER)
+    else:
+        articles_files: Path = DATA_FOLDER / "cleaned_articles"
+        #articles_files = Path(Path("/home/cedric/repos/early-modern-global/data/cleaned_articles_test"))
+        create_frequency_json(articles_files)
+    finish_run()
   
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+import argparse
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.inverted_index import iter_cleaned_articles
+from preprocessing.metadata import article_year
+from settings import CORPUS_DATABASE
+
+INSERT_BATCH: int = 10_000
+
+# (column, type, article key); the per-paragraph values are added in paragraph_rows
+METADATA_COLUMNS: List[Tuple[str, str, str]] = [
+    ("article_id", "TEXT", "articleID"),
+    ("issue_id", "TEXT", "issueID"),
+    ("file_name", "TEXT", "file_name"),
+    ("article_type", "TEXT", "articleType"),
+    ("newspaper_title", "TEXT", "meta_newspaper_title"),
+    ("issue_date_start", "TEXT", "meta_issue_date_start"),
+    ("issue_date_end", "TEXT", "meta_issue_date_end"),
+]
+COLUMNS: List[str] = ([column for column, _, _ in METADATA_COLUMNS]
+                      + ["year", "paragraph", "language", "text", "text_cased"])
+INDEXED_COLUMNS: List[Tuple[str, ...]] = [("article_id",), ("newspaper_title",), ("article_type", "year"),
+                                          ("year",)]
+
+
+def paragraph_rows(article: Dict[str, Any]) -> Iterator[Tuple[Any, ...]]:
+    metadata: List[Any] = [article.get(key) for _, _, key in METADATA_COLUMNS]
+    year: Optional[int] = article_year(article)
+    texts: List[str] = article.get("texts", [])
+    languages: List[Optional[str]] = article.get("languages", [None] * len(texts))
+    texts_cased: List[Optional[str]] = article.get("texts_cased", [None] * len(texts))
+    for i, text in enumerate(texts):
+        yield (*metadata, year, i, languages[i], text, texts_cased[i])
+
+def create_schema(connection: sqlite3.Connection) -> None:
+    columns: str = ", ".join(f"{column} {kind}" for column, kind, _ in METADATA_COLUMNS)
+    connection.execute(f"CREATE TABLE paragraphs (id INTEGER PRIMARY KEY, {columns}, year INTEGER, "
+                       f"paragraph INTEGER, language TEXT, text TEXT, text_cased TEXT)")
+    # External content table: the text is stored once, in paragraphs
+    connection.execute("CREATE VIRTUAL TABLE paragraphs_fts USING fts5(text, content='paragraphs', "
+                       "content_rowid='id')")
+
+def build_corpus_database(articles: Iterator[Dict[str, Any]], path: Path) -> int:
+    """
+    Loads every cleaned paragraph with its article metadata into a fresh
+    SQLite database: a `paragraphs` table with indexed metadata columns and an
+    FTS5 index over the normalised text. Rows go in with batched executemany
+    in one transaction, the full text and column indexes are built once at the
+    end, which is much faster than maintaining them per row. The database is
+    written next to `path` and moved into place when complete.
+
+    Returns:
+        int: the number of paragraphs loaded
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    building: Path = path.with_name(path.name + ".building")
+    if building.exists():
+        building.unlink()
+    connection = sqlite3.connect(building)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    create_schema(connection)
+
+    insert: str = (f"INSERT INTO paragraphs ({', '.join(COLUMNS)}) "
+                   f"VALUES ({', '.join('?' * len(COLUMNS))})")
+    loaded: int = 0
+    batch: List[Tuple[Any, ...]] = []
+    with connection:
+        for article in tqdm(articles, desc="Loading paragraphs"):
+            batch.extend(paragraph_rows(article))
+            if len(batch) >= INSERT_BATCH:
+                connection.executemany(insert, batch)
+                loaded += len(batch)
+                batch = []
+        connection.executemany(insert, batch)
+        loaded += len(batch)
+
+    print("Building the full text and metadata indexes...")
+    with connection:
+        connection.execute("INSERT INTO paragraphs_fts(paragraphs_fts) VALUES ('rebuild')")
+        for columns in INDEXED_COLUMNS:
+            connection.execute(f"CREATE INDEX paragraphs_{'_'.join(columns)} ON paragraphs({', '.join(columns)})")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.execute("ANALYZE")
+    connection.close()
+    os.replace(building, path)
+    return loaded
+
+
+def search(connection: sqlite3.Connection, match: str, article_type: Optional[str] = None,
+           year_from: Optional[int] = None, year_to: Optional[int] = None,
+           newspaper_title: Optional[str] = None, limit: Optional[int] = None) -> List[sqlite3.Row]:
+    """
+    Paragraphs matching the FTS5 query `match` (a word, "a phrase", NEAR(a b, 5),
+    a OR b, ...) filtered on the metadata columns, in corpus order.
+    """
+    conditions: List[str] = ["paragraphs_fts MATCH ?"]
+    parameters: List[Any] = [match]
+    for condition, value in [("p.article_type = ?", article_type), ("p.year >= ?", year_from),
+                             ("p.year <= ?", year_to), ("p.newspaper_title = ?", newspaper_title)]:
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    query: str = (f"SELECT p.* FROM paragraphs_fts JOIN paragraphs p ON p.id = paragraphs_fts.rowid "
+                  f"WHERE {' AND '.join(conditions)} ORDER BY p.id")
+    if limit is not None:
+        query += " LIMIT ?"
+        parameters.append(limit)
+    cursor: sqlite3.Cursor = connection.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor.execute(query, parameters).fetchall()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the cleaned paragraphs to a SQLite FTS5 database, "
+                                                 "or query it")
+    parser.add_argument("--build", action="store_true", help="(re)build the database from the cleaned corpus")
+    parser.add_argument("--database", type=Path, default=CORPUS_DATABASE)
+    parser.add_argument("--query", default=None, help='FTS5 query, e.g. sugar or "east india"')
+    parser.add_argument("--article-type", default=None, help='e.g. "Classified ads"')
+    parser.add_argument("--years", type=int, nargs=2, default=None, metavar=("FROM", "TO"))
+    parser.add_argument("--newspaper", default=None, help="exact newspaper title")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.build:
+        print(f"{build_corpus_database(iter_cleaned_articles(), args.database)} paragraphs loaded "
+              f"into {args.database}")
+    if args.query is not None:
+        year_from, year_to = args.years if args.years is not None else (None, None)
+        connection = sqlite3.connect(args.database)
+        for row in search(connection, args.query, args.article_type, year_from, year_to, args.newspaper,
+                          args.limit):
+            print(f"{row['article_id']} [{row['paragraph']}] {row['issue_date_start']} "
+                  f"{row['newspaper_title']}: {(row['text_cased'] or row['text'])[:200]}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
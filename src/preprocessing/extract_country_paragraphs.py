@@ -5,13 +5,17 @@ import geopandas as gpd
 import multiprocessing as mp
 from functools import partial
 
-from settings import DATA_FOLDER
+from preprocessing.instrumentation import count, finish_run, start_run
+from preprocessing.shards import PARAGRAPH_COLUMNS, read_shard_article
+from settings import DATA_FOLDER, CLEANED_SHARDS_FOLDER
 
 CLEANED_ARTICLES_FOLDER = DATA_FOLDER/"cleaned_articles/"
 THRESHOLD = 2
 PARAGRAPH_THRESHOLD = 2
 
 def process_line(line, india_places, output_dir, cleaned_articles_folder):
+    count("items_in")
+    count("bytes_read", len(line))
     data = json.loads(line.strip())
     
     # Flatten the found_words list if it contains sublists
@@ -38,28 +42,35 @@ def process_line(line, india_places, output_dir, cleaned_articles_folder):
     if india_place_count >= THRESHOLD and india_paragraph_indexes:
         filename = data['file_name']
         
-        # Open the source JSON file to extract specific texts
-        source_path = cleaned_articles_folder / filename
-        with open(source_path, 'r') as source_file:
-            source_data = json.load(source_file)
-            
-            # Extract only texts that contain the Indian words
-            indian_texts = []
-            for idx_str in india_paragraph_indexes:
-                # Convert string index to integer if needed
-                idx = int(idx_str) if isinstance(idx_str, str) else idx_str
-                indian_texts.append(source_data["texts"][idx])
-            
-            # Create a new data structure with only the relevant texts
-            filtered_data = source_data.copy()
-            filtered_data["texts"] = indian_texts
-            
-            # Write the filtered data to the output directory
-            dest_path = os.path.join(output_dir, filename)
-            with open(dest_path, 'w') as dest_file:
-                json.dump(filtered_data, dest_file, indent=2)
-            
-            return 1
+        # Open the source JSON file (or its rows in a shard) to extract specific texts
+        if "shard" in data:
+            source_data = read_shard_article(CLEANED_SHARDS_FOLDER, data)
+        else:
+            source_path = cleaned_articles_folder / filename
+            with open(source_path, 'rb') as source_file:
+                raw = source_file.read()
+            count("bytes_read", len(raw))
+            source_data = json.loads(raw)
+
+        # Extract only texts that contain the Indian words
+        # Convert string index to integer if needed
+        indexes = [int(idx_str) if isinstance(idx_str, str) else idx_str for idx_str in india_paragraph_indexes]
+
+        # Create a new data structure with only the relevant texts, the other
+        # per-paragraph lists (hashes, languages) stay aligned with them
+        filtered_data = source_data.copy()
+        for key in PARAGRAPH_COLUMNS:
+            if key in source_data:
+                filtered_data[key] = [source_data[key][idx] for idx in indexes]
+        
+        # Write the filtered data to the output directory
+        dest_path = os.path.join(output_dir, filename)
+        with open(dest_path, 'w') as dest_file:
+            json.dump(filtered_data, dest_file, indent=2)
+            count("bytes_written", dest_file.tell())
+        
+        count("items_out")
+        return 1
 
     return 0
 
@@ -77,8 +88,8 @@ def process_files(gpkg_path, jsonl_file, output_dir, country_of_interest:str, nu
     if num_processes is None:
         num_processes = mp.cpu_count()
     
-    # Read all lines from the JSONL file
-    with open(jsonl_file, 'r', encoding='utf-8') as f:
+    # Read all lines from the JSONL file (as bytes, the workers decode them)
+    with open(jsonl_file, 'rb') as f:
         lines = f.readlines()
     
     # Create a partial function with the common arguments
@@ -92,6 +103,9 @@ def process_files(gpkg_path, jsonl_file, output_dir, country_of_interest:str, nu
     # Create a pool of workers and map the processing function to the lines
     with mp.Pool(processes=num_processes) as pool:
         results = pool.map(process_func, lines)
+        # close + join instead of terminate so the workers write their run report
+        pool.close()
+        pool.join()
     
     # Count the total files copied
     files_copied = sum(results)
@@ -106,4 +120,6 @@ if __name__ == "__main__":
     if output_dir.exists():
         shutil.rmtree(output_dir)
     
-    process_files(gpkg_path, jsonl, output_dir, country_of_interest)
\ No newline at end of file
+    start_run("extract_country_paragraphs")
+    process_files(gpkg_path, jsonl, output_dir, country_of_interest)
+    finish_run()
\ No newline at end of file
@@ -0,0 +1,184 @@
+import functools
+import glob
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from settings import USE_INSTRUMENTATION, RUN_REPORTS_FOLDER
+
+# Set by start_run in the parent, inherited by every worker process
+RUN_ID_ENV: str = "PIPELINE_RUN_ID"
+STAGE_ENV: str = "PIPELINE_STAGE"
+
+
+class Recorder:
+    """
+    What one process did for a stage: wall and CPU time since it started
+    recording, counters (items_in, items_out, bytes_read, bytes_written, ...)
+    and the time and number of calls spent in every named hot spot.
+    """
+
+    def __init__(self, stage: str) -> None:
+        self.stage: str = stage
+        self.pid: int = os.getpid()
+        self.wall_start: float = time.perf_counter()
+        self.cpu_start: float = time.process_time()
+        self.counters: Counter = Counter()
+        self.hotspot_seconds: Counter = Counter()
+        self.hotspot_calls: Counter = Counter()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "pid": self.pid,
+            "wall_seconds": time.perf_counter() - self.wall_start,
+            "cpu_seconds": time.process_time() - self.cpu_start,
+            "counters": dict(self.counters),
+            "hotspots": {name: {"seconds": seconds, "calls": self.hotspot_calls[name]}
+                         for name, seconds in self.hotspot_seconds.items()},
+        }
+
+    def dump(self, folder: Path) -> None:
+        os.makedirs(folder, exist_ok=True)
+        with open(folder / f"process-{self.pid}.json", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+
+
+RECORDER: Optional[Recorder] = None
+
+
+def run_folder() -> Path:
+    return RUN_REPORTS_FOLDER / os.environ[RUN_ID_ENV]
+
+def get_recorder() -> Optional[Recorder]:
+    """
+    The recorder of the current process, created on first use in a worker.
+    A forked worker inherits the parent's recorder, so the pid is checked.
+    Workers write their snapshot to the run folder when they exit, which
+    needs pools to be closed and joined rather than terminated.
+    """
+    global RECORDER
+    if not USE_INSTRUMENTATION or RUN_ID_ENV not in os.environ:
+        return None
+    if RECORDER is None or RECORDER.pid != os.getpid():
+        RECORDER = Recorder(os.environ[STAGE_ENV])
+        Finalize(RECORDER, RECORDER.dump, args=(run_folder(),), exitpriority=1)
+    return RECORDER
+
+def start_run(stage: str) -> None:
+    """
+    Starts recording a pipeline stage in the parent process. No-op when
+    instrumentation is off.
+    """
+    if not USE_INSTRUMENTATION:
+        return
+    os.environ[RUN_ID_ENV] = f"{stage}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    os.environ[STAGE_ENV] = stage
+    get_recorder()
+
+def count(key: str, n: int = 1) -> None:
+    if not USE_INSTRUMENTATION:
+        return
+    recorder: Optional[Recorder] = get_recorder()
+    if recorder is not None:
+        recorder.counters[key] += n
+
+def hotspot(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator (or wrapper, `hotspot("spacy")(nlp)`) that adds the time spent
+    in a function to the named hot spot. When instrumentation is off the
+    function is returned unchanged, so it costs nothing.
+    """
+    def decorate(function: Callable) -> Callable:
+        if not USE_INSTRUMENTATION:
+            return function
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            recorder: Optional[Recorder] = get_recorder()
+            if recorder is None:
+                return function(*args, **kwargs)
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.hotspot_seconds[name] += time.perf_counter() - start
+                recorder.hotspot_calls[name] += 1
+        return timed_function
+    return decorate
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Context manager form of hotspot, for coarse blocks such as a whole phase.
+    """
+    recorder: Optional[Recorder] = get_recorder()
+    if recorder is None:
+        yield
+        return
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.hotspot_seconds[name] += time.perf_counter() - start
+        recorder.hotspot_calls[name] += 1
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counters: Counter = Counter()
+    hotspot_seconds: Counter = Counter()
+    hotspot_calls: Counter = Counter()
+    for snapshot in snapshots:
+        counters.update(snapshot["counters"])
+        for name, hotspot_totals in snapshot["hotspots"].items():
+            hotspot_seconds[name] += hotspot_totals["seconds"]
+            hotspot_calls[name] += hotspot_totals["calls"]
+    return {
+        "cpu_seconds": sum(snapshot["cpu_seconds"] for snapshot in snapshots),
+        "worker_wall_seconds": sum(snapshot["wall_seconds"] for snapshot in snapshots),
+        "counters": dict(counters),
+        "hotspots": {name: {"seconds": seconds, "calls": hotspot_calls[name]}
+                     for name, seconds in hotspot_seconds.most_common()},
+    }
+
+def finish_run(extra: Optional[Dict[str, Any]] = None) -> Optional[Path]:
+    """
+    Merges the snapshots of the parent and of every worker into one JSON run
+    report next to the run folder and returns its path. `extra` is stored as
+    is, e.g. the cleaning path counts of clean_dataset.
+    """
+    recorder: Optional[Recorder] = get_recorder()
+    if recorder is None:
+        return None
+    folder: Path = run_folder()
+    recorder.dump(folder)
+    snapshots: List[Dict[str, Any]] = []
+    for path in sorted(glob.glob(str(folder / "process-*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            snapshots.append(json.load(f))
+
+    parent: Dict[str, Any] = recorder.snapshot()
+    report: Dict[str, Any] = {
+        "run_id": folder.name,
+        "stage": recorder.stage,
+        "wall_seconds": parent["wall_seconds"],
+        "processes": len(snapshots),
+        "totals": merge_snapshots(snapshots),
+        "per_process": snapshots,
+        "extra": extra or {},
+    }
+    wall: float = report["wall_seconds"]
+    counters: Dict[str, int] = report["totals"]["counters"]
+    if wall:
+        report["throughput"] = {f"{key}_per_second": value / wall for key, value in counters.items()}
+
+    report_path: Path = RUN_REPORTS_FOLDER / f"{folder.name}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Run report saved to {report_path}")
+    return report_path
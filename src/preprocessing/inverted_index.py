@@ -0,0 +1,393 @@
+import argparse
+import bisect
+import json
+import os
+import shutil
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from preprocessing.metadata import is_fresh
+from preprocessing.shards import iter_shard_index, read_shard_article
+from settings import CLEANED_DATA_FOLDER, CLEANED_OUTPUT_FORMAT, CLEANED_SHARDS_FOLDER, INVERTED_INDEX_FOLDER
+
+SCHEMA_FILE: str = "schema.json"
+
+# Paragraph numbers and token positions are stored in 16 bits, so a match is
+# one uint64 key: article << 32 | paragraph << 16 | position. Tokens past the
+# limit (a handful of pathological OCR paragraphs) are not indexed.
+MAX_POSITION: int = 2 ** 16 - 1
+PARAGRAPH_MASK: np.uint64 = np.uint64(~MAX_POSITION & (2 ** 64 - 1))
+
+# Postings are sorted in runs of at most this many tokens, spilled to disk and
+# merged per block of terms, so building needs memory for one run, not the corpus
+RUN_POSTINGS: int = 20_000_000
+# The postings streams, in the column order of byte_offsets.npy
+STREAMS: Tuple[str, ...] = ("articles", "paragraphs", "positions")
+
+
+class Postings(NamedTuple):
+    """
+    Matches of a query as parallel arrays, sorted by article, paragraph and
+    position. For a phrase the position is that of its first word.
+    """
+    articles: np.ndarray
+    paragraphs: np.ndarray
+    positions: np.ndarray
+
+
+def write_strings(folder: Path, name: str, values: List[str]) -> None:
+    encoded: List[bytes] = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(folder / f"{name}.bytes", "wb") as f:
+        for value in encoded:
+            f.write(value)
+    np.save(folder / f"{name}.offsets.npy", offsets)
+
+def map_bytes(path: Path) -> np.ndarray:
+    # np.memmap refuses empty files
+    return np.memmap(path, dtype=np.uint8, mode="r") if path.stat().st_size > 0 else np.zeros(0, dtype=np.uint8)
+
+
+def encode_varints(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    LEB128 encoding of non-negative integers: 7 bits per byte, the high bit
+    set on every byte but the last of a value.
+
+    Returns:
+        (the encoded bytes, the number of bytes of every value)
+    """
+    values = values.astype(np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= np.uint64(1 << (7 * k))
+    starts: np.ndarray = np.cumsum(lengths) - lengths
+    encoded = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max()) if len(values) else 0):
+        has_byte: np.ndarray = lengths > k
+        low_bits: np.ndarray = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        continues: np.ndarray = (lengths[has_byte] > k + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[has_byte] + k] = low_bits | continues
+    return encoded, lengths
+
+def decode_varints(encoded: np.ndarray) -> np.ndarray:
+    encoded = np.asarray(encoded)
+    if len(encoded) == 0:
+        return np.zeros(0, dtype=np.int64)
+    last_byte: np.ndarray = encoded < 0x80
+    starts: np.ndarray = np.flatnonzero(np.concatenate(([True], last_byte[:-1])))
+    value_of_byte: np.ndarray = np.cumsum(last_byte) - last_byte
+    shifts: np.ndarray = ((np.arange(len(encoded)) - starts[value_of_byte]) * 7).astype(np.uint64)
+    return np.bitwise_or.reduceat((encoded & 0x7F).astype(np.uint64) << shifts, starts).astype(np.int64)
+
+def segment_starts(terms: np.ndarray, articles: np.ndarray, paragraphs: np.ndarray) -> np.ndarray:
+    """
+    Where a new (term, article, paragraph) starts in sorted postings, i.e.
+    where the positions restart instead of being deltas.
+    """
+    changed: np.ndarray = ((terms[1:] != terms[:-1]) | (articles[1:] != articles[:-1])
+                           | (paragraphs[1:] != paragraphs[:-1]))
+    return np.concatenate(([True], changed)) if len(terms) else np.zeros(0, dtype=bool)
+
+
+def iter_cleaned_articles() -> Iterator[Dict[str, Any]]:
+    if CLEANED_OUTPUT_FORMAT == "shards":
+        for entry in iter_shard_index(CLEANED_SHARDS_FOLDER):
+            yield read_shard_article(CLEANED_SHARDS_FOLDER, entry)
+        return
+    for file_path in sorted(CLEANED_DATA_FOLDER.glob("*.json")):
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield json.load(f)
+
+def cleaned_corpus_files() -> List[Path]:
+    if CLEANED_OUTPUT_FORMAT == "shards":
+        return sorted(CLEANED_SHARDS_FOLDER.glob("*.jsonl"))
+    return sorted(CLEANED_DATA_FOLDER.glob("*.json"))
+
+def is_index_fresh(folder: Path) -> bool:
+    """
+    Whether an index exists in `folder` and was built after the last change
+    to the cleaned corpus.
+    """
+    return is_fresh(folder / SCHEMA_FILE, *cleaned_corpus_files())
+
+
+def write_run(runs_folder: Path, number: int, vocabulary: Dict[str, int], term_ids: array, article_ids: array,
+              paragraph_ids: array, positions: array) -> Path:
+    """
+    Spills the postings collected so far, sorted by term. Terms compare as
+    strings, which does not change as the vocabulary grows, so every run is
+    already in the order of the final sorted vocabulary.
+    """
+    run_folder: Path = runs_folder / f"{number:05d}"
+    os.makedirs(run_folder)
+    rank = np.empty(len(vocabulary), dtype=np.uint32)
+    rank[[vocabulary[term] for term in sorted(vocabulary)]] = np.arange(len(vocabulary), dtype=np.uint32)
+    ids: np.ndarray = np.frombuffer(term_ids, dtype=np.uint32)
+    # Postings were appended in article, paragraph, position order, a stable sort keeps it per term
+    order: np.ndarray = np.argsort(rank[ids], kind="stable")
+    np.save(run_folder / "terms.npy", ids[order])
+    np.save(run_folder / "articles.npy", np.frombuffer(article_ids, dtype=np.uint32)[order])
+    np.save(run_folder / "paragraphs.npy", np.frombuffer(paragraph_ids, dtype=np.uint16)[order])
+    np.save(run_folder / "positions.npy", np.frombuffer(positions, dtype=np.uint16)[order])
+    return run_folder
+
+def merge_runs(run_folders: List[Path], rank: np.ndarray, folder: Path, block_postings: int) -> int:
+    """
+    Merges the sorted runs into the final postings streams, one block of
+    consecutive terms at a time. Within a term the runs cover increasing
+    articles, so a block is the runs' slices concatenated in run order and
+    stably sorted by term.
+
+    Returns:
+        int: the number of postings
+    """
+    n_terms: int = len(rank)
+    runs: List[Dict[str, np.ndarray]] = []
+    counts = np.zeros(n_terms, dtype=np.int64)
+    for run_folder in run_folders:
+        run: Dict[str, np.ndarray] = {name: np.load(run_folder / f"{name}.npy", mmap_mode="r")
+                                      for name in ("terms", *STREAMS)}
+        run_counts: np.ndarray = np.bincount(rank[run["terms"]], minlength=n_terms)
+        run["offsets"] = np.concatenate(([0], np.cumsum(run_counts)))
+        counts += run_counts
+        runs.append(run)
+    term_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(counts, out=term_offsets[1:])
+    np.save(folder / "term_offsets.npy", term_offsets)
+
+    byte_counts = np.zeros((n_terms, len(STREAMS)), dtype=np.int64)
+    outputs = {name: open(folder / f"{name}.bytes", "wb") for name in STREAMS}
+    first: int = 0
+    with tqdm(total=n_terms, desc="Merging postings") as progress:
+        while first < n_terms:
+            # At least one term per block, however many postings it has
+            last: int = max(first + 1, int(np.searchsorted(term_offsets, term_offsets[first] + block_postings,
+                                                           side="right")) - 1)
+            last = min(last, n_terms)
+            terms: np.ndarray = np.concatenate([rank[run["terms"][run["offsets"][first]:run["offsets"][last]]]
+                                                for run in runs])
+            order: np.ndarray = np.argsort(terms, kind="stable")
+            terms = terms[order]
+            block: Dict[str, np.ndarray] = {
+                name: np.concatenate([run[name][run["offsets"][first]:run["offsets"][last]]
+                                      for run in runs]).astype(np.int64)[order]
+                for name in STREAMS
+            }
+            term_start: np.ndarray = np.concatenate(([True], terms[1:] != terms[:-1])) if len(terms) else terms
+            # Article numbers as gaps within each term, positions as gaps within each paragraph
+            articles: np.ndarray = np.diff(block["articles"], prepend=0)
+            articles[term_start] = block["articles"][term_start]
+            positions: np.ndarray = np.diff(block["positions"], prepend=0)
+            restart: np.ndarray = segment_starts(terms, block["articles"], block["paragraphs"])
+            positions[restart] = block["positions"][restart]
+            for column, (name, values) in enumerate(zip(STREAMS, (articles, block["paragraphs"], positions))):
+                encoded, lengths = encode_varints(values)
+                outputs[name].write(encoded.tobytes())
+                byte_counts[first:last, column] = np.bincount(terms - first, weights=lengths,
+                                                              minlength=last - first)
+            progress.update(last - first)
+            first = last
+    for output in outputs.values():
+        output.close()
+
+    byte_offsets = np.zeros((n_terms + 1, len(STREAMS)), dtype=np.int64)
+    np.cumsum(byte_counts, axis=0, out=byte_offsets[1:])
+    np.save(folder / "byte_offsets.npy", byte_offsets)
+    return int(term_offsets[-1])
+
+def build_inverted_index(articles: Iterator[Dict[str, Any]], folder: Path,
+                         run_postings: int = RUN_POSTINGS) -> None:
+    """
+    Writes a positional inverted index of the normalised paragraphs into a
+    folder of memory-mappable files:
+
+    - `terms.bytes` + `terms.offsets.npy`: the sorted vocabulary
+    - `term_offsets.npy`: how many postings precede every term
+    - `articles.bytes`, `paragraphs.bytes`, `positions.bytes`: the postings,
+      grouped per term and sorted by article, paragraph and position, as
+      LEB128 varints. Article numbers are gaps within the term and positions
+      gaps within the paragraph, so most take one byte
+    - `byte_offsets.npy`: where every term starts in each of the three streams
+    - `names.bytes` + `names.offsets.npy`: the file_name of every article
+    - `schema.json`, written last so a half-built index is never picked up
+
+    Postings are collected in runs of `run_postings` tokens that are sorted
+    and spilled to disk, then merged.
+    """
+    os.makedirs(folder, exist_ok=True)
+    runs_folder: Path = folder / "runs"
+    shutil.rmtree(runs_folder, ignore_errors=True)
+    os.makedirs(runs_folder)
+    vocabulary: Dict[str, int] = {}
+    term_ids, article_ids, paragraph_ids, positions = array("I"), array("I"), array("H"), array("H")
+    run_folders: List[Path] = []
+    names: List[str] = []
+    for article in tqdm(articles, desc="Indexing paragraphs"):
+        article_number: int = len(names)
+        names.append(article["file_name"])
+        for paragraph, text in enumerate(article.get("texts", [])[:MAX_POSITION + 1]):
+            tokens: List[str] = text.split()[:MAX_POSITION + 1]
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            article_ids.extend([article_number] * len(tokens))
+            paragraph_ids.extend([paragraph] * len(tokens))
+            positions.extend(range(len(tokens)))
+        if len(term_ids) >= run_postings:
+            run_folders.append(write_run(runs_folder, len(run_folders), vocabulary, term_ids, article_ids,
+                                         paragraph_ids, positions))
+            term_ids, article_ids, paragraph_ids, positions = array("I"), array("I"), array("H"), array("H")
+    if len(term_ids) or not run_folders:
+        run_folders.append(write_run(runs_folder, len(run_folders), vocabulary, term_ids, article_ids,
+                                     paragraph_ids, positions))
+
+    terms: List[str] = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.uint32)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms), dtype=np.uint32)
+    n_postings: int = merge_runs(run_folders, rank, folder, run_postings)
+    shutil.rmtree(runs_folder)
+
+    write_strings(folder, "terms", terms)
+    write_strings(folder, "names", names)
+    with open(folder / SCHEMA_FILE, "w", encoding="utf-8") as f:
+        json.dump({"terms": len(terms), "articles": len(names), "postings": n_postings, "encoding": "varint"},
+                  f, indent=2)
+
+
+class StringColumn(Sequence):
+    """
+    A memory-mapped list of strings written by `write_strings`.
+    """
+
+    def __init__(self, folder: Path, name: str) -> None:
+        self.offsets: np.ndarray = np.load(folder / f"{name}.offsets.npy", mmap_mode="r")
+        self.blob: np.ndarray = map_bytes(folder / f"{name}.bytes")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class InvertedIndex:
+    """
+    Read-only view of an index written by `build_inverted_index`. Terms are
+    found by binary search over the mapped vocabulary and only the postings
+    of the queried terms are read, so a query touches a few pages instead of
+    the corpus. Terms are matched against the normalised (lowercased, spell
+    corrected) text.
+    """
+
+    def __init__(self, folder: Path) -> None:
+        with open(folder / SCHEMA_FILE, "r", encoding="utf-8") as f:
+            self.schema: Dict[str, int] = json.load(f)
+        self.terms: StringColumn = StringColumn(folder, "terms")
+        self.names: StringColumn = StringColumn(folder, "names")
+        self.term_offsets: np.ndarray = np.load(folder / "term_offsets.npy", mmap_mode="r")
+        self.byte_offsets: np.ndarray = np.load(folder / "byte_offsets.npy", mmap_mode="r")
+        self.streams: Dict[str, np.ndarray] = {name: map_bytes(folder / f"{name}.bytes") for name in STREAMS}
+
+    def term_id(self, term: str) -> Optional[int]:
+        i: int = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def document_frequency(self, term: str) -> int:
+        """
+        Number of articles that contain the term.
+        """
+        return len(np.unique(self.postings(term).articles))
+
+    def postings(self, term: str) -> Postings:
+        term_id: Optional[int] = self.term_id(term.lower())
+        if term_id is None:
+            return Postings(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        starts, ends = self.byte_offsets[term_id], self.byte_offsets[term_id + 1]
+        articles, paragraphs, positions = (decode_varints(self.streams[name][starts[column]:ends[column]])
+                                           for column, name in enumerate(STREAMS))
+        articles = np.cumsum(articles)
+        # Positions are gaps within a paragraph: a cumulative sum restarted at every paragraph
+        restart: np.ndarray = segment_starts(np.zeros(len(articles), dtype=np.int64), articles, paragraphs)
+        totals: np.ndarray = np.cumsum(positions)
+        before: np.ndarray = (totals - positions)[np.maximum.accumulate(np.where(restart, np.arange(len(restart)), 0))]
+        return Postings(articles, paragraphs, totals - before)
+
+    @staticmethod
+    def to_keys(postings: Postings) -> np.ndarray:
+        return ((postings.articles.astype(np.uint64) << np.uint64(32))
+                | (postings.paragraphs.astype(np.uint64) << np.uint64(16))
+                | postings.positions.astype(np.uint64))
+
+    @staticmethod
+    def from_keys(keys: np.ndarray) -> Postings:
+        return Postings((keys >> np.uint64(32)).astype(np.int64),
+                        ((keys >> np.uint64(16)) & np.uint64(MAX_POSITION)).astype(np.int64),
+                        (keys & np.uint64(MAX_POSITION)).astype(np.int64))
+
+    def phrase(self, phrase: str) -> Postings:
+        """
+        Where the words of `phrase` occur next to each other in one paragraph.
+        """
+        words: List[str] = phrase.lower().split()
+        if not words:
+            return self.from_keys(np.zeros(0, dtype=np.uint64))
+        keys: np.ndarray = self.to_keys(self.postings(words[0]))
+        for offset, word in enumerate(words[1:], 1):
+            following: np.ndarray = self.to_keys(self.postings(word))
+            # Shift the word back to the position of the first one, within its paragraph
+            following = following[(following & np.uint64(MAX_POSITION)) >= offset] - np.uint64(offset)
+            keys = np.intersect1d(keys, following, assume_unique=True)
+            if len(keys) == 0:
+                break
+        return self.from_keys(keys)
+
+    def near(self, first: str, second: str, window: int = 5) -> Postings:
+        """
+        Occurrences of `second` with `first` at most `window` tokens before or
+        after it in the same paragraph (phrases allowed for both), not counting
+        a `first` that starts at the same position.
+        """
+        first_keys: np.ndarray = self.to_keys(self.phrase(first))
+        second_keys: np.ndarray = self.to_keys(self.phrase(second))
+        window_size = np.uint64(window)
+        paragraph_start: np.ndarray = second_keys & PARAGRAPH_MASK
+        low: np.ndarray = np.maximum(second_keys, paragraph_start + window_size) - window_size
+        high: np.ndarray = np.minimum(second_keys + window_size, paragraph_start | np.uint64(MAX_POSITION))
+        # Count `first` in [low, key) and (key, high], so an occurrence never matches itself
+        before: np.ndarray = (np.searchsorted(first_keys, second_keys, side="left")
+                              - np.searchsorted(first_keys, low, side="left"))
+        after: np.ndarray = (np.searchsorted(first_keys, high, side="right")
+                             - np.searchsorted(first_keys, second_keys, side="right"))
+        hits: np.ndarray = (before + after) > 0
+        return self.from_keys(second_keys[hits])
+
+    def article_names(self, postings: Postings) -> List[str]:
+        """
+        The distinct cleaned article files of the matches, in index order.
+        """
+        return [self.names[i] for i in np.unique(postings.articles)]
+
+    def paragraph_matches(self, postings: Postings) -> List[Tuple[str, int]]:
+        """
+        The distinct (file_name, paragraph) pairs of the matches.
+        """
+        pairs: np.ndarray = np.unique(np.stack([postings.articles, postings.paragraphs], axis=1), axis=0)
+        return [(self.names[article], int(paragraph)) for article, paragraph in pairs]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a positional inverted index over the cleaned paragraphs")
+    parser.add_argument("--output", type=Path, default=INVERTED_INDEX_FOLDER)
+    args = parser.parse_args()
+    build_inverted_index(iter_cleaned_articles(), args.output)
+    with open(args.output / SCHEMA_FILE, "r", encoding="utf-8") as f:
+        print(f"Index written to {args.output}: {json.load(f)}")
+
+
+if __name__ == "__main__":
+    main()
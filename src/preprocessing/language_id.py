@@ -0,0 +1,118 @@
+import json
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+ENGLISH: str = "en"
+
+# Frequent function words, used to label the training paragraphs and as the
+# fallback scorer before a model has been trained
+SEED_WORDS: Dict[str, FrozenSet[str]] = {
+    "en": frozenset("the and of to in that is was for with his be by which it as from have this are their "
+                    "not but they were at had been".split()),
+    "la": frozenset("et in est non ad cum quod qui quae sunt ut ab ex per sed autem enim nec atque quam "
+                    "eius esse anno domini regis".split()),
+    "fr": frozenset("le la les de des et du en que qui dans pour est sont nous vous une avec par sur au aux "
+                    "ce il ne pas se son".split()),
+    "nl": frozenset("de het een en van ik te dat die is niet zijn op aan met voor als ook wij hun bij uit "
+                    "naar door".split()),
+}
+# Words in more than one list (de, en, est, et, in, is, qui) say nothing about the
+# language and do not vote
+VOTING_WORDS: Dict[str, str] = {
+    word: language for language, words in SEED_WORDS.items() for word in words
+    if sum(word in other for other in SEED_WORDS.values()) == 1
+}
+
+NGRAM: int = 3
+
+
+def vote_language(tokens: List[str], min_hits: int = 3, min_share: float = 0.6) -> Optional[str]:
+    """
+    The language whose function words make up at least `min_share` of all
+    function word hits, None when the tokens are too few to tell.
+    """
+    hits: Counter = Counter()
+    for token in tokens:
+        language: Optional[str] = VOTING_WORDS.get(token)
+        if language is not None:
+            hits[language] += 1
+    if not hits:
+        return None
+    language, count = hits.most_common(1)[0]
+    if count < min_hits or count / sum(hits.values()) < min_share:
+        return None
+    return language
+
+def char_ngrams(text: str, n: int = NGRAM) -> Counter:
+    padded: str = f" {' '.join(text.split())} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class LanguageScorer:
+    """
+    Naive Bayes over character trigrams. `log_probs` holds the smoothed log
+    probability of the most frequent trigrams of every language, `unseen` the
+    log probability of any other trigram. Only paragraphs that score better
+    than English by `min_margin` (mean log probability per trigram) are
+    tagged with another language, so OCR noise stays English.
+    """
+
+    def __init__(self, log_probs: Dict[str, Dict[str, float]], unseen: Dict[str, float],
+                 min_margin: float = 0.5) -> None:
+        self.log_probs: Dict[str, Dict[str, float]] = log_probs
+        self.unseen: Dict[str, float] = unseen
+        self.min_margin: float = min_margin
+
+    @classmethod
+    def train(cls, samples: Dict[str, List[str]], max_features: int = 5_000, min_margin: float = 0.5) -> "LanguageScorer":
+        log_probs: Dict[str, Dict[str, float]] = {}
+        unseen: Dict[str, float] = {}
+        for language, texts in samples.items():
+            counts: Counter = Counter()
+            for text in texts:
+                counts.update(char_ngrams(text))
+            kept: List[Tuple[str, int]] = counts.most_common(max_features)
+            # Add-one smoothing over the kept trigrams plus one bucket for all others
+            total: int = sum(counts.values()) + len(kept) + 1
+            log_probs[language] = {ngram: math.log((count + 1) / total) for ngram, count in kept}
+            unseen[language] = math.log((sum(counts.values()) - sum(count for _, count in kept) + 1) / total
+                                        / max(1, len(counts) - len(kept)))
+        return cls(log_probs, unseen, min_margin)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        ngrams: Counter = char_ngrams(text)
+        n: int = max(1, sum(ngrams.values()))
+        return {
+            language: sum(count * table.get(ngram, self.unseen[language]) for ngram, count in ngrams.items()) / n
+            for language, table in self.log_probs.items()
+        }
+
+    def predict(self, text: str) -> str:
+        scores: Dict[str, float] = self.scores(text)
+        language: str = max(scores, key=scores.get)
+        if language == ENGLISH or ENGLISH not in scores:
+            return language
+        return language if scores[language] - scores[ENGLISH] >= self.min_margin else ENGLISH
+
+    def save(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"ngram": NGRAM, "min_margin": self.min_margin, "unseen": self.unseen,
+                       "log_probs": self.log_probs}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path) -> "LanguageScorer":
+        with open(path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        return cls(model["log_probs"], model["unseen"], model["min_margin"])
+
+
+def detect_language(text: str, scorer: Optional[LanguageScorer]) -> str:
+    """
+    The language of a normalised paragraph: the trained scorer when there is
+    one, otherwise the function word vote, English when in doubt.
+    """
+    if scorer is not None:
+        return scorer.predict(text)
+    return vote_language(text.lower().split()) or ENGLISH
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set
+
+from preprocessing.sources import RawSource, read_source_bytes, source_key, source_stat
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+def file_fingerprint(source: RawSource, data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Size, mtime and content hash of a source file or tar member. Pass the
+    already read bytes as `data` to avoid reading it a second time for the hash.
+    """
+    size, mtime = source_stat(source)
+    return {
+        "size": size,
+        "mtime": mtime,
+        "sha1": hash_bytes(data if data is not None else read_source_bytes(source)),
+    }
+
+
+class IngestManifest:
+    """
+    Append-only JSONL log of completed ingest inputs. Every line records one
+    source file with its size, mtime, sha1 and the output files it produced;
+    the last line for a source wins, so a source that is redone simply gets a
+    new line. A half-written last line left by a crash is ignored on load.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry: Dict[str, Any] = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.entries[entry["source"]] = entry
+
+    def record(self, source: str, fingerprint: Dict[str, Any], outputs: List[str]) -> None:
+        entry: Dict[str, Any] = {"source": source, **fingerprint, "outputs": outputs}
+        self.entries[source] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_complete(self, source: RawSource, existing_outputs: Set[str]) -> bool:
+        entry: Optional[Dict[str, Any]] = self.entries.get(source_key(source))
+        if entry is None:
+            return False
+        if not all(output in existing_outputs for output in entry["outputs"]):
+            return False
+
+        size, mtime = source_stat(source)
+        if size != entry["size"]:
+            return False
+        if mtime == entry["mtime"]:
+            return True
+        # Touched but maybe not changed, only then pay for hashing the file
+        return hash_bytes(read_source_bytes(source)) == entry["sha1"]
+
+    def pending(self, sources: List[RawSource], output_folder: Path) -> List[RawSource]:
+        """
+        Sources that are new, changed, or whose outputs went missing. The output
+        folder is listed once instead of stat-ing every recorded output file.
+        """
+        existing_outputs: Set[str] = set(os.listdir(output_folder)) if output_folder.exists() else set()
+        return [source for source in sources if not self.is_complete(source, existing_outputs)]
@@ -0,0 +1,129 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import polars as pl
+
+from preprocessing.metadata import is_fresh, load_normalised_metadata
+from settings import FILE_POLITICAL_AFFILIATIONS
+
+KEY_COLUMN: str = "article_id"
+SCHEMA_FILE: str = "schema.json"
+
+
+def _write_string_column(folder: Path, name: str, series: pl.Series) -> None:
+    encoded: List[bytes] = [value.encode("utf-8") if value is not None else b"" for value in series.to_list()]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(folder / f"{name}.bytes", "wb") as f:
+        for value in encoded:
+            f.write(value)
+    np.save(folder / f"{name}.offsets.npy", offsets)
+
+def build_meta_index(meta_df: pl.DataFrame, folder: Path) -> None:
+    """
+    Compiles the metadata table into a folder of flat, memory-mappable columns
+    sorted by article_id:
+
+    - `keys.npy`: fixed-width bytes array of the sorted article ids
+    - numeric columns: `<name>.npy`
+    - string columns: one `<name>.bytes` blob plus `<name>.offsets.npy`
+    - `<name>.nulls.npy`: null mask of every column
+    - `schema.json`: column names and kinds, written last so a half-built
+      index is never picked up
+    """
+    os.makedirs(folder, exist_ok=True)
+    meta_df = meta_df.unique(subset=KEY_COLUMN, keep="last").sort(KEY_COLUMN)
+
+    keys = np.array([key.encode("utf-8") for key in meta_df[KEY_COLUMN].to_list()], dtype=bytes)
+    np.save(folder / "keys.npy", keys)
+
+    schema: Dict[str, str] = {}
+    for name in meta_df.columns:
+        series: pl.Series = meta_df[name]
+        np.save(folder / f"{name}.nulls.npy", series.is_null().to_numpy())
+        if series.dtype.is_integer():
+            np.save(folder / f"{name}.npy", series.fill_null(0).cast(pl.Int64).to_numpy())
+            schema[name] = "int"
+        elif series.dtype.is_float():
+            np.save(folder / f"{name}.npy", series.fill_null(0.0).cast(pl.Float64).to_numpy())
+            schema[name] = "float"
+        elif series.dtype == pl.Boolean:
+            np.save(folder / f"{name}.npy", series.fill_null(False).to_numpy())
+            schema[name] = "bool"
+        else:
+            _write_string_column(folder, name, series.cast(pl.Utf8))
+            schema[name] = "str"
+
+    with open(folder / SCHEMA_FILE, "w", encoding="utf-8") as f:
+        json.dump({"columns": schema, "rows": len(keys)}, f, indent=2)
+
+def ensure_meta_index(csv_path: Path, folder: Path) -> None:
+    """
+    Builds the index from the normalised metadata (parsed dates, years,
+    collection, political affiliations) unless an index newer than the CSV
+    and the political affiliations already exists.
+    """
+    if is_fresh(folder / SCHEMA_FILE, csv_path, FILE_POLITICAL_AFFILIATIONS):
+        return
+    print(f"Compiling {csv_path} into {folder}...")
+    meta_df: pl.DataFrame = load_normalised_metadata(csv_path)
+    build_meta_index(meta_df, folder)
+
+
+class MetaIndex:
+    """
+    Read-only view of an index written by `build_meta_index`. All arrays are
+    opened with mmap, so every process mapping the same folder shares the
+    pages through the OS page cache instead of holding its own copy.
+    Lookups are a binary search over the sorted keys.
+    """
+
+    def __init__(self, folder: Path) -> None:
+        with open(folder / SCHEMA_FILE, "r", encoding="utf-8") as f:
+            self.schema: Dict[str, str] = json.load(f)["columns"]
+        self.keys: np.ndarray = np.load(folder / "keys.npy", mmap_mode="r")
+        self.nulls: Dict[str, np.ndarray] = {}
+        self.values: Dict[str, np.ndarray] = {}
+        self.offsets: Dict[str, np.ndarray] = {}
+        for name, kind in self.schema.items():
+            self.nulls[name] = np.load(folder / f"{name}.nulls.npy", mmap_mode="r")
+            if kind == "str":
+                self.offsets[name] = np.load(folder / f"{name}.offsets.npy", mmap_mode="r")
+                blob_path: Path = folder / f"{name}.bytes"
+                # np.memmap refuses empty files
+                self.values[name] = (np.memmap(blob_path, dtype=np.uint8, mode="r")
+                                     if blob_path.stat().st_size > 0 else np.zeros(0, dtype=np.uint8))
+            else:
+                self.values[name] = np.load(folder / f"{name}.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def position(self, article_id: str) -> Optional[int]:
+        key: bytes = article_id.encode("utf-8")
+        pos: int = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return pos
+        return None
+
+    def __contains__(self, article_id: str) -> bool:
+        return self.position(article_id) is not None
+
+    def row(self, pos: int) -> Dict[str, Any]:
+        row: Dict[str, Any] = {}
+        for name, kind in self.schema.items():
+            if self.nulls[name][pos]:
+                row[name] = None
+            elif kind == "str":
+                start, end = self.offsets[name][pos], self.offsets[name][pos + 1]
+                row[name] = self.values[name][start:end].tobytes().decode("utf-8")
+            else:
+                row[name] = self.values[name][pos].item()
+        return row
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        pos: Optional[int] = self.position(article_id)
+        return self.row(pos) if pos is not None else None
@@ -0,0 +1,140 @@
+import re
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import polars as pl
+
+from settings import FILE_POLITICAL_AFFILIATIONS
+
+# Unknown day or month is written as 00 (1750-03-00, 1750-00-00); it is read as the first
+UNKNOWN_DATE_PART_PATTERN = re.compile(r"-00(?=-|$)")
+
+# Columns of the political affiliations table that can be joined on, with the
+# metadata column they match; the first one present is used
+POLITICAL_JOIN_KEYS: Dict[str, str] = {"title_code": "title_code", "nlp": "title_code",
+                                       "newspaper_title": "newspaper_title", "title": "newspaper_title"}
+
+
+def load_metadata_frame(csv_path: Path) -> pl.DataFrame:
+    return pl.read_csv(csv_path, schema_overrides={"issue_no": pl.Utf8})
+
+def parse_date_column(column: str) -> pl.Expr:
+    return (pl.col(column).cast(pl.Utf8).str.replace(r"-00$", "-01").str.replace(r"-00-", "-01-")
+            .str.to_date("%Y-%m-%d", strict=False))
+
+def load_political_affiliations(path: Path) -> Optional[pl.DataFrame]:
+    """
+    The political affiliation of the newspaper titles, keyed by the metadata
+    column it can be joined on, other columns prefixed with `political_`.
+    None when the table is missing or has no usable key.
+    """
+    if not path.exists():
+        return None
+    political: pl.DataFrame = pl.read_csv(path, infer_schema_length=None)
+    political = political.rename({name: name.strip().lower().replace(" ", "_") for name in political.columns})
+    for column, key in POLITICAL_JOIN_KEYS.items():
+        if column in political.columns:
+            political = political.unique(subset=column, keep="first").rename({column: key})
+            return political.rename({name: f"political_{name}" for name in political.columns
+                                     if name != key and not name.startswith("political")})
+    print(f"No join column ({', '.join(POLITICAL_JOIN_KEYS)}) in {path}, political affiliations skipped")
+    return None
+
+def normalise_metadata(meta_df: pl.DataFrame, political: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+    """
+    Adds the parsed columns every stage needs, so no one reparses date strings:
+
+    - `date_start`, `date_end`: dates, unknown days and months read as the first
+    - `year_start`, `year_end` and `year`, the midpoint year of the issue
+    - `decade` of the midpoint year
+    - `title_code` (NICNF0328) and `collection` (NICNF), from the article id
+    - the `political_*` columns of the political affiliations table
+    """
+    meta_df = meta_df.with_columns(
+        parse_date_column("issue_date_start").alias("date_start"),
+        parse_date_column("issue_date_end").alias("date_end"),
+        pl.col("article_id").str.split("-").list.first().alias("title_code"),
+    ).with_columns(
+        pl.col("date_start").dt.year().alias("year_start"),
+        pl.coalesce(pl.col("date_end"), pl.col("date_start")).dt.year().alias("year_end"),
+        pl.col("title_code").str.extract(r"^([A-Za-z]+)").alias("collection"),
+    ).with_columns(
+        (pl.col("year_start") + (pl.col("year_end") - pl.col("year_start")) // 2).alias("year"),
+    ).with_columns(
+        (pl.col("year") // 10 * 10).alias("decade"),
+    )
+    if political is not None:
+        key: str = next(column for column in political.columns if column in POLITICAL_JOIN_KEYS.values())
+        meta_df = meta_df.join(political, on=key, how="left")
+    return meta_df
+
+def load_normalised_metadata(csv_path: Path, political_path: Path = FILE_POLITICAL_AFFILIATIONS) -> pl.DataFrame:
+    return normalise_metadata(load_metadata_frame(csv_path), load_political_affiliations(political_path))
+
+def is_fresh(output_path: Path, *input_paths: Path) -> bool:
+    return output_path.exists() and all(output_path.stat().st_mtime >= path.stat().st_mtime
+                                        for path in input_paths if path.exists())
+
+def ensure_metadata_parquet(csv_path: Path, parquet_path: Path,
+                            political_path: Path = FILE_POLITICAL_AFFILIATIONS) -> None:
+    """
+    Writes the normalised metadata table once as typed Parquet, so workers can
+    memory-map it instead of parsing the CSV again. Skipped when the Parquet
+    file is newer than the CSV and the political affiliations.
+    """
+    if is_fresh(parquet_path, csv_path, political_path):
+        return
+    print(f"Converting {csv_path} to {parquet_path}...")
+    load_normalised_metadata(csv_path, political_path).write_parquet(parquet_path)
+
+def load_prefixed_metadata(parquet_path: Path) -> pl.DataFrame:
+    """
+    The metadata table with every column renamed to `meta_<column>`, the shape
+    in which it is merged into the cleaned articles.
+    """
+    meta_df: pl.DataFrame = pl.read_parquet(parquet_path, memory_map=True)
+    # Dates as ISO strings, like the memory-mapped index, so the articles stay JSON serialisable
+    meta_df = meta_df.with_columns(pl.col(pl.Date).cast(pl.Utf8))
+    return meta_df.rename({name: f"meta_{name}" for name in meta_df.columns})
+
+
+# For articles cleaned before the parsed columns existed, the same rules on
+# the meta_issue_date_* strings
+
+def parse_date(date_str: Optional[str]) -> Optional[date]:
+    if not date_str:
+        return None
+    try:
+        return date.fromisoformat(UNKNOWN_DATE_PART_PATTERN.sub("-01", date_str))
+    except ValueError:
+        return None
+
+def article_date_start(article: Dict[str, Any]) -> Optional[date]:
+    value = article.get("meta_date_start")
+    return date.fromisoformat(value) if value else parse_date(article.get("meta_issue_date_start"))
+
+def article_date_end(article: Dict[str, Any]) -> Optional[date]:
+    value = article.get("meta_date_end")
+    return date.fromisoformat(value) if value else parse_date(article.get("meta_issue_date_end"))
+
+def article_start_year(article: Dict[str, Any]) -> Optional[int]:
+    if article.get("meta_year_start") is not None:
+        return article["meta_year_start"]
+    start: Optional[date] = article_date_start(article)
+    return start.year if start is not None else None
+
+def article_year(article: Dict[str, Any]) -> Optional[int]:
+    """
+    The midpoint year of the issue of a cleaned article.
+    """
+    if article.get("meta_year") is not None:
+        return article["meta_year"]
+    start: Optional[date] = article_date_start(article)
+    if start is None:
+        return None
+    end: Optional[date] = article_date_end(article) or start
+    return start.year + (end.year - start.year) // 2
+
+def decade_of(year: int) -> int:
+    return year // 10 * 10
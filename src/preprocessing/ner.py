@@ -12,9 +12,13 @@ from names_dataset import NameDataset
 # put titles in front
 # redo a detection on the dataset
 
+from preprocessing.instrumentation import count, finish_run, hotspot, start_run
 from settings import DATA_FOLDER
 
 
+# The spaCy model is English, paragraphs clean_dataset tagged with another language are skipped
+NER_LANGUAGES = {"en"}
+
 df = pd.read_csv(
 DATA_FOLDER / "baby-names.csv")
 names_list = df["name"].tolist()
@@ -27,6 +31,7 @@ def clean_persons(list_persons):
 
     for person in list_persons:
 
+        person = person.lower()
         if len(person) < 4:
             continue
         if person == "india ann":
@@ -41,15 +46,26 @@ def clean_persons(list_persons):
 
     return cleaned
 
+@hotspot("spacy")
+def run_nlp_model(nlp_model, text):
+    return nlp_model(text)
+
 def process_file(json_file, nlp_model):
-    with open(json_file, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    with open(json_file, 'rb') as file:
+        raw = file.read()
+    count("items_in")
+    count("bytes_read", len(raw))
+    data = json.loads(raw)
     
-    texts = data.get("texts", [])
+    # spaCy finds far more names in the cased channel, older cleaned articles only have the lowercased one
+    texts = data.get("texts_cased") or data.get("texts", [])
+    languages = data.get("languages", [None] * len(texts))
     all_persons = []
     
-    for text in texts:
-        doc = nlp_model(text)
+    for text, language in zip(texts, languages):
+        if language is not None and language not in NER_LANGUAGES:
+            continue
+        doc = run_nlp_model(nlp_model, text)
         persons_in_text = [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
         
         persons_in_text = clean_persons(persons_in_text)
@@ -61,9 +77,11 @@ def process_file(json_file, nlp_model):
     
     data["persons"] = unique_persons
     
+    count("items_out")
     return data
 
 def main():
+    start_run("ner")
     articles_folder = DATA_FOLDER / "articles_India"
     output_file = DATA_FOLDER / "articles_India/articles_India_with_persons.jsonl"
     
@@ -83,12 +101,17 @@ def main():
             total=len(json_files),
             desc="Processing files"
         ))
+        # close + join instead of terminate so the workers write their run report
+        pool.close()
+        pool.join()
     
     with open(output_file, 'w', encoding='utf-8') as out_file:
         for data in results:
             out_file.write(json.dumps(data) + '\n')
     
+    count("bytes_written", output_file.stat().st_size)
     print(f"Processing complete. Results saved to {output_file}")
+    finish_run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import json
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Tuple
+
+# OCR confusions a rule can undo, written as (misread, intended). The long s
+# printed before 1800 is read as an f by every OCR engine we have seen.
+CONFUSIONS: List[Tuple[str, str]] = [("f", "s"), ("rn", "m"), ("vv", "w"), ("li", "h")]
+
+
+class OcrRule(NamedTuple):
+    """
+    Replaces a misread token by `replacement`, always (the token is not a
+    word, e.g. "moft") or only when the previous token is in `after` or the
+    next one in `before` (the token is a word too, e.g. "fame" is only
+    "same" in "the fame").
+    """
+    replacement: str
+    always: bool
+    after: FrozenSet[str] = frozenset()
+    before: FrozenSet[str] = frozenset()
+
+
+OcrRules = Dict[str, OcrRule]
+
+_AUXILIARIES: Tuple[str, ...] = ("to", "i", "we", "you", "they", "may", "might", "will", "would", "shall",
+                                 "should", "can", "could", "must", "not", "do", "did", "does")
+
+# Used until build_ocr_rules has derived a table from the corpus
+SEED_OCR_RULES: OcrRules = {
+    **{token: OcrRule(replacement, True) for token, replacement in {
+        "alfo": "also", "bufinefs": "business", "fhall": "shall", "fhe": "she", "fhip": "ship",
+        "fhips": "ships", "fhould": "should", "fince": "since", "firft": "first", "fo": "so",
+        "fuch": "such", "fome": "some", "faid": "said", "fea": "sea", "fet": "set", "feen": "seen",
+        "fent": "sent", "fervice": "service", "fuppofed": "supposed", "himfelf": "himself",
+        "houfe": "house", "juft": "just", "laft": "last", "majefty": "majesty", "moft": "most",
+        "muft": "must", "prefent": "present", "thefe": "these", "thofe": "those", "ufe": "use",
+    }.items()},
+    "fame": OcrRule("same", False, frozenset({"the", "this", "that", "very"}),
+                    frozenset({"time", "day", "manner", "place", "as", "with", "way"})),
+    "cafe": OcrRule("case", False, frozenset({"the", "in", "this", "that", "which", "such", "any", "every"})),
+    "fay": OcrRule("say", False, frozenset(_AUXILIARIES + ("and", "he"))),
+    "fays": OcrRule("says", False, frozenset({"he", "she", "it", "who", "which", "and", "letter"})),
+    "fee": OcrRule("see", False, frozenset(_AUXILIARIES)),
+    "fide": OcrRule("side", False, frozenset({"the", "this", "that", "other", "one", "either", "each", "west",
+                                              "east", "north", "south"})),
+    "fold": OcrRule("sold", False, frozenset({"be", "been", "was", "were", "is", "are"}),
+                    frozenset({"by", "at", "for", "cheap"})),
+    "fail": OcrRule("sail", False, frozenset({"set", "made", "under", "full"}), frozenset({"from", "for"})),
+}
+
+
+def load_ocr_rules(path: Path) -> OcrRules:
+    with open(path, "r", encoding="utf-8") as f:
+        raw: Dict[str, Dict] = json.load(f)
+    return {
+        token: OcrRule(rule["replacement"], rule["always"], frozenset(rule.get("after", [])),
+                       frozenset(rule.get("before", [])))
+        for token, rule in raw.items()
+    }
+
+def save_ocr_rules(rules: OcrRules, path: Path) -> None:
+    raw: Dict[str, Dict] = {
+        token: {"replacement": rule.replacement, "always": rule.always,
+                "after": sorted(rule.after), "before": sorted(rule.before)}
+        for token, rule in sorted(rules.items())
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(raw, f, indent=2)
+
+def confusion_variants(token: str, confusions: Iterable[Tuple[str, str]] = CONFUSIONS) -> List[str]:
+    """
+    Every token obtained by undoing one confusion at one position, or all
+    occurrences of it ("fucceffion" -> "succession").
+    """
+    variants: List[str] = []
+    for misread, intended in confusions:
+        start: int = token.find(misread)
+        while start != -1:
+            variants.append(token[:start] + intended + token[start + len(misread):])
+            start = token.find(misread, start + 1)
+        if token.count(misread) > 1:
+            variants.append(token.replace(misread, intended))
+    return variants
+
+
+def match_case(original: str, replacement: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+def apply_ocr_rules(text: str, rules: OcrRules) -> Tuple[str, int]:
+    """
+    Applies the rules in one pass over the tokens of a normalised paragraph
+    (punctuation already stripped). Context is always read from the original
+    neighbours, so a replacement never triggers another. Splitting on single
+    spaces keeps the spacing of the input.
+
+    Returns:
+        the corrected text and the number of replaced tokens
+    """
+    tokens: List[str] = text.split(" ")
+    lowered: List[str] = text.lower().split(" ")
+    replaced: int = 0
+    for i, token in enumerate(lowered):
+        rule = rules.get(token)
+        if rule is None:
+            continue
+        if (rule.always
+                or (i > 0 and lowered[i - 1] in rule.after)
+                or (i + 1 < len(lowered) and lowered[i + 1] in rule.before)):
+            tokens[i] = match_case(tokens[i], rule.replacement)
+            replaced += 1
+    if not replaced:
+        return text, 0
+    return " ".join(tokens), replaced
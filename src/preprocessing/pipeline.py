@@ -0,0 +1,195 @@
+import multiprocessing
+import queue
+import traceback
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from tqdm import tqdm
+
+SOURCE_DONE: str = "source_done"
+ITEM_DONE: str = "item_done"
+WORKER_FAILED: str = "worker_failed"
+# How often the writer checks that no worker died without reporting
+POLL_SECONDS: float = 5.0
+
+# read_source(source) -> (source key, fingerprint or None, [(item, nbytes), ...])
+ReadSource = Callable[[Any], Tuple[str, Optional[Dict[str, Any]], List[Tuple[Any, int]]]]
+# process_item(item) -> (result or None, stats)
+ProcessItem = Callable[[Any], Tuple[Any, Dict[str, int]]]
+
+
+class ByteBudget:
+    """
+    A cross-process counting semaphore over bytes (UTF-8 encoded text). Readers acquire the size of
+    every item before queueing it and the writer releases it once the item is
+    written, so the bytes in flight between the stages never exceed `limit`.
+    A single item larger than the whole budget is let through on its own.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit: int = limit
+        self.used = multiprocessing.Value("q", 0, lock=False)
+        self.condition = multiprocessing.Condition()
+
+    def acquire(self, nbytes: int) -> None:
+        nbytes = min(nbytes, self.limit)
+        with self.condition:
+            while self.used.value > 0 and self.used.value + nbytes > self.limit:
+                self.condition.wait()
+            self.used.value += nbytes
+
+    def release(self, nbytes: int) -> None:
+        nbytes = min(nbytes, self.limit)
+        with self.condition:
+            self.used.value -= nbytes
+            self.condition.notify_all()
+
+
+class WorkerError(RuntimeError):
+    """
+    A reader or cleaner process failed; the message holds its traceback.
+    """
+
+
+def report_failure(result_queue, stage: str, key: Optional[str]) -> None:
+    result_queue.put((WORKER_FAILED, key, f"{stage} failed on {key}:\n{traceback.format_exc()}", None))
+
+def reader_loop(read_source: ReadSource, task_queue, item_queue, result_queue, budget: ByteBudget) -> None:
+    source = None
+    try:
+        while True:
+            source = task_queue.get()
+            if source is None:
+                return
+            key, fingerprint, items = read_source(source)
+            for item, nbytes in items:
+                budget.acquire(nbytes)
+                item_queue.put((key, item, nbytes))
+            result_queue.put((SOURCE_DONE, key, fingerprint, len(items)))
+            del items
+    except BaseException:
+        report_failure(result_queue, "reader", str(source))
+        raise
+
+def cleaner_loop(process_item: ProcessItem, initializer: Optional[Callable], initargs: Sequence[Any],
+                 item_queue, result_queue) -> None:
+    key = None
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+        while True:
+            message = item_queue.get()
+            if message is None:
+                return
+            key, item, nbytes = message
+            result, stats = process_item(item)
+            result_queue.put((ITEM_DONE, key, (result, stats), nbytes))
+    except BaseException:
+        report_failure(result_queue, "cleaner", key)
+        raise
+
+def next_result(result_queue, processes: List[multiprocessing.Process]) -> Tuple[str, str, Any, Any]:
+    """
+    The next message from the workers. Raises WorkerError when a worker
+    reported an exception or exited abnormally (killed, out of memory)
+    without reporting one, instead of waiting forever on its items.
+    """
+    while True:
+        try:
+            message = result_queue.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            dead: List[multiprocessing.Process] = [process for process in processes
+                                                   if process.exitcode not in (None, 0)]
+            if dead:
+                raise WorkerError(f"{dead[0].name} exited with code {dead[0].exitcode}")
+            continue
+        if message[0] == WORKER_FAILED:
+            raise WorkerError(message[2])
+        return message
+
+
+def run_bounded_pipeline(sources: List[Any], read_source: ReadSource, process_item: ProcessItem,
+                         write_result: Callable[[Any], Optional[str]],
+                         on_source_done: Callable[[str, Dict[str, Any], List[str]], None],
+                         initializer: Optional[Callable] = None, initargs: Sequence[Any] = (),
+                         n_readers: int = 2, n_cleaners: Optional[int] = None,
+                         max_items: int = 2_000, max_bytes: int = 256 * 1024 * 1024) -> Counter:
+    """
+    Runs readers -> cleaners -> writer as separate processes connected by
+    bounded queues. Readers block once `max_items` items or `max_bytes` bytes
+    are in flight, so memory stays flat however large the corpus is; only one
+    parsed source per reader is held in full. The calling process is the
+    writer: it writes every result and calls `on_source_done` once all items
+    of a source have been written. If a worker fails, the others are
+    stopped and WorkerError is raised.
+
+    Returns:
+        Counter: the summed stats of all processed items
+    """
+    if n_cleaners is None:
+        n_cleaners = max(1, multiprocessing.cpu_count() - n_readers - 1)
+
+    budget = ByteBudget(max_bytes)
+    task_queue = multiprocessing.Queue()
+    item_queue = multiprocessing.Queue(maxsize=max_items)
+    result_queue = multiprocessing.Queue(maxsize=max_items)
+    for source in sources:
+        task_queue.put(source)
+    for _ in range(n_readers):
+        task_queue.put(None)
+
+    readers = [multiprocessing.Process(target=reader_loop,
+                                       args=(read_source, task_queue, item_queue, result_queue, budget))
+               for _ in range(n_readers)]
+    cleaners = [multiprocessing.Process(target=cleaner_loop,
+                                        args=(process_item, initializer, initargs, item_queue, result_queue))
+                for _ in range(n_cleaners)]
+    for process in readers + cleaners:
+        process.start()
+
+    run_stats: Counter = Counter()
+    expected: Dict[str, int] = {}
+    received: Counter = Counter()
+    fingerprints: Dict[str, Optional[Dict[str, Any]]] = {}
+    outputs: Dict[str, List[str]] = defaultdict(list)
+    completed: int = 0
+
+    def finish_if_complete(key: str) -> None:
+        nonlocal completed
+        if key in expected and received[key] == expected[key]:
+            if fingerprints[key] is not None:
+                on_source_done(key, fingerprints[key], list(dict.fromkeys(outputs[key])))
+            for table in (expected, received, fingerprints, outputs):
+                table.pop(key, None)
+            completed += 1
+            progress.update(1)
+
+    try:
+        with tqdm(total=len(sources), desc="Cleaning issues") as progress:
+            while completed < len(sources):
+                kind, key, payload, extra = next_result(result_queue, readers + cleaners)
+                if kind == SOURCE_DONE:
+                    fingerprints[key] = payload
+                    expected[key] = extra
+                else:
+                    result, stats = payload
+                    run_stats.update(stats)
+                    if result is not None:
+                        output = write_result(result)
+                        if output is not None:
+                            outputs[key].append(output)
+                    budget.release(extra)
+                    received[key] += 1
+                finish_if_complete(key)
+    except BaseException:
+        for process in readers + cleaners:
+            process.terminate()
+        for process in readers + cleaners:
+            process.join()
+        raise
+
+    for _ in cleaners:
+        item_queue.put(None)
+    for process in readers + cleaners:
+        process.join()
+    return run_stats
@@ -0,0 +1,82 @@
+import math
+import multiprocessing
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.article_index import iter_array_records
+from preprocessing.manifest import file_fingerprint
+from preprocessing.sources import RawSource, read_source_bytes, source_stat
+
+# Issues larger than this are split into per-article subtasks
+SPLIT_BYTES: int = 8 * 1024 * 1024
+
+
+class IngestTask(NamedTuple):
+    """
+    One unit of work for the ingest pool. Small sources are a single task
+    with `parts == 1` that reads the whole source. A split source has `parts`
+    tasks, each with the byte range (offset, length) of a run of consecutive
+    articles and the fingerprint of the whole source, taken once when planning.
+    """
+    source: RawSource
+    part: int
+    parts: int
+    size: int
+    byte_range: Optional[Tuple[int, int]] = None
+    fingerprint: Optional[Dict[str, Any]] = None
+
+
+def split_source(args: Tuple[RawSource, int]) -> Tuple[Optional[Dict[str, Any]], List[Tuple[int, int]]]:
+    """
+    Reads a large source once, fingerprints it and cuts its JSON array into
+    at most `parts` byte ranges of whole articles of about equal size.
+
+    Returns:
+        (the fingerprint, the byte ranges), (None, []) if it is not a valid
+        JSON array, so it is left to the ingest task to report
+    """
+    source, parts = args
+    raw: bytes = read_source_bytes(source)
+    try:
+        records: List[Tuple[int, int]] = [(offset, length) for _, offset, length in iter_array_records(raw)]
+    except ValueError:
+        return None, []
+    target: float = len(raw) / parts
+    ranges: List[Tuple[int, int]] = []
+    first: int = 0
+    for i, (offset, length) in enumerate(records):
+        end: int = offset + length
+        if i == len(records) - 1 or end >= target * (len(ranges) + 1):
+            start: int = records[first][0]
+            ranges.append((start, end - start))
+            first = i + 1
+    return file_fingerprint(source, raw), ranges
+
+def plan_tasks(sources: List[RawSource], split_bytes: int = SPLIT_BYTES) -> List[IngestTask]:
+    """
+    Orders the sources by byte size, largest first, and splits every source
+    above `split_bytes` into roughly `split_bytes` sized subtasks. Handing the
+    big issues out first and the small ones last keeps all workers busy until
+    the end of the run instead of waiting on a few giant issues.
+
+    The large sources are read once here, in a pool, to find their article
+    boundaries, so each subtask reads and parses only its own articles.
+    """
+    sized = sorted(((source_stat(source)[0], source) for source in sources),
+                   key=lambda item: item[0], reverse=True)
+    tasks: List[IngestTask] = [IngestTask(source, 0, 1, size) for size, source in sized if size <= split_bytes]
+    large: List[Tuple[RawSource, int]] = [(source, math.ceil(size / split_bytes))
+                                          for size, source in sized if size > split_bytes]
+    if large:
+        with multiprocessing.Pool() as pool:
+            splits = list(tqdm(pool.imap(split_source, large), total=len(large), desc="Splitting large issues"))
+        for (source, _), (fingerprint, ranges) in zip(large, splits):
+            if fingerprint is None or len(ranges) < 2:
+                tasks.append(IngestTask(source, 0, 1, source_stat(source)[0]))
+                continue
+            tasks.extend(IngestTask(source, part, len(ranges), byte_range[1], byte_range, fingerprint)
+                         for part, byte_range in enumerate(ranges))
+    # Parts of different sources interleave with similarly sized tasks
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    return tasks
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterator, Set, Tuple
+
+import polars as pl
+
+from preprocessing.instrumentation import count
+
+SHARD_MAX_BYTES: int = 256 * 1024 * 1024
+INDEX_SUFFIX: str = ".index.jsonl"
+# Per-paragraph article lists and the row column each element is stored in
+PARAGRAPH_COLUMNS: Dict[str, str] = {"texts": "text", "text_hashes": "text_hash", "languages": "language",
+                                     "texts_cased": "text_cased", "token_alignments": "token_alignment"}
+
+
+def index_path_for(shard_path: Path) -> Path:
+    return shard_path.with_name(shard_path.name.removesuffix(".jsonl") + INDEX_SUFFIX)
+
+def article_metadata(article: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in article.items() if key not in PARAGRAPH_COLUMNS}
+
+def paragraph_values(article: Dict[str, Any], i: int) -> Dict[str, Any]:
+    return {column: article[key][i] for key, column in PARAGRAPH_COLUMNS.items() if key in article}
+
+
+class ShardWriter:
+    """
+    Writes cleaned articles into size-bounded JSONL shards with one row per
+    paragraph (article metadata repeated as columns). Every shard has a sidecar
+    `*.index.jsonl` with one line per article holding its metadata, byte offset
+    and length in the shard, so readers can filter on metadata from the index
+    alone and seek straight to the rows they need.
+
+    Rows are written before the index line of their article, so rows left
+    behind by a crash are never referenced by an index.
+    """
+
+    def __init__(self, folder: Path, max_bytes: int = SHARD_MAX_BYTES) -> None:
+        self.folder: Path = folder
+        self.max_bytes: int = max_bytes
+        self.shard_path: Optional[Path] = None
+        self.shard_file = None
+        self.index_file = None
+        os.makedirs(folder, exist_ok=True)
+
+    def _open_new_shard(self) -> None:
+        self.close()
+        self.shard_path = self.folder / f"shard-{uuid.uuid4().hex[:16]}.jsonl"
+        self.shard_file = open(self.shard_path, "ab")
+        self.index_file = open(index_path_for(self.shard_path), "a", encoding="utf-8")
+
+    def write_article(self, article: Dict[str, Any]) -> str:
+        """
+        Appends one cleaned article and returns the name of the shard it went to.
+        """
+        if self.shard_file is None or self.shard_file.tell() >= self.max_bytes:
+            self._open_new_shard()
+
+        metadata: Dict[str, Any] = article_metadata(article)
+        rows: bytes = b"".join(
+            (json.dumps({**metadata, "paragraph": i, **paragraph_values(article, i)},
+                        ensure_ascii=False) + "\n").encode("utf-8")
+            for i in range(len(article["texts"]))
+        )
+        offset: int = self.shard_file.tell()
+        self.shard_file.write(rows)
+        count("bytes_written", len(rows))
+
+        entry: Dict[str, Any] = {
+            **metadata,
+            "offset": offset,
+            "length": len(rows),
+            "n_paragraphs": len(article["texts"]),
+            "written_at": time.time_ns(),
+        }
+        self.index_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return self.shard_path.name
+
+    def flush(self) -> None:
+        if self.shard_file is not None:
+            self.shard_file.flush()
+            self.index_file.flush()
+
+    def close(self) -> None:
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.index_file.close()
+        self.shard_file = None
+        self.index_file = None
+
+
+def iter_shard_index(folder: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the index entries of every shard in `folder`, each with a `shard` key.
+    When an article was written more than once (its source was re-ingested),
+    only the most recent entry is kept.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for index_file in sorted(folder.glob(f"*{INDEX_SUFFIX}")):
+        shard_name: str = index_file.name.removesuffix(INDEX_SUFFIX) + ".jsonl"
+        with open(index_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry: Dict[str, Any] = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entry["shard"] = shard_name
+                previous = latest.get(entry["file_name"])
+                if previous is None or previous["written_at"] < entry["written_at"]:
+                    latest[entry["file_name"]] = entry
+    yield from latest.values()
+
+def scan_shard_index(folder: Path) -> pl.DataFrame:
+    """
+    The deduplicated shard index as a Polars frame, for filtering and
+    projecting article metadata without touching the shards themselves.
+    """
+    return pl.DataFrame(list(iter_shard_index(folder)), infer_schema_length=None)
+
+def read_shard_rows(folder: Path, entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    with open(folder / entry["shard"], "rb") as f:
+        f.seek(entry["offset"])
+        data: bytes = f.read(entry["length"])
+    count("bytes_read", len(data))
+    return [json.loads(line) for line in data.splitlines()]
+
+def read_shard_article(folder: Path, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuilds the per-article dict (same shape as the per-article JSON files,
+    with a `texts` list) from the paragraph rows referenced by an index entry.
+    """
+    rows: List[Dict[str, Any]] = sorted(read_shard_rows(folder, entry), key=lambda row: row["paragraph"])
+    row_columns: Set[str] = {"paragraph", *PARAGRAPH_COLUMNS.values()}
+    article: Dict[str, Any] = {key: value for key, value in rows[0].items() if key not in row_columns}
+    for key, column in PARAGRAPH_COLUMNS.items():
+        if column in rows[0]:
+            article[key] = [row[column] for row in rows]
+    return article
+
+def group_entries_by_shard(entries: List[Dict[str, Any]]) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Groups index entries per shard and orders them by offset, so a worker can
+    read one shard front to back.
+    """
+    grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in entries:
+        grouped[entry["shard"]].append(entry)
+    return [(shard, sorted(shard_entries, key=lambda e: e["offset"])) for shard, shard_entries in grouped.items()]
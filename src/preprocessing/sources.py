@@ -0,0 +1,84 @@
+import os
+import tarfile
+from pathlib import Path
+from typing import List, NamedTuple, Tuple, Union
+
+from settings import FOLDER_ARTICLES, JSON_RES_TAR
+
+
+class TarMember(NamedTuple):
+    """
+    A raw issue file inside an uncompressed tar, addressed by the byte range of
+    its data so it can be read with one seek, without extracting the archive.
+    """
+    tar_path: str
+    name: str
+    offset: int
+    size: int
+    mtime: int
+
+
+# A raw issue is either an extracted JSON file or a member of json_res.tar
+RawSource = Union[Path, TarMember]
+
+
+def list_tar_members(tar_path: Path, suffix: str = ".json") -> List[TarMember]:
+    """
+    Lists the JSON members of the tar in archive order. Only the headers are
+    read, the member data is skipped over.
+    """
+    members: List[TarMember] = []
+    with tarfile.open(tar_path, "r:") as tar:
+        for info in tar:
+            if info.isfile() and info.name.endswith(suffix):
+                members.append(TarMember(str(tar_path), info.name, info.offset_data, info.size, int(info.mtime)))
+    return members
+
+def list_raw_sources() -> List[RawSource]:
+    """
+    The raw issue files: read straight out of JSON_RES_TAR when it has not been
+    extracted, otherwise the extracted FOLDER_ARTICLES.
+    """
+    if not FOLDER_ARTICLES.exists() and JSON_RES_TAR.exists():
+        return list_tar_members(JSON_RES_TAR)
+    return list(FOLDER_ARTICLES.glob("*.json"))
+
+def read_source_bytes(source: RawSource) -> bytes:
+    if isinstance(source, TarMember):
+        with open(source.tar_path, "rb") as f:
+            f.seek(source.offset)
+            return f.read(source.size)
+    with open(source, "rb") as f:
+        return f.read()
+
+def read_source_range(source: RawSource, offset: int, length: int) -> bytes:
+    """
+    `length` bytes of a source starting at `offset`, relative to the start of
+    the file or tar member.
+    """
+    if isinstance(source, TarMember):
+        with open(source.tar_path, "rb") as f:
+            f.seek(source.offset + offset)
+            return f.read(length)
+    with open(source, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+def source_key(source: RawSource) -> str:
+    if isinstance(source, TarMember):
+        return f"{source.tar_path}::{source.name}"
+    return str(source)
+
+def source_name(source: RawSource) -> str:
+    if isinstance(source, TarMember):
+        return os.path.basename(source.name)
+    return source.name
+
+def source_stat(source: RawSource) -> Tuple[int, int]:
+    """
+    Size and mtime (ns) of a source, as recorded in the ingest manifest.
+    """
+    if isinstance(source, TarMember):
+        return source.size, source.mtime * 1_000_000_000
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class SpellCache:
+    """
+    Two-level LRU cache of spell corrections.
+
+    The first level is an in-process OrderedDict, the second a SQLite database
+    in WAL mode that is shared by every process on the node and kept across
+    runs. Keys are a digest of the settings key (dictionary, edit distance,
+    prefix length) and the normalised input, so changing any of those settings
+    never returns a stale correction. The database keeps at most `max_entries`
+    rows and evicts the least recently used ones.
+
+    The connection is opened lazily in the process that uses it, so a cache
+    created before a fork is safe to use from pool workers.
+    """
+
+    def __init__(self, path: Path, settings_key: str, memory_size: int = 100_000,
+                 max_entries: int = 5_000_000, flush_every: int = 1_000) -> None:
+        self.path: Path = path
+        self.settings_key: bytes = settings_key.encode("utf-8")
+        self.memory_size: int = memory_size
+        self.max_entries: int = max_entries
+        self.flush_every: int = flush_every
+        self.memory: "OrderedDict[bytes, str]" = OrderedDict()
+        self.pending: Dict[bytes, str] = {}
+        self.touched: Dict[bytes, int] = {}
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None or self.pid != os.getpid():
+            os.makedirs(self.path.parent, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS corrections "
+                "(key BLOB PRIMARY KEY, corrected TEXT NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS corrections_last_used ON corrections(last_used)")
+            self.pid = os.getpid()
+            self.memory.clear()
+            self.pending.clear()
+            self.touched.clear()
+            Finalize(self, self.flush, exitpriority=5)
+        return self.connection
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(self.settings_key + b"\0" + text.encode("utf-8"), digest_size=16).digest()
+
+    def _remember(self, key: bytes, corrected: str) -> None:
+        self.memory[key] = corrected
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[str]:
+        connection: sqlite3.Connection = self._connect()
+        key: bytes = self._key(text)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        row: Optional[Tuple[str]] = connection.execute(
+            "SELECT corrected FROM corrections WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._remember(key, row[0])
+        # Refreshing last_used is batched with the writes
+        self.touched[key] = int(time.time())
+        return row[0]
+
+    def put(self, text: str, corrected: str) -> None:
+        self._connect()
+        key: bytes = self._key(text)
+        self._remember(key, corrected)
+        self.pending[key] = corrected
+        if len(self.pending) + len(self.touched) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.connection is None or self.pid != os.getpid():
+            return
+        if not self.pending and not self.touched:
+            return
+        now: int = int(time.time())
+        rows: List[Tuple[bytes, str, int]] = [(key, corrected, now) for key, corrected in self.pending.items()]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO corrections (key, corrected, last_used) VALUES (?, ?, ?)", rows
+            )
+            self.connection.executemany(
+                "UPDATE corrections SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self.touched.items()],
+            )
+        self.pending.clear()
+        self.touched.clear()
+
+    def evict(self) -> int:
+        """
+        Deletes the least recently used rows above `max_entries`. Returns the
+        number of deleted rows.
+        """
+        connection: sqlite3.Connection = self._connect()
+        self.flush()
+        count: int = connection.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+        excess: int = count - self.max_entries
+        if excess <= 0:
+            return 0
+        with connection:
+            connection.execute(
+                "DELETE FROM corrections WHERE key IN "
+                "(SELECT key FROM corrections ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+        return excess
@@ -0,0 +1,130 @@
+import difflib
+import re
+import string
+from typing import List
+
+# Punctuation runs are dropped, runs that contain a newline become one space.
+# Stripping punctuation also strips "-", so the former hyphen-join and
+# dash patterns could never match after it; this one pattern covers them.
+PUNCTUATION_NEWLINES_PATTERN = re.compile(f"[{re.escape(string.punctuation)}\\n]+")
+
+# Anything ftfy could change: HTML entities, carriage returns, terminal escapes
+# and other control characters, and every character outside ASCII and Latin-1
+# (ligatures, curly quotes, widths, combining marks, cp1252 punctuation).
+# Mojibake turns every UTF-8 character into two or more non-ASCII ones
+# (Ã©, Â£, â€™), so a lone Latin-1 letter or sign (é, £, æ) is let through and
+# only runs of them are flagged. Ã and Â are always flagged, ftfy also
+# repairs them before a space (Ã  -> à).
+FTFY_FLAG_PATTERN = re.compile(r"[^\t\n\x20-\x25\x27-\x7e\xa1-\xac\xae-\xc1\xc4-\xff]|[\xa0-\xff]{2}")
+
+# Only used for the cased channel, the normalised one has lost its hyphens by then
+HYPHENATED_LINE_BREAK_PATTERN = re.compile(r'(\w)-[ \t]*\n\s*(\w)')
+
+
+def _replace_punctuation_run(match: "re.Match[str]") -> str:
+    return " " if "\n" in match.group() else ""
+
+def strip_punctuation_and_newlines(text: str) -> str:
+    """
+    Strips punctuation and collapses newline runs to a space in one pass.
+    """
+    return PUNCTUATION_NEWLINES_PATTERN.sub(_replace_punctuation_run, text)
+
+def case_preserving_text(text: str) -> str:
+    """
+    The lightly cleaned cased channel: words hyphenated across line breaks
+    are joined and all whitespace runs become one space, case and punctuation
+    are kept for NER, sentence splitting and KWIC display.
+    """
+    return " ".join(HYPHENATED_LINE_BREAK_PATTERN.sub(r"\1\2", text).split())
+
+def _adjacent_mismatches(words: List[str], tokens: List[str]) -> bool:
+    previous: bool = False
+    for word, token in zip(words, tokens):
+        mismatch: bool = word != token
+        if mismatch and previous:
+            return True
+        previous = mismatch
+    return False
+
+def align_tokens(cased_tokens: List[str], tokens: List[str]) -> List[int]:
+    """
+    For every token of the normalised channel, the index of the cased token
+    it came from. Cased tokens that are only punctuation are skipped; when the
+    rest has as many tokens as the normalised channel and no two neighbours
+    differ (spell correction replaced single words) they map in order.
+    Otherwise only the span
+    between the common prefix and suffix is diffed: equal runs map one to one,
+    runs the cleaning changed (words split or joined) map proportionally, so a
+    span of normalised tokens always maps to a contiguous span of cased tokens.
+    """
+    kept: List[int] = []
+    words: List[str] = []
+    for i, token in enumerate(cased_tokens):
+        word: str = strip_punctuation_and_newlines(token).lower()
+        if word:
+            kept.append(i)
+            words.append(word)
+    if len(words) == len(tokens) and not _adjacent_mismatches(words, tokens):
+        return kept
+    if not kept:
+        return [0] * len(tokens)
+
+    prefix: int = 0
+    limit: int = min(len(words), len(tokens))
+    while prefix < limit and words[prefix] == tokens[prefix]:
+        prefix += 1
+    suffix: int = 0
+    while suffix < limit - prefix and words[-1 - suffix] == tokens[-1 - suffix]:
+        suffix += 1
+
+    alignment: List[int] = list(range(prefix))
+    matcher = difflib.SequenceMatcher(None, words[prefix:len(words) - suffix],
+                                      tokens[prefix:len(tokens) - suffix], autojunk=False)
+    for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        a_start, a_end = a_start + prefix, a_end + prefix
+        if tag == "delete":
+            continue
+        if tag == "equal":
+            alignment.extend(range(a_start, a_end))
+        elif tag == "insert":
+            alignment.extend([max(0, a_start - 1)] * (b_end - b_start))
+        else:
+            width: int = b_end - b_start
+            alignment.extend(a_start + (i * (a_end - a_start)) // width for i in range(width))
+    alignment.extend(range(len(words) - suffix, len(words)))
+    return [kept[i] for i in alignment]
+
+def needs_ftfy(text: str) -> bool:
+    """
+    False when ftfy.fix_text is guaranteed to return the text unchanged, which
+    is the case for most OCR paragraphs.
+    """
+    return FTFY_FLAG_PATTERN.search(text) is not None
+
+def segment_paragraphs(text: str) -> List[str]:
+    """
+    Single pass version of utils.regroup_texts with the same output. The
+    newline count and character total of every paragraph are computed once
+    while scanning, and filtered paragraphs are never joined.
+
+    A group only survives when its multi-line paragraph has more than 2
+    newlines (buffered single-line paragraphs add none), so groups that end
+    without a multi-line paragraph, or with one of 1 or 2 newlines, are
+    dropped straight away.
+    """
+    result: List[str] = []
+    buffer: List[str] = []
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        newlines: int = paragraph.count("\n")
+        if newlines == 0:
+            buffer.append(paragraph)
+            continue
+        if newlines > 2:
+            prefix: str = " ".join(buffer) + " " if buffer else ""
+            if len(prefix) + len(paragraph) - newlines > 15:
+                result.append(prefix + paragraph)
+        buffer = []
+    return result
+
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from preprocessing.inverted_index import StringColumn, iter_cleaned_articles, write_strings
+from preprocessing.metadata import article_year
+from settings import TOKEN_CORPUS_FOLDER
+
+SCHEMA_FILE: str = "schema.json"
+UNKNOWN_YEAR: int = -1
+
+
+def build_token_corpus(articles: Iterator[Dict[str, Any]], folder: Path) -> None:
+    """
+    Encodes the normalised paragraphs as integers, into a folder of
+    memory-mappable arrays:
+
+    - `vocab.bytes` + `vocab.offsets.npy`: the vocabulary, most frequent first,
+      with its counts in `vocab_counts.npy`
+    - `token_ids.npy`: uint32 id of every token of the corpus, in order
+    - `paragraph_offsets.npy`: where every paragraph starts in `token_ids`
+      (one more entry than paragraphs)
+    - `article_offsets.npy`: where every article starts in `paragraph_offsets`
+    - `names.bytes` + `names.offsets.npy`: the file_name of every article,
+      `article_types.*` its articleType and `years.npy` its midpoint year
+      (-1 when unknown)
+    - `schema.json`, written last so a half-built corpus is never picked up
+    """
+    os.makedirs(folder, exist_ok=True)
+    vocabulary: Dict[str, int] = {}
+    token_ids: array = array("I")
+    paragraph_offsets: array = array("q", [0])
+    article_offsets: array = array("q", [0])
+    names: List[str] = []
+    article_types: List[str] = []
+    years: array = array("h")
+    for article in tqdm(articles, desc="Encoding paragraphs"):
+        names.append(article["file_name"])
+        article_types.append(article.get("articleType") or "")
+        year: Optional[int] = article_year(article)
+        years.append(year if year is not None else UNKNOWN_YEAR)
+        for text in article.get("texts", []):
+            token_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in text.split())
+            paragraph_offsets.append(len(token_ids))
+        article_offsets.append(len(paragraph_offsets) - 1)
+
+    # Renumber by frequency, so the ids of common words are small and dense
+    ids: np.ndarray = np.frombuffer(token_ids, dtype=np.uint32)
+    counts: np.ndarray = np.bincount(ids, minlength=len(vocabulary))
+    order: np.ndarray = np.argsort(-counts, kind="stable")
+    new_ids = np.empty(len(vocabulary), dtype=np.uint32)
+    new_ids[order] = np.arange(len(vocabulary), dtype=np.uint32)
+    words: List[str] = list(vocabulary)
+
+    write_strings(folder, "vocab", [words[i] for i in order])
+    write_strings(folder, "names", names)
+    write_strings(folder, "article_types", article_types)
+    np.save(folder / "vocab_counts.npy", counts[order])
+    np.save(folder / "token_ids.npy", new_ids[ids])
+    np.save(folder / "paragraph_offsets.npy", np.frombuffer(paragraph_offsets, dtype=np.int64))
+    np.save(folder / "article_offsets.npy", np.frombuffer(article_offsets, dtype=np.int64))
+    np.save(folder / "years.npy", np.frombuffer(years, dtype=np.int16))
+    with open(folder / SCHEMA_FILE, "w", encoding="utf-8") as f:
+        json.dump({"tokens": len(ids), "vocabulary": len(words), "paragraphs": len(paragraph_offsets) - 1,
+                   "articles": len(names)}, f, indent=2)
+
+
+class TokenCorpus:
+    """
+    Read-only view of a corpus written by `build_token_corpus`. Every array is
+    opened with mmap, and the counting helpers work on whole integer arrays,
+    so no string is tokenised or stemmed again: a function of words (a stemmer,
+    a stop list) is applied once per vocabulary entry via `lookup`.
+    """
+
+    def __init__(self, folder: Path) -> None:
+        with open(folder / SCHEMA_FILE, "r", encoding="utf-8") as f:
+            self.schema: Dict[str, int] = json.load(f)
+        self.vocab: StringColumn = StringColumn(folder, "vocab")
+        self.names: StringColumn = StringColumn(folder, "names")
+        self.article_types: StringColumn = StringColumn(folder, "article_types")
+        self.vocab_counts: np.ndarray = np.load(folder / "vocab_counts.npy", mmap_mode="r")
+        self.token_ids: np.ndarray = np.load(folder / "token_ids.npy", mmap_mode="r")
+        self.paragraph_offsets: np.ndarray = np.load(folder / "paragraph_offsets.npy", mmap_mode="r")
+        self.article_offsets: np.ndarray = np.load(folder / "article_offsets.npy", mmap_mode="r")
+        self.years: np.ndarray = np.load(folder / "years.npy", mmap_mode="r")
+        self._word_ids: Optional[Dict[str, int]] = None
+        self._token_paragraphs: Optional[np.ndarray] = None
+
+    @property
+    def n_articles(self) -> int:
+        return len(self.article_offsets) - 1
+
+    def word_id(self, word: str) -> Optional[int]:
+        if self._word_ids is None:
+            self._word_ids = {self.vocab[i]: i for i in range(len(self.vocab))}
+        return self._word_ids.get(word)
+
+    def words(self, ids: Iterable[int]) -> List[str]:
+        return [self.vocab[int(i)] for i in ids]
+
+    def lookup(self, function: Callable[[str], Any], targets: List[Any]) -> np.ndarray:
+        """
+        Maps every vocabulary id to the index in `targets` of function(word),
+        -1 when it is not a target. E.g. with a stemmer and a list of stems,
+        `lookup[token_ids]` gives the stem index of every token of the corpus.
+        """
+        positions: Dict[Any, int] = {target: i for i, target in enumerate(targets)}
+        return np.fromiter((positions.get(function(self.vocab[i]), -1) for i in range(len(self.vocab))),
+                           dtype=np.int64, count=len(self.vocab))
+
+    def article_token_offsets(self) -> np.ndarray:
+        return np.asarray(self.paragraph_offsets)[np.asarray(self.article_offsets)]
+
+    def article_lengths(self) -> np.ndarray:
+        return np.diff(self.article_token_offsets())
+
+    def token_articles(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_articles), self.article_lengths())
+
+    def token_paragraphs(self) -> np.ndarray:
+        if self._token_paragraphs is None:
+            self._token_paragraphs = np.repeat(np.arange(len(self.paragraph_offsets) - 1),
+                                               np.diff(self.paragraph_offsets))
+        return self._token_paragraphs
+
+    def article_mask(self, year_from: Optional[int] = None, year_to: Optional[int] = None,
+                     article_types: Optional[List[str]] = None) -> np.ndarray:
+        mask = np.ones(self.n_articles, dtype=bool)
+        if year_from is not None:
+            mask &= self.years >= year_from
+        if year_to is not None:
+            mask &= (self.years <= year_to) & (self.years != UNKNOWN_YEAR)
+        if article_types is not None:
+            wanted = set(article_types)
+            mask &= np.fromiter((self.article_types[i] in wanted for i in range(self.n_articles)),
+                                dtype=bool, count=self.n_articles)
+        return mask
+
+    def token_mask(self, article_mask: np.ndarray) -> np.ndarray:
+        return np.repeat(article_mask, self.article_lengths())
+
+    def count_matrix(self, lookup: np.ndarray, n_targets: int) -> np.ndarray:
+        """
+        Counts per article of every target of `lookup` (see `lookup`), as an
+        (articles, n_targets) array; targets absent from the corpus count 0.
+        """
+        targets: np.ndarray = lookup[self.token_ids]
+        hits: np.ndarray = targets >= 0
+        cells: np.ndarray = self.token_articles()[hits] * n_targets + targets[hits]
+        return np.bincount(cells, minlength=self.n_articles * n_targets).reshape(self.n_articles, n_targets)
+
+    def ngram_counts(self, n: int, token_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The distinct n-grams inside paragraphs, as an (ngrams, n) id array, and
+        how often each occurs.
+        """
+        ids: np.ndarray = np.asarray(self.token_ids)
+        paragraphs: np.ndarray = self.token_paragraphs()
+        starts: np.ndarray = np.arange(max(0, len(ids) - n + 1))
+        valid: np.ndarray = paragraphs[starts] == paragraphs[starts + n - 1]
+        if token_mask is not None:
+            valid &= token_mask[starts]
+        starts = starts[valid]
+        grams: np.ndarray = np.stack([ids[starts + i] for i in range(n)], axis=1)
+        return np.unique(grams, axis=0, return_counts=True)
+
+    def context_counts(self, word: str, window: int, token_mask: Optional[np.ndarray] = None,
+                       exclude: Optional[np.ndarray] = None) -> Counter:
+        """
+        For every word, the number of paragraphs in which it occurs within
+        `window` tokens of `word`, i.e. in an n-gram of size window + 1 that
+        contains it. Ids flagged in the boolean `exclude` (stop words) are
+        skipped.
+        """
+        word_id: Optional[int] = self.word_id(word)
+        if word_id is None:
+            return Counter()
+        ids: np.ndarray = np.asarray(self.token_ids)
+        paragraphs: np.ndarray = self.token_paragraphs()
+        hits: np.ndarray = np.flatnonzero(ids == word_id)
+        if token_mask is not None:
+            hits = hits[token_mask[hits]]
+        offsets: np.ndarray = np.arange(-window, window + 1)
+        neighbours: np.ndarray = (hits[:, None] + offsets[None, :]).ravel()
+        origins: np.ndarray = np.repeat(hits, len(offsets))
+        inside: np.ndarray = (neighbours >= 0) & (neighbours < len(ids))
+        neighbours, origins = neighbours[inside], origins[inside]
+        keep: np.ndarray = (paragraphs[neighbours] == paragraphs[origins]) & (ids[neighbours] != word_id)
+        if exclude is not None:
+            keep &= ~exclude[ids[neighbours]]
+        pairs: np.ndarray = np.unique(np.stack([paragraphs[neighbours[keep]], ids[neighbours[keep]]], axis=1),
+                                      axis=0)
+        context_ids, counts = np.unique(pairs[:, 1], return_counts=True)
+        return Counter(dict(zip(self.words(context_ids), counts.tolist())))
+
+    def cooccurrence(self, lookup: np.ndarray, n_targets: int) -> np.ndarray:
+        """
+        Number of paragraphs in which each pair of targets of `lookup` occurs
+        together, as an (n_targets, n_targets) array; the diagonal counts the
+        paragraphs of each target.
+        """
+        targets: np.ndarray = lookup[self.token_ids]
+        hits: np.ndarray = targets >= 0
+        n_paragraphs: int = len(self.paragraph_offsets) - 1
+        presence = np.zeros((n_paragraphs, n_targets), dtype=bool)
+        presence[self.token_paragraphs()[hits], targets[hits]] = True
+        presence = presence[presence.any(axis=1)].astype(np.int64)
+        return presence.T @ presence
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Encode the cleaned paragraphs as memory-mapped token ids")
+    parser.add_argument("--output", type=Path, default=TOKEN_CORPUS_FOLDER)
+    args = parser.parse_args()
+    build_token_corpus(iter_cleaned_articles(), args.output)
+    with open(args.output / SCHEMA_FILE, "r", encoding="utf-8") as f:
+        print(f"Token corpus written to {args.output}: {json.load(f)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import multiprocessing
+import random
+from typing import Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from preprocessing.language_id import SEED_WORDS, LanguageScorer, vote_language
+from preprocessing.sources import RawSource, list_raw_sources, read_source_bytes
+from preprocessing.utils import normalise_text, regroup_texts
+from settings import LANGUAGE_MODEL_PATH
+
+
+def collect_samples(source: RawSource) -> Dict[str, List[str]]:
+    samples: Dict[str, List[str]] = {}
+    try:
+        articles = json.loads(read_source_bytes(source))
+    except json.JSONDecodeError:
+        return samples
+    for article in articles:
+        for paragraph in regroup_texts(article.get("text", "")):
+            text: str = normalise_text(paragraph).lower()
+            # Strict thresholds, the trigram model only sees clear-cut examples
+            language: Optional[str] = vote_language(text.split(), min_hits=5, min_share=0.8)
+            if language is not None:
+                samples.setdefault(language, []).append(text)
+    return samples
+
+def train_from_corpus(sources: List[RawSource], per_language: int = 2_000) -> Tuple[LanguageScorer, Dict[str, int]]:
+    """
+    Labels corpus paragraphs with the function word vote and trains the
+    trigram scorer on up to `per_language` paragraphs of every language.
+    """
+    samples: Dict[str, List[str]] = {language: [] for language in SEED_WORDS}
+    with multiprocessing.Pool() as pool:
+        for source_samples in tqdm(pool.imap_unordered(collect_samples, sources, chunksize=8),
+                                   total=len(sources), desc="Collecting language samples"):
+            for language, texts in source_samples.items():
+                samples[language].extend(texts[:per_language - len(samples[language])])
+            if all(len(texts) >= per_language for texts in samples.values()):
+                pool.terminate()
+                break
+    samples = {language: texts for language, texts in samples.items() if texts}
+    return LanguageScorer.train(samples), {language: len(texts) for language, texts in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the paragraph language scorer on the corpus")
+    parser.add_argument("--per-language", type=int, default=2_000, help="training paragraphs per language")
+    args = parser.parse_args()
+
+    sources = list_raw_sources()
+    # Foreign passages cluster in a few titles and years, a shuffled order finds them sooner
+    random.Random(0).shuffle(sources)
+    scorer, counts = train_from_corpus(sources, args.per_language)
+    scorer.save(LANGUAGE_MODEL_PATH)
+    print(f"Trained on {counts}, saved to {LANGUAGE_MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
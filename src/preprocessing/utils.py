@@ -1,43 +1,318 @@
+from collections import Counter
 from pathlib import Path
-import re
-from typing import Dict, Tuple, List, Any
+import hashlib
+import os
+import sys
+from importlib.metadata import version
+from importlib.resources import files
+from typing import Dict, Tuple, List, Any, NamedTuple, Optional, Set
 from symspellpy.symspellpy import SymSpell
 import ftfy
 import string
-import pkg_resources
 import geopandas as gpd
 
+from preprocessing.instrumentation import hotspot
+from preprocessing.language_id import ENGLISH, LanguageScorer, detect_language
+from preprocessing.ocr_rules import SEED_OCR_RULES, OcrRules, apply_ocr_rules, load_ocr_rules
+from preprocessing.spell_cache import SpellCache
+from preprocessing.text_scan import (align_tokens, case_preserving_text, needs_ftfy, segment_paragraphs,
+                                     strip_punctuation_and_newlines)
+from settings import (DATA_FOLDER, SPELL_CACHE_PATH, USE_SPELL_CACHE, USE_SPELL_GATE,
+                      SPELL_GATE_MIN_KNOWN_RATIO, SYMSPELL_SNAPSHOT_FOLDER,
+                      SYMSPELL_DICTIONARY, SYMSPELL_BIGRAM_DICTIONARY, USE_OCR_RULES, OCR_RULES_PATH,
+                      USE_FTFY_FAST_PATH, USE_LANGUAGE_ID, LANGUAGE_MODEL_PATH,
+                      USE_CASED_CHANNEL)
 
 
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
 
+MODERN_DICTIONARY_PATH: str = str(files("symspellpy") / "frequency_dictionary_en_82_765.txt")
+MODERN_BIGRAM_DICTIONARY_PATH: str = str(files("symspellpy") / "frequency_bigramdictionary_en_243_342.txt")
 
-sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
-dictionary_path = pkg_resources.resource_filename("symspellpy", "frequency_dictionary_en_82_765.txt")
-sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1)
+dictionary_path: str = str(SYMSPELL_DICTIONARY) if SYMSPELL_DICTIONARY is not None else MODERN_DICTIONARY_PATH
+bigram_dictionary_path: Optional[str] = (str(SYMSPELL_BIGRAM_DICTIONARY)
+                                         if SYMSPELL_BIGRAM_DICTIONARY is not None else None)
 
+# Hot spots of the run reports, plain ftfy.fix_text when instrumentation is off
+ftfy_fix_text = hotspot("ftfy")(ftfy.fix_text)
 
-# Precompile patterns for better performance
-HYPHENATED_WORDS_PATTERN = re.compile(r'(\w)-\s*\n\s*(\w)')
-NEWLINES_PATTERN = re.compile(r'\n+')
-HYPHENS_PATTERN = re.compile(r'(?:\s+-\s+|^\s*-\s*)', re.MULTILINE)
+# Built on first use by get_sym_spell(), so scripts that only need
+# read_gpkg_to_dict never pay for the deletes index
+sym_spell: Optional[SymSpell] = None
+
+
+def file_key(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def spell_settings_key(dictionary: str, bigram_dictionary: Optional[str] = None) -> str:
+    """
+    Identifies everything a correction depends on, so cached corrections are
+    never reused across dictionaries or SymSpell settings.
+    """
+    if not os.path.exists(dictionary):
+        raise FileNotFoundError(f"SymSpell dictionary {dictionary} does not exist, "
+                                f"build it with python -m src.preprocessing.build_dictionary")
+    bigrams: str = file_key(bigram_dictionary) if bigram_dictionary is not None else "none"
+    return (f"{file_key(dictionary)}|bigrams={bigrams}"
+            f"|max_edit_distance={MAX_EDIT_DISTANCE}|prefix_length={PREFIX_LENGTH}"
+            f"|symspellpy={version('symspellpy')}")
+
+def load_sym_spell(dictionary: str, bigram_dictionary: Optional[str] = None) -> SymSpell:
+    """
+    A SymSpell index for the given dictionaries, loaded from a pickled snapshot
+    when one exists for them and the current settings, otherwise built from
+    the dictionary and snapshotted for later processes.
+    """
+    settings_key: str = spell_settings_key(dictionary, bigram_dictionary)
+    settings_hash: str = hashlib.sha1(settings_key.encode("utf-8")).hexdigest()[:16]
+    snapshot: Path = SYMSPELL_SNAPSHOT_FOLDER / f"symspell_{settings_hash}.pickle"
+    loaded = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+    if not (snapshot.exists() and loaded.load_pickle(snapshot, compressed=False)):
+        loaded.load_dictionary(dictionary, term_index=0, count_index=1)
+        os.makedirs(SYMSPELL_SNAPSHOT_FOLDER, exist_ok=True)
+        # Written under a temporary name so concurrent processes never load a partial snapshot
+        tmp_snapshot: Path = snapshot.with_suffix(f".{os.getpid()}.tmp")
+        loaded.save_pickle(tmp_snapshot, compressed=False)
+        os.replace(tmp_snapshot, snapshot)
+    # Bigrams are not part of every snapshot version, and loading them needs no deletes index
+    if bigram_dictionary is not None:
+        loaded.load_bigram_dictionary(bigram_dictionary, term_index=0, count_index=2)
+    return loaded
+
+def get_sym_spell() -> SymSpell:
+    """
+    The SymSpell index for the configured dictionaries, built on first use.
+    Call it in the parent before forking a pool so the workers share the
+    loaded index copy-on-write.
+    """
+    global sym_spell
+    if sym_spell is None:
+        sym_spell = load_sym_spell(dictionary_path, bigram_dictionary_path)
+    return sym_spell
+
+# Created on first use by get_spell_cache(): its settings key stats the
+# dictionaries, which may not exist yet (build_dictionary writes them)
+spell_cache: Optional[SpellCache] = None
+spell_cache_enabled: bool = USE_SPELL_CACHE
+
+def get_spell_cache() -> Optional[SpellCache]:
+    """
+    The persistent spell cache for the configured dictionaries, None when
+    disabled.
+    """
+    global spell_cache
+    if not spell_cache_enabled:
+        return None
+    if spell_cache is None:
+        spell_cache = SpellCache(SPELL_CACHE_PATH, spell_settings_key(dictionary_path, bigram_dictionary_path))
+    return spell_cache
+
+# Per-process counts of the path each paragraph took through correct_spelling,
+# collected by clean_dataset after every task
+CLEAN_STATS: Counter = Counter()
+
+GAZETTEER_PATH: Path = DATA_FOLDER / "filtered_places.gpkg"
+KNOWN_WORDS: Optional[Set[str]] = None
+OCR_RULES: Optional[OcrRules] = None
+LANGUAGE_SCORER: Optional[LanguageScorer] = None
+
+
+class CleanedParagraph(NamedTuple):
+    """
+    The channels clean_paragraph produces for one raw paragraph. `text` is the
+    normalised channel (lowercased, no punctuation, spell corrected), `cased`
+    the lightly cleaned one and `alignment[i]` the index of the cased token
+    behind token i of `text`. Fields of switched off steps are None.
+    """
+    text: str
+    language: Optional[str]
+    cased: Optional[str]
+    alignment: Optional[List[int]]
+
+
+def without_alignment(paragraph: CleanedParagraph) -> CleanedParagraph:
+    return paragraph._replace(alignment=None)
+
+def with_alignment(paragraph: CleanedParagraph) -> CleanedParagraph:
+    if paragraph.cased is None or paragraph.alignment is not None:
+        return paragraph
+    return paragraph._replace(alignment=align_tokens(paragraph.cased.split(), paragraph.text.split()))
+
+def paragraph_size(paragraph: CleanedParagraph) -> int:
+    """
+    Approximate memory of a cleaned paragraph, the strings dominate.
+    """
+    return (sys.getsizeof(paragraph) + sys.getsizeof(paragraph.text) + sys.getsizeof(paragraph.cased)
+            + (8 * len(paragraph.alignment) if paragraph.alignment is not None else 0))
 
 def clean_text(text: str) -> str:
-    text = ftfy.fix_text(text)
-    text = remove_punctuation(text)
-    
-    # Use precompiled patterns
-    text = HYPHENATED_WORDS_PATTERN.sub(r'\1\2', text)
-    text = NEWLINES_PATTERN.sub(' ', text)
-    text = HYPHENS_PATTERN.sub(' ', text)
+    return clean_paragraph(text).text
 
-    suggestion = sym_spell.lookup_compound(text, max_edit_distance=2)
+def clean_paragraph(text: str) -> CleanedParagraph:
+    """
+    Cleans one raw paragraph into the normalised and the cased channel and
+    tags its language. Paragraphs in another language than English are only
+    normalised, the English OCR rules and dictionary would mangle them.
+    """
+    fixed: str = fix_text(text)
+    text = strip_punctuation_and_newlines(fixed)
+    language: Optional[str] = None
+    if USE_LANGUAGE_ID:
+        language = detect_language(text, get_language_scorer())
+        CLEAN_STATS[f"paragraphs_language_{language}"] += 1
+    if language is not None and language != ENGLISH:
+        text = " ".join(text.lower().split())
+    else:
+        if USE_OCR_RULES:
+            text, replaced = apply_ocr_rules(text, get_ocr_rules())
+            CLEAN_STATS["ocr_rule_replacements"] += replaced
+        text = correct_spelling(text)
+
+    if not USE_CASED_CHANNEL:
+        return CleanedParagraph(text, language, None, None)
+    cased: str = case_preserving_text(fixed)
+    return CleanedParagraph(text, language, cased, align_tokens(cased.split(), text.split()))
+
+def normalise_text(text: str) -> str:
+    """
+    Everything clean_text does before spell correction.
+    """
+    text = fix_text(text)
+    return strip_punctuation_and_newlines(text)
+
+def normalise_texts(texts: List[str]) -> List[str]:
+    return [strip_punctuation_and_newlines(text) for text in fix_texts(texts)]
+
+def fix_text(text: str) -> str:
+    """
+    ftfy.fix_text, skipped for text it could not change.
+    """
+    if USE_FTFY_FAST_PATH and not needs_ftfy(text):
+        CLEAN_STATS["ftfy_fast_path"] += 1
+        return text
+    CLEAN_STATS["ftfy_full"] += 1
+    return ftfy_fix_text(text)
+
+def fix_texts(texts: List[str]) -> List[str]:
+    """
+    Batch version of fix_text: the paragraphs are checked first and ftfy only
+    runs on the flagged ones.
+    """
+    if not USE_FTFY_FAST_PATH:
+        CLEAN_STATS["ftfy_full"] += len(texts)
+        return [ftfy_fix_text(text) for text in texts]
+    flagged: List[int] = [i for i, text in enumerate(texts) if needs_ftfy(text)]
+    fixed: List[str] = list(texts)
+    for i in flagged:
+        fixed[i] = ftfy_fix_text(texts[i])
+    CLEAN_STATS["ftfy_full"] += len(flagged)
+    CLEAN_STATS["ftfy_fast_path"] += len(texts) - len(flagged)
+    return fixed
+
+
+def get_language_scorer() -> Optional[LanguageScorer]:
+    """
+    The trained language scorer, None until train_language_model has written
+    one. Loaded on first use.
+    """
+    global LANGUAGE_SCORER
+    if LANGUAGE_SCORER is None and LANGUAGE_MODEL_PATH.exists():
+        LANGUAGE_SCORER = LanguageScorer.load(LANGUAGE_MODEL_PATH)
+    return LANGUAGE_SCORER
+
+def get_ocr_rules() -> OcrRules:
+    """
+    The corpus-derived OCR rules when build_ocr_rules has written them,
+    otherwise the seed rules. Loaded on first use.
+    """
+    global OCR_RULES
+    if OCR_RULES is None:
+        OCR_RULES = load_ocr_rules(OCR_RULES_PATH) if OCR_RULES_PATH.exists() else SEED_OCR_RULES
+    return OCR_RULES
+
+def get_known_words() -> Set[str]:
+    """
+    Tokens that never need correcting: the SymSpell dictionary plus the words
+    of the gazetteer place names. Loaded on first use.
+    """
+    global KNOWN_WORDS
+    if KNOWN_WORDS is None:
+        KNOWN_WORDS = set(get_sym_spell().words)
+        if GAZETTEER_PATH.exists():
+            for place in read_gpkg_to_dict(GAZETTEER_PATH):
+                KNOWN_WORDS.update(place.lower().split())
+    return KNOWN_WORDS
+
+@hotspot("symspell")
+def symspell_lookup_compound(text: str) -> List[Any]:
+    return get_sym_spell().lookup_compound(text, max_edit_distance=MAX_EDIT_DISTANCE)
+
+def lookup_compound(text: str) -> str:
+    # lookup_compound lowercases and splits on words itself, so case and
+    # whitespace can be normalised away in the cache key
+    normalised = " ".join(text.lower().split())
+    cache: Optional[SpellCache] = get_spell_cache()
+    if cache is not None:
+        cached = cache.get(normalised)
+        if cached is not None:
+            CLEAN_STATS["spell_cache_hit"] += 1
+            return cached
+
+    suggestion = symspell_lookup_compound(text)
     if suggestion:
         corrected = suggestion[0].term
     else:
-        corrected = text
+        return text.lower().strip()
 
-    
-    return corrected.lower().strip()
+    corrected = corrected.lower().strip()
+    if cache is not None:
+        cache.put(normalised, corrected)
+    return corrected
+
+def suspicious_spans(tokens: List[str], known_words: Set[str]) -> List[Tuple[int, int]]:
+    """
+    Merged [start, end) spans around every unknown token, widened by one
+    neighbour on each side so lookup_compound can still split or join words.
+    """
+    spans: List[Tuple[int, int]] = []
+    for i, token in enumerate(tokens):
+        if token in known_words:
+            continue
+        start, end = max(0, i - 1), min(len(tokens), i + 2)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+def correct_spelling(text: str) -> str:
+    if not USE_SPELL_GATE:
+        CLEAN_STATS["paragraphs_full_symspell"] += 1
+        return lookup_compound(text)
+
+    tokens: List[str] = text.lower().split()
+    known_words: Set[str] = get_known_words()
+    n_known: int = sum(1 for token in tokens if token in known_words)
+    if not tokens or n_known / len(tokens) < SPELL_GATE_MIN_KNOWN_RATIO:
+        CLEAN_STATS["paragraphs_full_symspell"] += 1
+        return lookup_compound(text)
+
+    if n_known == len(tokens):
+        CLEAN_STATS["paragraphs_in_vocabulary"] += 1
+        return " ".join(tokens)
+
+    # Mostly clean paragraph: only the spans around unknown tokens are corrected
+    CLEAN_STATS["paragraphs_span_symspell"] += 1
+    corrected: List[str] = []
+    previous_end: int = 0
+    for start, end in suspicious_spans(tokens, known_words):
+        corrected.extend(tokens[previous_end:start])
+        corrected.append(lookup_compound(" ".join(tokens[start:end])))
+        previous_end = end
+    corrected.extend(tokens[previous_end:])
+    return " ".join(token for token in corrected if token)
 
 
 def remove_punctuation(text: str) -> str:
@@ -67,67 +342,15 @@ def regroup_texts(text_to_explode) -> List[str]:
     4. Paragraphs that have 15 or fewer actual characters (excluding newlines) are removed from the result.
     5. Paragraphs that have an average of fewer than 10 actual characters per line are removed.
     
+    The paragraphs are scanned once, see text_scan.segment_paragraphs.
+
     Args:
         text_to_explode (str): The input text to be regrouped
         
     Returns:
         List[str]: A list of regrouped paragraphs with filtered content
     """
-    # Split the text by double newlines
-    paragraphs = text_to_explode.split("\n\n")
-    result = []
-    
-    # Keep track of accumulated single-line paragraphs
-    buffer = []
-    
-    for i, para in enumerate(paragraphs):
-        current_para = para.strip()
-        is_single_line = "\n" not in current_para
-        
-        if is_single_line:
-            # Add to buffer
-            buffer.append(current_para)
-        else:
-            # Found a multi-line paragraph
-            if buffer:
-                # Combine all buffered single-line paragraphs with this multi-line paragraph
-                combined = " ".join(buffer) + " " + current_para
-                result.append(combined)
-                buffer = []  # Clear the buffer
-            else:
-                # No buffered single-line paragraphs, just add the multi-line paragraph
-                result.append(current_para)
-    
-    # If there are any remaining single-line paragraphs in the buffer
-    if buffer:
-        result.append(" ".join(buffer))
-    
-    # Filter out paragraphs based on criteria
-    filtered_result = []
-    for para in result:
-        # Count the number of newlines in the paragraph
-        newline_count = para.count('\n')
-        
-        # Count actual characters (excluding newlines)
-        actual_char_count = len(para.replace('\n', ''))
-        
-        # Calculate average actual characters per line
-        lines = para.split('\n')
-        num_lines = len(lines)
-        avg_chars_per_line = sum(len(line) for line in lines) / num_lines if num_lines > 0 else 0
-        
-        # Conditions to keep a paragraph:
-        # 1. Either has 0 newlines (single line) OR more than 2 newlines
-        # 2. Has more than 15 actual characters total (excluding newlines)
-        keep_paragraph = (
-            (newline_count > 2) and 
-            actual_char_count > 15
-        )
-
-        if keep_paragraph:
-            filtered_result.append(para)
-    
-    return filtered_result
+    return segment_paragraphs(text_to_explode)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,29 @@
+import os
 from pathlib import Path
 
 DATA_FOLDER = Path(__file__).parents[1] / ("data")
 FOLDER_ARTICLES = DATA_FOLDER / "json_res/scratch/project_2005072/keshu/octavo-newspapers-downloader/data/work/json_res"
+# Raw issues are read from the tar directly when FOLDER_ARTICLES has not been extracted
+JSON_RES_TAR = DATA_FOLDER / "json_res.tar"
 
 FINDINGS_FOLDER = Path(__file__).parents[1] / ("findings")
 
 
 CLEANED_DATA_FOLDER = DATA_FOLDER / "cleaned_articles"
+CLEANED_SHARDS_FOLDER = DATA_FOLDER / "cleaned_shards"
+# "json" writes one file per article to CLEANED_DATA_FOLDER, "shards" writes JSONL shards to CLEANED_SHARDS_FOLDER
+CLEANED_OUTPUT_FORMAT = "json"
+INGEST_MANIFEST = DATA_FOLDER / "ingest_manifest.jsonl"
+# Article id -> byte range of its raw record and cleaned output, built with read_article_text.py --build-index
+ARTICLE_INDEX_PATH = DATA_FOLDER / "article_index.sqlite"
+META_INDEX_FOLDER = DATA_FOLDER / "bl_newspapers_meta_index"
+# Positional inverted index over the cleaned paragraphs, built with python -m preprocessing.inverted_index
+INVERTED_INDEX_FOLDER = DATA_FOLDER / "inverted_index"
+# Cleaned paragraphs with their metadata and an FTS5 index, built with python -m preprocessing.export_sqlite --build
+CORPUS_DATABASE = DATA_FOLDER / "corpus.sqlite"
+# Cleaned paragraphs as memory-mapped token ids, built with python -m preprocessing.token_corpus
+TOKEN_CORPUS_FOLDER = DATA_FOLDER / "token_corpus"
+META_PARQUET = DATA_FOLDER / "bl_newspapers_meta.parquet"
 FILE_POLITICAL_AFFILIATIONS = DATA_FOLDER / "burney-titles-political.csv"
 
 TRADE_GAZETEER_RAW = DATA_FOLDER / "1300_owtrad_20250515_115842.json"
@@ -15,4 +32,46 @@ WORLD_COUNTRIES_FILE = DATA_FOLDER/"ne_50m_admin_0_countries/ne_50m_admin_0_coun
 
 BRITISH_COLONIAL_TRADE_PLACES_EAST = DATA_FOLDER / "filtered_trade_places.gpkg"
 
-DECADE_HEATMAP = True
\ No newline at end of file
+DECADE_HEATMAP = True
+
+# Spell corrections are cached across runs, point SPELL_CACHE_DIR at node-local storage to share them per node
+USE_SPELL_CACHE = True
+SPELL_CACHE_PATH = Path(os.environ.get("SPELL_CACHE_DIR", DATA_FOLDER / "cache")) / "spell_corrections.sqlite"
+SYMSPELL_SNAPSHOT_FOLDER = DATA_FOLDER / "cache"
+
+# SymSpell dictionaries, None uses the modern lists bundled with symspellpy.
+# build_dictionary derives historical ones from the corpus, set these to HISTORICAL_DICTIONARY
+# and HISTORICAL_BIGRAM_DICTIONARY to use them
+SYMSPELL_DICTIONARY = None
+SYMSPELL_BIGRAM_DICTIONARY = None
+HISTORICAL_DICTIONARY = DATA_FOLDER / "historical_frequency_dictionary.txt"
+HISTORICAL_BIGRAM_DICTIONARY = DATA_FOLDER / "historical_bigram_dictionary.txt"
+
+# Undo systematic OCR confusions (long s read as f, ...) with a cheap rule table before SymSpell.
+# build_ocr_rules derives the table from the corpus, the seed rules in ocr_rules are used until then
+USE_OCR_RULES = True
+OCR_RULES_PATH = DATA_FOLDER / "ocr_rules.json"
+
+# Skip ftfy for paragraphs it cannot change (ASCII and isolated Latin-1 characters, no entities or control characters)
+USE_FTFY_FAST_PATH = True
+
+# Tag every paragraph with its language (en, la, fr, nl), only English paragraphs are spell corrected.
+# train_language_model writes the character trigram model, the function word vote is used until then
+USE_LANGUAGE_ID = True
+LANGUAGE_MODEL_PATH = DATA_FOLDER / "language_model.json"
+
+# Also write a cased channel with punctuation (texts_cased) and, per normalised token, the index of the
+# cased token it came from (token_alignments)
+USE_CASED_CHANNEL = True
+
+# Clean each distinct raw paragraph once per worker, cleaned articles get a text_hashes list for counting reprints
+USE_PARAGRAPH_DEDUP = True
+
+# Skip SymSpell for paragraphs whose share of dictionary/gazetteer tokens reaches the ratio,
+# and only correct the spans around unknown tokens
+USE_SPELL_GATE = False
+SPELL_GATE_MIN_KNOWN_RATIO = 0.9
+
+# Per-stage timing and throughput reports (INSTRUMENT=1), written to RUN_REPORTS_FOLDER
+USE_INSTRUMENTATION = os.environ.get("INSTRUMENT", "0") == "1"
+RUN_REPORTS_FOLDER = DATA_FOLDER / "run_reports"
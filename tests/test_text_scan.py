@@ -0,0 +1,80 @@
+import json
+import re
+import string
+from pathlib import Path
+from typing import List
+
+import ftfy
+import pytest
+
+from preprocessing.text_scan import align_tokens, needs_ftfy, segment_paragraphs, strip_punctuation_and_newlines
+
+FIXTURE_TEXTS: List[str] = json.loads((Path(__file__).parent / "fixtures" / "raw_article_texts.json")
+                                      .read_text(encoding="utf-8"))
+
+# The implementations segment_paragraphs and strip_punctuation_and_newlines
+# replaced, the output must not change
+HYPHENATED_WORDS_PATTERN = re.compile(r'(\w)-\s*\n\s*(\w)')
+NEWLINES_PATTERN = re.compile(r'\n+')
+HYPHENS_PATTERN = re.compile(r'(?:\s+-\s+|^\s*-\s*)', re.MULTILINE)
+
+
+def reference_normalise(text: str) -> str:
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = HYPHENATED_WORDS_PATTERN.sub(r'\1\2', text)
+    text = NEWLINES_PATTERN.sub(' ', text)
+    return HYPHENS_PATTERN.sub(' ', text)
+
+
+def reference_regroup_texts(text_to_explode: str) -> List[str]:
+    paragraphs = text_to_explode.split("\n\n")
+    result = []
+    buffer = []
+    for para in paragraphs:
+        current_para = para.strip()
+        if "\n" not in current_para:
+            buffer.append(current_para)
+        elif buffer:
+            result.append(" ".join(buffer) + " " + current_para)
+            buffer = []
+        else:
+            result.append(current_para)
+    if buffer:
+        result.append(" ".join(buffer))
+    return [para for para in result if para.count('\n') > 2 and len(para.replace('\n', '')) > 15]
+
+
+@pytest.mark.parametrize("text", FIXTURE_TEXTS)
+def test_segment_paragraphs_matches_reference(text: str) -> None:
+    assert segment_paragraphs(text) == reference_regroup_texts(text)
+
+
+@pytest.mark.parametrize("text", FIXTURE_TEXTS)
+def test_strip_punctuation_and_newlines_matches_reference(text: str) -> None:
+    for paragraph in reference_regroup_texts(text):
+        assert strip_punctuation_and_newlines(paragraph) == reference_normalise(paragraph)
+
+
+def test_fixture_yields_paragraphs() -> None:
+    assert sum(len(segment_paragraphs(text)) for text in FIXTURE_TEXTS) >= 5
+
+
+def test_align_tokens_maps_corrected_words_to_their_cased_tokens() -> None:
+    cased = "To be SOLD , at Lloyd's Coffee-house, the Cargo of the Sea-Horfe".split()
+    tokens = "to be sold at lloyds coffeehouse the cargo of the seahorse".split()
+    assert align_tokens(cased, tokens) == [0, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11]
+    split = "to be sold at lloyds coffee house the cargo of the seahorse".split()
+    assert align_tokens(cased, split) == [0, 1, 2, 4, 5, 6, 6, 7, 8, 9, 10, 11]
+
+
+@pytest.mark.parametrize("text", ["L'ÉTAT est à Paris, où l'on paye 5£ pour le thé.", "½ a pound at 3s. 6d.",
+                                  "Cæsar", *FIXTURE_TEXTS])
+def test_needs_ftfy_only_skips_text_ftfy_leaves_unchanged(text: str) -> None:
+    if not needs_ftfy(text):
+        assert ftfy.fix_text(text) == text
+
+
+@pytest.mark.parametrize("text", ["cafÃ©", "Â£5", "donâ€™t", "Ã  la", "ﬁne", "“quoted”", "&amp;", "a\r\nb"])
+def test_needs_ftfy_flags_mojibake_and_entities(text: str) -> None:
+    assert needs_ftfy(text)
+    assert ftfy.fix_text(text) != text